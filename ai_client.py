@@ -0,0 +1,257 @@
+import asyncio
+import codecs
+import hashlib
+import json
+import os
+import queue
+import threading
+from urllib.parse import urlsplit
+
+from ai_config import (GEMINI_MODEL, AI_BACKEND, AI_STUB_URL, AI_MAX_CONCURRENCY, AI_CACHE_DIR, genai)
+
+# --- AIへのリクエストを実行するバックエンド ---
+# バックエンドは (prompt, model) を受け取り、回答の文字列を少しずつ返す async generator 関数。
+# register_backend で差し替えられるので、テストやベンチマークではローカルのスタブを使える。
+_BACKENDS = {}
+
+# 同時実行数の上限と、実行中のリクエスト（同じプロンプトの重複送信を防ぐ）
+_max_concurrency = AI_MAX_CONCURRENCY
+_semaphore = None
+_semaphore_loop = None
+_in_flight = {}
+
+# Streamlitのスクリプトスレッドから非同期処理を呼ぶためのイベントループ
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def register_backend(name, stream_func):
+    """
+    AIのバックエンドを登録する。
+
+    Args:
+        name (str): バックエンド名（AI_BACKEND や backend 引数で指定する名前）
+        stream_func (callable): (prompt, model) を受け取り、回答の文字列を順に yield する async generator 関数
+    """
+    _BACKENDS[name] = stream_func
+
+
+async def _gemini_stream(prompt, model):
+    # APIキーの設定は呼び出し側（ai_config.configure_gemini）で済ませておく
+    response = await genai.GenerativeModel(model).generate_content_async(prompt, stream=True)
+    async for chunk in response:
+        if chunk.text:
+            yield chunk.text
+
+
+async def _stub_stream(prompt, model):
+    # ai_stub_server.py にPOSTし、返ってきた本文を届いた順に返す（標準ライブラリのみで通信する）
+    url = urlsplit(AI_STUB_URL)
+    reader, writer = await asyncio.open_connection(url.hostname, url.port or 80)
+    body = json.dumps({'model': model, 'prompt': prompt}, ensure_ascii=False).encode('utf-8')
+    request_lines = [
+        "POST /generate HTTP/1.1",
+        f"Host: {url.hostname}",
+        "Content-Type: application/json; charset=utf-8",
+        f"Content-Length: {len(body)}",
+        "Connection: close",
+    ]
+    writer.write(('\r\n'.join(request_lines) + '\r\n\r\n').encode('ascii') + body)
+    await writer.drain()
+
+    try:
+        status_line = await reader.readline()
+        status = int(status_line.split()[1])
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        if status != 200:
+            message = (await reader.read()).decode('utf-8', errors='replace')
+            raise RuntimeError(f"スタブサーバーがエラーを返しました（{status}）: {message}")
+
+        decoder = codecs.getincrementaldecoder('utf-8')()
+        while True:
+            data = await reader.read(1024)
+            if not data:
+                break
+            text = decoder.decode(data)
+            if text:
+                yield text
+        rest = decoder.decode(b'', final=True)
+        if rest:
+            yield rest
+    finally:
+        writer.close()
+
+
+register_backend('gemini', _gemini_stream)
+register_backend('stub', _stub_stream)
+
+
+# --- 回答のディスクキャッシュ ---
+def cache_key(prompt, model, backend):
+    """プロンプトとモデル（とバックエンド）から回答キャッシュのキーを作る。"""
+    return hashlib.sha256(f"{backend}\n{model}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+def _cache_path(key):
+    return os.path.join(AI_CACHE_DIR, f"{key}.txt")
+
+
+def _read_cache(key):
+    try:
+        with open(_cache_path(key), encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def _write_cache(key, text):
+    os.makedirs(AI_CACHE_DIR, exist_ok=True)
+    # 書き込み途中のファイルを読まれないように、一時ファイルに書いてから置き換える
+    tmp_path = f"{_cache_path(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, _cache_path(key))
+
+
+def clear_cache():
+    """保存したAIの回答をすべて削除する。"""
+    if not os.path.isdir(AI_CACHE_DIR):
+        return
+    for name in os.listdir(AI_CACHE_DIR):
+        if name.endswith('.txt'):
+            os.remove(os.path.join(AI_CACHE_DIR, name))
+
+
+# --- 非同期の実行 ---
+def set_max_concurrency(limit):
+    """AIへ同時に送るリクエスト数の上限を変更する（実行中のリクエストには影響しない）。"""
+    global _max_concurrency, _semaphore
+    _max_concurrency = max(1, int(limit))
+    _semaphore = None
+
+
+def _get_semaphore():
+    # asyncio.Semaphore はイベントループごとに作り直す
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(_max_concurrency)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+async def stream_response(prompt, model=None, backend=None, use_cache=True):
+    """
+    プロンプトをAIに送り、回答を届いた順に返す async generator。
+    保存済みの回答があればAIに送らずにそれを返し、
+    同じプロンプトを実行中の場合は、その結果を待って返す。
+
+    Args:
+        prompt (str): AIに送るプロンプト
+        model (str): モデル名（省略時は GEMINI_MODEL）
+        backend (str): バックエンド名（省略時は AI_BACKEND）
+        use_cache (bool): ディスクキャッシュを使うかどうか
+
+    Yields:
+        str: 回答の一部
+    """
+    model = model or GEMINI_MODEL
+    backend = backend or AI_BACKEND
+    if backend not in _BACKENDS:
+        raise ValueError(f"未登録のAIバックエンドです: {backend}")
+    key = cache_key(prompt, model, backend)
+
+    if use_cache:
+        cached = _read_cache(key)
+        if cached is not None:
+            yield cached
+            return
+
+    # 同じリクエストが実行中なら、新しく送らずに完了を待つ
+    loop = asyncio.get_running_loop()
+    running = _in_flight.get(key)
+    if running is not None and running.get_loop() is loop:
+        yield await asyncio.shield(running)
+        return
+
+    future = loop.create_future()
+    _in_flight[key] = future
+    chunks = []
+    try:
+        async with _get_semaphore():
+            async for chunk in _BACKENDS[backend](prompt, model):
+                chunks.append(chunk)
+                yield chunk
+        text = ''.join(chunks)
+        if use_cache:
+            _write_cache(key, text)
+        future.set_result(text)
+    except Exception as e:
+        if not future.done():
+            future.set_exception(e)
+            # 待っているリクエストがない場合に「例外が取得されなかった」警告を出さない
+            future.exception()
+        raise
+    except BaseException:
+        # 途中で中断された（キャンセル・読み出しの中止）場合は待っている側もキャンセルする
+        if not future.done():
+            future.cancel()
+        raise
+    finally:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+
+
+async def generate_response(prompt, model=None, backend=None, use_cache=True):
+    """プロンプトをAIに送り、回答全体を返す。引数は stream_response と同じ。"""
+    chunks = []
+    async for chunk in stream_response(prompt, model=model, backend=backend, use_cache=use_cache):
+        chunks.append(chunk)
+    return ''.join(chunks)
+
+
+async def generate_responses(prompts, model=None, backend=None, use_cache=True):
+    """複数のプロンプトを同時実行数の上限内で並行してAIに送り、回答をプロンプトと同じ順番で返す。"""
+    return await asyncio.gather(*(
+        generate_response(prompt, model=model, backend=backend, use_cache=use_cache)
+        for prompt in prompts
+    ))
+
+
+# --- Streamlitから使うための同期インターフェース ---
+def _get_loop():
+    # セッションをまたいで重複の排除と同時実行数の上限が効くように、ループは1つだけ起動する
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='ai-client-loop', daemon=True).start()
+    return _loop
+
+
+def stream_response_sync(prompt, model=None, backend=None, use_cache=True):
+    """
+    stream_response を通常のジェネレーターとして使えるようにする（st.write_stream 用）。
+    非同期処理は専用スレッドのイベントループで実行する。
+    """
+    chunk_queue = queue.Queue()
+    done = object()
+
+    async def produce():
+        try:
+            async for chunk in stream_response(prompt, model=model, backend=backend, use_cache=use_cache):
+                chunk_queue.put(chunk)
+        except Exception as e:
+            chunk_queue.put(e)
+        finally:
+            chunk_queue.put(done)
+
+    asyncio.run_coroutine_threadsafe(produce(), _get_loop())
+    while True:
+        item = chunk_queue.get()
+        if item is done:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
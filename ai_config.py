@@ -1,53 +1,86 @@
 import streamlit as st
 import os
-import toml # tomlが secrets.toml の読み込みに使われている可能性
-import google.generativeai as genai
+from lazy_import import lazy_module
 
-# Streamlit Cloud環境か、ローカル環境かを判断
-# Streamlit Cloudはst.secretsが存在するため、この判定が可能
-is_streamlit_cloud = "GEMINI_API_KEY" in st.secrets # または別のキーで判定
+# AI関連のライブラリは、AIを実際に呼び出すときに初めて読み込む
+toml = lazy_module('toml') # tomlが secrets.toml の読み込みに使われている可能性
+genai = lazy_module('google.generativeai')
 
-if is_streamlit_cloud:
-    try:
-        # Streamlit Cloudではst.secretsから直接読み込む
-        api_key = st.secrets.get("google_api_key")
-        if api_key is None:
-            # セクション形式で保存されている場合
-            api_key = st.secrets.gemini.google_api_key
-
-        genai.configure(api_key=api_key)
-        st.session_state.gemini_ready = True
-    except Exception as e:
-        st.session_state.gemini_ready = False
-        st.error(f"Streamlit CloudでのAPIキー設定中にエラーが発生しました: {e}")
-        st.info("Streamlit CloudのSecrets設定を確認してください。")
-
-else:
-    # ローカル環境ではsecrets.tomlを直接読み込む
-    secrets_path = os.path.join(
-        os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml"
-    )
+# --- AI実行の設定 ---
+# 使用するGeminiのモデル
+GEMINI_MODEL = "gemini-1.5-flash"
+# AIの呼び出し先（'gemini': 本物のAPI, 'stub': ai_stub_server.py のローカルスタブ）
+AI_BACKEND = os.environ.get("AI_BACKEND", "gemini")
+AI_STUB_URL = os.environ.get("AI_STUB_URL", "http://127.0.0.1:8765")
+# 同時にAIへ送るリクエスト数の上限
+AI_MAX_CONCURRENCY = int(os.environ.get("AI_MAX_CONCURRENCY", "2"))
+# AIの回答をプロンプトのハッシュとモデルごとに保存するフォルダ
+AI_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".ai_cache")
+
+
+def configure_gemini():
+    """
+    Gemini APIキーを読み込んで genai.configure を実行する。
+    インポート時ではなく、AIを実際に呼び出す直前に一度だけ実行する。
+
+    Returns:
+        bool: APIキーの設定に成功したかどうか
+    """
+    if st.session_state.get("gemini_ready"):
+        return True
+
+    # Streamlit Cloud環境か、ローカル環境かを判断
+    # Streamlit Cloudはst.secretsが存在するため、この判定が可能
     try:
-        secrets = toml.load(secrets_path)
-        api_key = secrets.get("google_api_key")
-        if api_key is None:
-            api_key = secrets.get("gemini", {}).get("google_api_key")
+        is_streamlit_cloud = "GEMINI_API_KEY" in st.secrets # または別のキーで判定
+    except Exception:
+        is_streamlit_cloud = False
+
+    if is_streamlit_cloud:
+        try:
+            # Streamlit Cloudではst.secretsから直接読み込む
+            api_key = st.secrets.get("google_api_key")
+            if api_key is None:
+                # セクション形式で保存されている場合
+                api_key = st.secrets.gemini.google_api_key
 
-        if api_key:
             genai.configure(api_key=api_key)
             st.session_state.gemini_ready = True
-        else:
+        except Exception as e:
             st.session_state.gemini_ready = False
-            st.error("ローカル環境のsecrets.tomlにGoogle APIキーが見つかりません。")
-            st.info("secrets.tomlに 'google_api_key = \"YOUR_API_KEY\"' または '[gemini]\\ngoogle_api_key = \"YOUR_API_KEY\"' の形式で設定してください。")
-    except FileNotFoundError:
-        st.session_state.gemini_ready = False
-        st.error("ローカル環境の .streamlit/secrets.toml が見つかりません。")
-    except Exception as e:
-        st.session_state.gemini_ready = False
-        st.error(f"secrets.tomlの読み込み中にエラーが発生しました: {e}")
+            st.error(f"Streamlit CloudでのAPIキー設定中にエラーが発生しました: {e}")
+            st.info("Streamlit CloudのSecrets設定を確認してください。")
+
+    else:
+        # ローカル環境ではsecrets.tomlを直接読み込む
+        secrets_path = os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), ".streamlit", "secrets.toml"
+        )
+        try:
+            secrets = toml.load(secrets_path)
+            api_key = secrets.get("google_api_key")
+            if api_key is None:
+                api_key = secrets.get("gemini", {}).get("google_api_key")
+
+            if api_key:
+                genai.configure(api_key=api_key)
+                st.session_state.gemini_ready = True
+            else:
+                st.session_state.gemini_ready = False
+                st.error("ローカル環境のsecrets.tomlにGoogle APIキーが見つかりません。")
+                st.info("secrets.tomlに 'google_api_key = \"YOUR_API_KEY\"' または '[gemini]\\ngoogle_api_key = \"YOUR_API_KEY\"' の形式で設定してください。")
+        except FileNotFoundError:
+            st.session_state.gemini_ready = False
+            st.error("ローカル環境の .streamlit/secrets.toml が見つかりません。")
+        except Exception as e:
+            st.session_state.gemini_ready = False
+            st.error(f"secrets.tomlの読み込み中にエラーが発生しました: {e}")
+
+    return st.session_state.gemini_ready
 
 
+# AIプロンプトの概算トークン数の上限（スマホでコピーしやすい長さに抑える）
+PROMPT_TOKEN_BUDGET = 8000
 
 COMMON_PROMPT_HEADER = """
 卓球のルールについて説明します。
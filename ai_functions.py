@@ -1,8 +1,6 @@
 import streamlit as st
-#import google.generativeai as genai
-#import time 
-
-#model = genai.GenerativeModel('gemini-1.5-flash')
+from ai_config import AI_BACKEND, configure_gemini
+from ai_client import stream_response_sync
 
 # --- ユーザーが選択した分析項目とそれに対応するデータを取得する関数 ---
 def get_ai_analysis_data(analysis_type, df, tactic_option=None):
@@ -12,16 +10,19 @@ def get_ai_analysis_data(analysis_type, df, tactic_option=None):
             
     return ""
 
-## --- AIにプロンプトを送信する関数 ---
-#def generate_ai_response(prompt_text):
-#    if st.session_state.gemini_ready:
-#        try:
-#            model = genai.GenerativeModel('gemini-1.5-flash')
-#            response = model.generate_content(prompt_text)
-#            st.session_state.ai_response = response.text
-#        except Exception as e:
-#            st.error(f"AIとの通信中にエラーが発生しました。詳細: {e}")
-#            st.session_state.ai_response = "エラーが発生しました。"
-#    else:
-#        st.warning("AI機能が利用できません。APIキー設定を確認してください。")
-#        st.session_state.ai_response = "APIキーが設定されていません。"
+# --- AIにプロンプトを送信する関数 ---
+def generate_ai_response(prompt_text):
+    """
+    プロンプトをAIに送り、回答をストリーミングで表示して st.session_state.ai_response に保存する。
+    同じプロンプトとモデルの回答は ai_client のディスクキャッシュから返す。
+    """
+    if AI_BACKEND == 'gemini' and not configure_gemini():
+        st.warning("AI機能が利用できません。APIキー設定を確認してください。")
+        st.session_state.ai_response = "APIキーが設定されていません。"
+        return
+
+    try:
+        st.session_state.ai_response = st.write_stream(stream_response_sync(prompt_text))
+    except Exception as e:
+        st.error(f"AIとの通信中にエラーが発生しました。詳細: {e}")
+        st.session_state.ai_response = "エラーが発生しました。"
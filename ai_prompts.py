@@ -1,40 +1,65 @@
+import base64
+import functools
+import gzip
+import hashlib
+
 import streamlit as st
 import streamlit.components.v1 as components
-from ai_config import COMMON_PROMPT_HEADER
-
-# データ抽出用関数のインポート
-from score_summary import get_score_summary_for_ai
-from match_summary import get_match_summary_for_ai
-from serve_receive_analysis import get_serve_receive_analysis_for_ai
-from serve_win_rate_analysis import get_serve_win_rate_analysis_for_ai
-from serve_rate_transition import get_serve_rate_transition_for_ai
-from serve_analysis import get_serve_analysis_for_ai
-from overall_receive_analysis import get_overall_receive_analysis_for_ai
-from overall_score_miss_analysis import get_overall_score_miss_analysis_for_ai
-from first_drive_analysis import get_first_drive_analysis_for_ai
-from my_first_play_success_rate import get_my_first_play_success_rate_for_ai
-from serve_score_pattern import get_serve_score_pattern_for_ai
-from serve_loss_pattern import get_serve_loss_pattern_for_ai
-from recieve_score_pattern import get_recieve_score_pattern_for_ai
-from recieve_loss_pattern import get_recieve_loss_pattern_for_ai
-from previous_ball_analysis import get_previous_ball_analysis_for_ai
-from consecutive_ball_analysis import get_consecutive_ball_analysis_for_ai
-from game_ending_analysis import get_game_ending_analysis_for_ai
-from point_breakdown_analysis import get_point_breakdown_analysis_for_ai
-from ai_functions import get_ai_analysis_data # '謎の専属コーチ'用
-
-def display_prompt_card(title, prompt):
+import pandas as pd
+from ai_config import COMMON_PROMPT_HEADER, PROMPT_TOKEN_BUDGET
+from prompt_budget import fit_prompt_to_budget
+
+from analysis_registry import create_context, run_for_ai
+
+PREVIOUS_BALL_NOTE = "※相手の直前コースがバックで自分の打球技術がフォアハンド系の場合には、回り込みフォアの技術の成功率（勝負をかけたときの決定率）を示す。"
+CONSECUTIVE_BALL_NOTE = """※相手コースバック → 自分バックハンド系の成功率が高い場合には、バック対バックで主導権を握れている。
+※相手コースフォア → 自分フォアハンド系の成功率が高い場合には、フォア対フォアで主導権を握れている。"""
+
+# 押されたボタンのプロンプトカードをセッション内に保存するキー
+PROMPT_CARDS_KEY = 'prompt_cards'
+ACTIVE_PROMPT_CARD_KEY = 'active_prompt_card'
+# プロンプトカードの中身を表示する枠の高さ（px）
+PROMPT_VIEWER_HEIGHT = 240
+
+
+@st.cache_data(show_spinner=False)
+def _build_prompt_payload(prompt):
+    """
+    ブラウザに送るプロンプトをgzip圧縮してbase64にする。
+    同じプロンプトは再実行のたびに圧縮し直さないようにキャッシュする。
+
+    Returns:
+        tuple: (プロンプトのハッシュ, base64文字列)
+    """
+    data = prompt.encode('utf-8')
+    prompt_hash = hashlib.sha256(data).hexdigest()[:16]
+    payload = base64.b64encode(gzip.compress(data)).decode('ascii')
+    return prompt_hash, payload
+
+
+def display_prompt_card(title, prompt, report=None, total_tokens=None, token_budget=None):
     """スマホでも確実にコピーできるボタン付きのプロンプト表示共通関数"""
     st.subheader(f"💡 {title}")
+
+    # トークン予算に収めるために圧縮した内容を表示
+    if total_tokens is not None:
+        budget_text = f" / 上限 {token_budget:,}" if token_budget else ""
+        st.caption(f"概算トークン数: {total_tokens:,}{budget_text}")
+    if report:
+        with st.expander("✂️ トークン予算のために圧縮した内容"):
+            st.dataframe(pd.DataFrame(report), hide_index=True)
     
     # プロンプトの余計な空白を削除
     clean_prompt = prompt.strip()
+    # コピーボタンのスクリプトにはプロンプトを圧縮して埋め込む（エスケープせずに済み、送る量も減る）
+    prompt_hash, payload = _build_prompt_payload(clean_prompt)
 
     # 1. スマホでも確実に動作する「コピー専用ボタン」をJavaScriptで作成
     # Streamlit標準のボタンより強力にクリップボードへ干渉します
+    # 2. 念のため中身が見えるように、同じ圧縮データを展開した読み取り専用の枠も表示する（長押しでコピーできる）
     copy_html = f"""
         <div id="copy-area">
-            <button onclick="copyToClipboard()" style="
+            <button id="copy-button" onclick="copyToClipboard()" disabled style="
                 width: 100%;
                 padding: 15px;
                 background-color: #FF4B4B;
@@ -56,15 +81,35 @@ def display_prompt_card(title, prompt):
                 text-align: center;
                 display: none;
             "> ✅ コピー完了！AIアプリに貼り付けてください</p>
+            <p style="color: #555; font-size: 13px; margin: 4px 0;">
+                スマホで上のボタンが効かない場合は、以下の枠内を長押ししてコピーしてください。
+            </p>
+            <textarea id="prompt-text" readonly style="
+                width: 100%;
+                height: {PROMPT_VIEWER_HEIGHT}px;
+                box-sizing: border-box;
+                font-family: monospace;
+                font-size: 13px;
+            "></textarea>
         </div>
 
+        <script id="prompt-{prompt_hash}" type="application/octet-stream">{payload}</script>
         <script>
+            // 読み込み時に一度だけ展開して枠に入れておく。
+            // コピーは枠の中身を選択するだけにして、クリック操作の中で同期的に実行する（スマホのSafari対策）
+            async function loadPrompt() {{
+                const encoded = document.getElementById('prompt-{prompt_hash}').textContent;
+                const bytes = Uint8Array.from(atob(encoded), c => c.charCodeAt(0));
+                const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream('gzip'));
+                document.getElementById('prompt-text').value = await new Response(stream).text();
+                document.getElementById('copy-button').disabled = false;
+            }}
+
             function copyToClipboard() {{
-                const text = `{clean_prompt.replace('`', '\\`').replace('$', '\\$')}`;
-                const el = document.createElement('textarea');
-                el.value = text;
-                document.body.appendChild(el);
+                const el = document.getElementById('prompt-text');
+                el.focus();
                 el.select();
+                el.setSelectionRange(0, el.value.length);
                 try {{
                     document.execCommand('copy');
                     const msg = document.getElementById('status-msg');
@@ -73,351 +118,278 @@ def display_prompt_card(title, prompt):
                 }} catch (err) {{
                     alert('コピーに失敗しました。手動で選択してコピーしてください。');
                 }}
-                document.body.removeChild(el);
             }}
+
+            loadPrompt();
         </script>
     """
 
-    # HTMLコンポーネントとしてボタンを表示（高さはボタンとメッセージ分で100px程度）
-    components.html(copy_html, height=100)
-
-    # 2. 念のため中身が見えるように展開式で表示（st.codeは補助用）
-    with st.expander("📝 生成されたプロンプトの中身を確認する"):
-        st.info("スマホで上のボタンが効かない場合は、以下の枠内を長押ししてコピーしてください。")
-        st.code(clean_prompt, language="markdown")
-
-def run_overall_analysis(df, df_opponents):
-    """全体の分析プロンプトを生成して表示する。"""
-    summary_data_for_ai = get_score_summary_for_ai(df)
-    match_summary_for_ai = get_match_summary_for_ai(df, df_opponents)
-    point_breakdown_analysis_for_ai = get_point_breakdown_analysis_for_ai(df)
-    serve_receive_analysis_for_ai = get_serve_receive_analysis_for_ai(df)
-    serve_win_rate_analysis_for_ai = get_serve_win_rate_analysis_for_ai(df, '自分')
-    serve_rate_analysis_for_ai = get_serve_rate_transition_for_ai(df, '自分')
-    serve_analysis_for_ai = get_serve_analysis_for_ai(df)
-    overall_receive_analysis_for_ai = get_overall_receive_analysis_for_ai(df)
-    overall_analysis_for_ai = get_overall_score_miss_analysis_for_ai(df)
-    first_drive_analysis_for_ai = get_first_drive_analysis_for_ai(df)
-    my_first_play_analysis_for_ai = get_my_first_play_success_rate_for_ai(df)
-    serve_pattern_for_ai = get_serve_score_pattern_for_ai(df)
-    serve_loss_pattern_for_ai = get_serve_loss_pattern_for_ai(df)
-    recieve_pattern_for_ai = get_recieve_score_pattern_for_ai(df)
-    recieve_loss_pattern_for_ai = get_recieve_loss_pattern_for_ai(df)
-    previous_ball_analysis_for_ai = get_previous_ball_analysis_for_ai(df)
-    consecutive_ball_analysis_for_ai = get_consecutive_ball_analysis_for_ai(df)
-    game_ending_analysis_for_ai = get_game_ending_analysis_for_ai(df)
-
-    prompt = f"""
-{COMMON_PROMPT_HEADER}
-あなたは卓球の優秀な卓球クラブのコーチです。あなたのアドバイスで数々の選手を全国レベルへ引き上げています。
-得点・失点データから、この選手の全体的な特徴と、その特徴を活かすための戦術を教えてください。
-
-■試合全体のサマリー:
-{match_summary_for_ai}
-
-■試合全体の試合の得失点データ:
-{summary_data_for_ai}
-
-■試合全体の得失点の傾向データ: 
-{point_breakdown_analysis_for_ai}
-特にミスの割合やプレーによる得失点の内訳から、選手が改善すべき点や強みについて考察を加えてください。
+    # HTMLコンポーネントとして表示（ボタン・メッセージ・説明文の分に枠の高さを足した固定の高さ）
+    components.html(copy_html, height=PROMPT_VIEWER_HEIGHT + 130)
 
-■サーブ・レシーブ別得失点分析データ:
-{serve_receive_analysis_for_ai}
 
-■サーブ種類別の得点率データ:
-{serve_win_rate_analysis_for_ai}
+def _data_signature(df, df_opponents):
+    """試合データが変わったことを検知するためのハッシュ値を作る。"""
+    return (
+        int(pd.util.hash_pandas_object(df.astype(str), index=False).sum()),
+        int(pd.util.hash_pandas_object(df_opponents.astype(str), index=False).sum()),
+    )
 
-■ゲーム別サーブ種類別得点率の推移データ:
-{serve_rate_analysis_for_ai}
 
-■自分のサーブ種類別の得点・失点内容分析データ:
-{serve_analysis_for_ai}
-
-■相手サーブコース別のレシーブ分析データ:
-{overall_receive_analysis_for_ai}
-
-■全ゲーム合計の得点・失点の種類別集計データ:
-{overall_analysis_for_ai}
-
-■どちらが先にドライブを仕掛けたかの分析データ:
-{first_drive_analysis_for_ai}
-
-■自分が最初に仕掛けたプレーの成功率データ:
-{my_first_play_analysis_for_ai}
-
-■自分のサーブで得点したパターンデータ:
-{serve_pattern_for_ai}
+def _prompt_card(card_title):
+    """
+    プロンプトの指示文とセクションを作る関数を、run_*関数に変換するデコレーター。
+    ボタンが押されたときだけプロンプトを生成してセッションに保存し、
+    同じ試合データとトークン上限であれば、次からは保存したプロンプトカードを使う。
 
-■自分のサーブで失点したパターンデータ:
-{serve_loss_pattern_for_ai}
+    Args:
+        card_title (str): プロンプトカードのタイトル
+    """
+    def decorator(build_sections):
+        @functools.wraps(build_sections)
+        def run(df, df_opponents, token_budget=PROMPT_TOKEN_BUDGET):
+            cards = st.session_state.setdefault(PROMPT_CARDS_KEY, {})
+            data_key = (_data_signature(df, df_opponents), token_budget)
+            card = cards.get(card_title)
+            if card is None or card['data_key'] != data_key:
+                instruction, sections = build_sections(df, df_opponents)
+                header = f"\n{COMMON_PROMPT_HEADER}\n{instruction}\n"
+                prompt, report, total_tokens = fit_prompt_to_budget(header, sections, token_budget)
+                cards[card_title] = {
+                    'data_key': data_key,
+                    'prompt': prompt,
+                    'report': report,
+                    'total_tokens': total_tokens,
+                    'token_budget': token_budget,
+                }
+            st.session_state[ACTIVE_PROMPT_CARD_KEY] = card_title
+        return run
+    return decorator
+
+
+def get_active_prompt():
+    """このセッションで最後にボタンが押されたプロンプトを返す（まだ押されていない場合は None）。"""
+    card_title = st.session_state.get(ACTIVE_PROMPT_CARD_KEY)
+    card = st.session_state.get(PROMPT_CARDS_KEY, {}).get(card_title)
+    return card['prompt'] if card else None
+
+
+def display_active_prompt_card():
+    """このセッションで最後にボタンが押されたプロンプトカードを表示する。"""
+    card_title = st.session_state.get(ACTIVE_PROMPT_CARD_KEY)
+    card = st.session_state.get(PROMPT_CARDS_KEY, {}).get(card_title)
+    if card is None:
+        return
+    display_prompt_card(card_title, card['prompt'], report=card['report'],
+                        total_tokens=card['total_tokens'], token_budget=card['token_budget'])
+
+
+# --- プロンプトの各セクションの優先度と圧縮方法 ---
+# priority が小さいセクションから順に圧縮される。strategies を持たないセクションは圧縮しない。
+# strategies に指定できる処理は prompt_budget.STRATEGY_ORDER を参照。
+PATTERN_STRATEGIES = ['compact', 'dedupe', 'aggregate', 'top_k', 'drop']
+
+SECTION_SETTINGS = {
+    '試合全体のサマリー': {'priority': 100},
+    '試合全体の試合の得失点データ': {'priority': 90, 'strategies': ['compact']},
+    '試合全体の得失点の傾向データ': {'priority': 80, 'strategies': ['compact'],
+                          'note': '特にミスの割合やプレーによる得失点の内訳から、選手が改善すべき点や強みについて考察を加えてください。'},
+    'サーブ・レシーブ別得失点分析データ': {'priority': 80, 'strategies': ['compact']},
+    'サーブ種類別の得点率データ': {'priority': 70, 'strategies': ['compact']},
+    'ゲーム別サーブ種類別得点率の推移データ': {'priority': 50, 'strategies': ['compact', 'top_k', 'drop'], 'top_k': 15},
+    '自分のサーブ種類別の得点・失点内容分析データ': {'priority': 40, 'strategies': ['compact', 'dedupe', 'top_k', 'drop'], 'top_k': 5},
+    '相手サーブコース別のレシーブ分析データ': {'priority': 60, 'strategies': ['compact', 'top_k'], 'top_k': 8},
+    '全ゲーム合計の得点・失点の種類別集計データ': {'priority': 45, 'strategies': ['compact', 'dedupe', 'top_k', 'drop'], 'top_k': 5},
+    'どちらが先にドライブを仕掛けたかの分析データ': {'priority': 60, 'strategies': ['compact']},
+    '自分が最初に仕掛けたプレーの成功率データ': {'priority': 55, 'strategies': ['compact', 'dedupe', 'top_k'], 'top_k': 5},
+    '自分のサーブで得点したパターンデータ': {'priority': 20, 'strategies': PATTERN_STRATEGIES, 'group_by': ['サーブの種類', 'サーブのコース']},
+    '自分のサーブで失点したパターンデータ': {'priority': 25, 'strategies': PATTERN_STRATEGIES, 'group_by': ['サーブの種類', 'サーブのコース']},
+    '自分のレシーブで得点したパターンデータ': {'priority': 20, 'strategies': PATTERN_STRATEGIES, 'group_by': ['レシーブの種類']},
+    '自分のレシーブで失点したパターンデータ': {'priority': 25, 'strategies': PATTERN_STRATEGIES, 'group_by': ['レシーブの種類']},
+    '相手の直前コースと自分の打球技術の成功率データ': {'priority': 60, 'strategies': ['compact'], 'note': PREVIOUS_BALL_NOTE},
+    '連続打球成功率データ': {'priority': 60, 'strategies': ['compact'], 'note': CONSECUTIVE_BALL_NOTE},
+    'ゲーム序盤・中盤と終盤の得点データ': {'priority': 65, 'strategies': ['compact', 'dedupe', 'top_k'], 'top_k': 15},
+    'ラリー時間とテンポのデータ': {'priority': 35, 'strategies': ['compact', 'drop']},
+    'ゲームの流れ（連続得点・連続失点）のデータ': {'priority': 35, 'strategies': ['compact', 'drop']},
+    '打球ごとの得点確率データ': {'priority': 50, 'strategies': ['compact', 'top_k'], 'top_k': 6},
+    '試合の重要なポイントデータ': {'priority': 60, 'strategies': ['compact', 'top_k'], 'top_k': 3},
+    'よく出てくる打球パターンデータ': {'priority': 45, 'strategies': ['compact', 'top_k', 'drop'], 'top_k': 5},
+    '専属コーチからのコメント': {'priority': 50, 'strategies': ['compact', 'dedupe', 'top_k'], 'top_k': 30},
+}
+
+
+def _section(title, body, **overrides):
+    """SECTION_SETTINGS の設定（補足の note を含む）を反映したプロンプトのセクションを作る。"""
+    section = {'title': title, 'body': body, 'note': None}
+    section.update(SECTION_SETTINGS.get(title, {}))
+    section.update(overrides)
+    return section
+
+
+def _text_block(text):
+    """見出しを持たず、圧縮もしない指示文のブロックを作る。"""
+    return {'title': None, 'body': text, 'priority': 1000}
+
+
+def _analysis_sections(items, df, df_opponents, context=None):
+    """
+    analysis_registry に登録された分析からプロンプトのセクションを作る。
+    要素の 'section' に書いた設定は SECTION_SETTINGS より優先される。
+    """
+    return [_section(title, text, **item.get('section', {}))
+            for item, title, text in run_for_ai(items, df, df_opponents, context)]
 
-■自分のレシーブで得点したパターンデータ:
-{recieve_pattern_for_ai}
 
-■自分のレシーブで失点したパターンデータ:
-{recieve_loss_pattern_for_ai}
+# 自分のサーブ・得点状況を分析する関数の共通パラメータ
+MY_SERVE_WIN_RATE = {'analysis': 'serve_win_rate', 'params': {'current_player': '自分'}}
+MY_SERVE_RATE_TRANSITION = {'analysis': 'serve_rate_transition', 'params': {'current_player': '自分'}}
 
-■相手の直前コースと自分の打球技術の成功率データ:
-{previous_ball_analysis_for_ai}
-※相手の直前コースがバックで自分の打球技術がフォアハンド系の場合には、回り込みフォアの技術の成功率（勝負をかけたときの決定率）を示す。
 
-■連続打球成功率データ:
-{consecutive_ball_analysis_for_ai}
-※相手コースバック → 自分バックハンド系の成功率が高い場合には、バック対バックで主導権を握れている。
-※相手コースフォア → 自分フォアハンド系の成功率が高い場合には、フォア対フォアで主導権を握れている。
+def _focused(analysis_name):
+    """得点源・失点改善などの絞り込んだプロンプトで、パターンデータを残りやすくする。"""
+    return {'analysis': analysis_name, 'section': {'priority': 55}}
 
-■ゲーム序盤・中盤と終盤の得点データ:
-{game_ending_analysis_for_ai}
-"""
-    display_prompt_card("全体分析プロンプト", prompt)
 
 
+@_prompt_card("全体分析プロンプト")
+def run_overall_analysis(df, df_opponents):
+    """全体の分析プロンプトの指示文とセクションを作る。"""
+    sections = _analysis_sections([
+        'match_summary',
+        'score_summary',
+        'point_breakdown',
+        'serve_receive',
+        MY_SERVE_WIN_RATE,
+        MY_SERVE_RATE_TRANSITION,
+        'serve_analysis',
+        'overall_receive',
+        'overall_score_miss',
+        'first_drive',
+        'my_first_play',
+        'serve_score_pattern',
+        'serve_loss_pattern',
+        'recieve_score_pattern',
+        'recieve_loss_pattern',
+        'previous_ball',
+        'consecutive_ball',
+        'game_ending',
+        'rally_tempo',
+        'momentum',
+    ], df, df_opponents)
+    instruction = """あなたは卓球の優秀な卓球クラブのコーチです。あなたのアドバイスで数々の選手を全国レベルへ引き上げています。
+得点・失点データから、この選手の全体的な特徴と、その特徴を活かすための戦術を教えてください。"""
+    return instruction, sections
+
+
+@_prompt_card("得点源強化プロンプト")
 def run_scores_analysis(df, df_opponents):
-    """得点源の強化プロンプトを生成して表示する。"""
-    summary_data_for_ai = get_score_summary_for_ai(df)
-    match_summary_for_ai = get_match_summary_for_ai(df, df_opponents)
-    serve_receive_analysis_for_ai = get_serve_receive_analysis_for_ai(df)
-    serve_win_rate_analysis_for_ai = get_serve_win_rate_analysis_for_ai(df, '自分')
-    serve_rate_analysis_for_ai = get_serve_rate_transition_for_ai(df, '自分')
-    serve_analysis_for_ai = get_serve_analysis_for_ai(df)
-    overall_receive_analysis_for_ai = get_overall_receive_analysis_for_ai(df)
-    overall_analysis_for_ai = get_overall_score_miss_analysis_for_ai(df)
-    serve_pattern_for_ai = get_serve_score_pattern_for_ai(df)
-    recieve_pattern_for_ai = get_recieve_score_pattern_for_ai(df)
-
-    prompt = f"""
-{COMMON_PROMPT_HEADER}
-あなたは卓球の優秀なコーチです。あなたのアドバイスで数々の選手を全国レベルへ引き上げています。
-得点データから、この選手の得点源を強化するための練習を３つ教えてください。
-
-■試合全体のサマリー:
-{match_summary_for_ai}
-
-■試合全体の試合の得失点データ:
-{summary_data_for_ai}
-
-■サーブ・レシーブ別得失点分析データ:
-{serve_receive_analysis_for_ai}
-
-■サーブ種類別の得点率データ:
-{serve_win_rate_analysis_for_ai}
-
-■ゲーム別サーブ種類別得点率の推移データ:
-{serve_rate_analysis_for_ai}
-
-■自分のサーブ種類別の得点・失点内容分析データ:
-{serve_analysis_for_ai}
-
-■相手サーブコース別のレシーブ分析データ:
-{overall_receive_analysis_for_ai}
-
-■全ゲーム合計の得点・失点の種類別集計データ:
-{overall_analysis_for_ai}
-
-■自分のサーブで得点したパターンデータ:
-{serve_pattern_for_ai}
-
-■自分のレシーブで得点したパターンデータ:
-{recieve_pattern_for_ai}
-"""
-    display_prompt_card("得点源強化プロンプト", prompt)
-
-
+    """得点源の強化プロンプトの指示文とセクションを作る。"""
+    sections = _analysis_sections([
+        'match_summary',
+        'score_summary',
+        'serve_receive',
+        MY_SERVE_WIN_RATE,
+        MY_SERVE_RATE_TRANSITION,
+        'serve_analysis',
+        'overall_receive',
+        'overall_score_miss',
+        _focused('serve_score_pattern'),
+        _focused('recieve_score_pattern'),
+    ], df, df_opponents)
+    instruction = """あなたは卓球の優秀なコーチです。あなたのアドバイスで数々の選手を全国レベルへ引き上げています。
+得点データから、この選手の得点源を強化するための練習を３つ教えてください。"""
+    return instruction, sections
+
+
+@_prompt_card("失点改善プロンプト")
 def run_misses_analysis(df, df_opponents):
-    """失点パターンの改善プロンプトを生成して表示する。"""
-    summary_data_for_ai = get_score_summary_for_ai(df)
-    match_summary_for_ai = get_match_summary_for_ai(df, df_opponents)
-    serve_receive_analysis_for_ai = get_serve_receive_analysis_for_ai(df)
-    serve_win_rate_analysis_for_ai = get_serve_win_rate_analysis_for_ai(df, '自分')
-    serve_rate_analysis_for_ai = get_serve_rate_transition_for_ai(df, '自分')
-    serve_analysis_for_ai = get_serve_analysis_for_ai(df)
-    overall_receive_analysis_for_ai = get_overall_receive_analysis_for_ai(df)
-    overall_analysis_for_ai = get_overall_score_miss_analysis_for_ai(df)
-    first_drive_analysis_for_ai = get_first_drive_analysis_for_ai(df)
-    my_first_play_analysis_for_ai = get_my_first_play_success_rate_for_ai(df)
-    serve_loss_pattern_for_ai = get_serve_loss_pattern_for_ai(df)
-    recieve_loss_pattern_for_ai = get_recieve_loss_pattern_for_ai(df)
-
-    prompt = f"""
-{COMMON_PROMPT_HEADER}
-あなたは卓球の優秀なコーチです。あなたのアドバイスで数々の選手を全国レベルへ引き上げています。
-失点データから、この選手の失点源を改善するための練習を３つ教えてください。
-
-■試合全体のサマリー:
-{match_summary_for_ai}
-
-■試合全体の試合の得失点データ:
-{summary_data_for_ai}
-
-■サーブ・レシーブ別得失点分析データ:
-{serve_receive_analysis_for_ai}
-
-■サーブ種類別の得点率データ:
-{serve_win_rate_analysis_for_ai}
-
-■ゲーム別サーブ種類別得点率の推移データ:
-{serve_rate_analysis_for_ai}
-
-■自分のサーブ種類別の得点・失点内容分析データ:
-{serve_analysis_for_ai}
-
-■相手サーブコース別のレシーブ分析データ:
-{overall_receive_analysis_for_ai}
-
-■全ゲーム合計の得点・失点の種類別集計データ:
-{overall_analysis_for_ai}
-
-■どちらが先にドライブを仕掛けたかの分析データ:
-{first_drive_analysis_for_ai}
-
-■自分が最初に仕掛けたプレーの成功率データ:
-{my_first_play_analysis_for_ai}
-
-■自分のサーブで失点したパターンデータ:
-{serve_loss_pattern_for_ai}
-
-■自分のレシーブで失点したパターンデータ:
-{recieve_loss_pattern_for_ai}
-"""
-    display_prompt_card("失点改善プロンプト", prompt)
-
-
+    """失点パターンの改善プロンプトの指示文とセクションを作る。"""
+    sections = _analysis_sections([
+        'match_summary',
+        'score_summary',
+        'serve_receive',
+        MY_SERVE_WIN_RATE,
+        MY_SERVE_RATE_TRANSITION,
+        'serve_analysis',
+        'overall_receive',
+        'overall_score_miss',
+        'first_drive',
+        'my_first_play',
+        _focused('serve_loss_pattern'),
+        _focused('recieve_loss_pattern'),
+    ], df, df_opponents)
+    instruction = """あなたは卓球の優秀なコーチです。あなたのアドバイスで数々の選手を全国レベルへ引き上げています。
+失点データから、この選手の失点源を改善するための練習を３つ教えてください。"""
+    return instruction, sections
+
+
+@_prompt_card("謎のコーチ分析プロンプト")
 def run_coach_analysis(df, df_opponents):
-    """謎の専属コーチの分析プロンプトを生成して表示する。"""
-    data_to_analyze = get_ai_analysis_data('coach', df)
-    match_summary_for_ai = get_match_summary_for_ai(df, df_opponents)
-    prompt = f"""
-{COMMON_PROMPT_HEADER}
-あなたは卓球の選手の父親兼コーチです。でも父親と分からないように謎のコーチを演じてください。
+    """謎の専属コーチの分析プロンプトの指示文とセクションを作る。"""
+    sections = _analysis_sections([
+        'match_summary',
+        {'analysis': 'coach_comments', 'params': {'analysis_type': 'coach'}},
+    ], df, df_opponents)
+    instruction = """あなたは卓球の選手の父親兼コーチです。でも父親と分からないように謎のコーチを演じてください。
 コメントの一覧は父親が息子のプレーを見て感じたことを書いたものです。
-選手に寄り添った言葉で、今後のモチベーション向上につながるような温かいアドバイスを２００文字程度でお願いします。
-
-■試合全体のサマリー:
-{match_summary_for_ai}
-
-■専属コーチからのコメント:
-{data_to_analyze}
-"""
-    display_prompt_card("謎のコーチ分析プロンプト", prompt)
+選手に寄り添った言葉で、今後のモチベーション向上につながるような温かいアドバイスを２００文字程度でお願いします。"""
+    return instruction, sections
 
 
+@_prompt_card("サーブ戦術分析プロンプト")
 def run_serve_tactics_analysis(df, df_opponents):
-    """サーブ戦術分析プロンプトを生成して表示する。"""
-    summary_data_for_ai = get_score_summary_for_ai(df)
-    match_summary_for_ai = get_match_summary_for_ai(df, df_opponents)
-    serve_receive_analysis_for_ai = get_serve_receive_analysis_for_ai(df)
-    serve_win_rate_analysis_for_ai = get_serve_win_rate_analysis_for_ai(df, '自分')
-    serve_rate_analysis_for_ai = get_serve_rate_transition_for_ai(df, '自分')
-    serve_analysis_for_ai = get_serve_analysis_for_ai(df)
-    overall_analysis_for_ai = get_overall_score_miss_analysis_for_ai(df)
-    serve_pattern_for_ai = get_serve_score_pattern_for_ai(df)
-    serve_loss_pattern_for_ai = get_serve_loss_pattern_for_ai(df)
-    prompt = f"""
-{COMMON_PROMPT_HEADER}
-あなたは卓球の優秀なコーチです。サーブの戦術を分析し、得意パターンと苦手なパターンを教えてあげてください。
-
-■試合全体のサマリー:
-{match_summary_for_ai}
-
-■試合全体の試合の得失点データ:
-{summary_data_for_ai}
-
-■サーブ・レシーブ別得失点分析データ:
-{serve_receive_analysis_for_ai}
-
-■サーブ種類別の得点率データ:
-{serve_win_rate_analysis_for_ai}
-
-■ゲーム別サーブ種類別得点率の推移データ:
-{serve_rate_analysis_for_ai}
-
-■自分のサーブ種類別の得点・失点内容分析データ:
-{serve_analysis_for_ai}
-
-■全ゲーム合計の得点・失点の種類別集計データ:
-{overall_analysis_for_ai}
-
-■自分のサーブで得点したパターンデータ:
-{serve_pattern_for_ai}
-
-■自分のサーブで失点したパターンデータ:
-{serve_loss_pattern_for_ai}
-"""
-    display_prompt_card("サーブ戦術分析プロンプト", prompt)
-
-
+    """サーブ戦術分析プロンプトの指示文とセクションを作る。"""
+    sections = _analysis_sections([
+        'match_summary',
+        'score_summary',
+        'serve_receive',
+        MY_SERVE_WIN_RATE,
+        MY_SERVE_RATE_TRANSITION,
+        'serve_analysis',
+        'overall_score_miss',
+        _focused('serve_score_pattern'),
+        _focused('serve_loss_pattern'),
+        {'analysis': 'shot_sequences', 'params': {'server': '自分'}},
+    ], df, df_opponents)
+    instruction = "あなたは卓球の優秀なコーチです。サーブの戦術を分析し、得意パターンと苦手なパターンを教えてあげてください。"
+    return instruction, sections
+
+
+@_prompt_card("レシーブ戦術分析プロンプト")
 def run_receive_tactics_analysis(df, df_opponents):
-    """レシーブ戦術分析プロンプトを生成して表示する。"""
-    summary_data_for_ai = get_score_summary_for_ai(df)
-    match_summary_for_ai = get_match_summary_for_ai(df, df_opponents)
-    overall_receive_analysis_for_ai = get_overall_receive_analysis_for_ai(df)
-    overall_analysis_for_ai = get_overall_score_miss_analysis_for_ai(df)
-    serve_receive_analysis_for_ai = get_serve_receive_analysis_for_ai(df)
-    recieve_pattern_for_ai = get_recieve_score_pattern_for_ai(df)
-    recieve_loss_pattern_for_ai = get_recieve_loss_pattern_for_ai(df)
-    prompt = f"""
-{COMMON_PROMPT_HEADER}
-あなたは卓球の優秀なコーチです。レシーブの戦術を分析し、得意パターンと苦手なパターンを教えてあげてください。
-
-■試合全体のサマリー:
-{match_summary_for_ai}
-
-■試合全体の試合の得失点データ:
-{summary_data_for_ai}
-
-■サーブ・レシーブ別得失点分析データ:
-{serve_receive_analysis_for_ai}
-
-■相手サーブコース別のレシーブ分析データ:
-{overall_receive_analysis_for_ai}
-
-■自分のレシーブで得点したパターンデータ:
-{recieve_pattern_for_ai}
-
-■自分のレシーブで失点したパターンデータ:
-{recieve_loss_pattern_for_ai}
-"""
-    display_prompt_card("レシーブ戦術分析プロンプト", prompt)
-
-
+    """レシーブ戦術分析プロンプトの指示文とセクションを作る。"""
+    sections = _analysis_sections([
+        'match_summary',
+        'score_summary',
+        'serve_receive',
+        'overall_receive',
+        _focused('recieve_score_pattern'),
+        _focused('recieve_loss_pattern'),
+        {'analysis': 'shot_sequences', 'params': {'server': '相手'}},
+    ], df, df_opponents)
+    instruction = "あなたは卓球の優秀なコーチです。レシーブの戦術を分析し、得意パターンと苦手なパターンを教えてあげてください。"
+    return instruction, sections
+
+
+@_prompt_card("ラリー戦術分析プロンプト")
 def run_rally_tactics_analysis(df, df_opponents):
-    """ラリー戦術分析プロンプトを生成して表示する。"""
-    match_summary_for_ai = get_match_summary_for_ai(df, df_opponents)
-    previous_ball_analysis_for_ai = get_previous_ball_analysis_for_ai(df)
-    consecutive_ball_analysis_for_ai = get_consecutive_ball_analysis_for_ai(df)
-
-    prompt = f"""
-{COMMON_PROMPT_HEADER}
-あなたは卓球の優秀なコーチです。ラリーの戦術を分析してください。バック対バックで主導権を握れているのか、フォア対フォアで打ち勝っているのか。
-
-■試合全体のサマリー:
-{match_summary_for_ai}
-
-■相手の直前コースと自分の打球技術の成功率データ:
-{previous_ball_analysis_for_ai}
-※相手の直前コースがバックで自分の打球技術がフォアハンド系の場合には、回り込みフォアの技術の成功率（勝負をかけたときの決定率）を示す。
-
-■連続打球成功率データ:
-{consecutive_ball_analysis_for_ai}
-※相手コースバック → 自分バックハンド系の成功率が高い場合には、バック対バックで主導権を握れている。
-※相手コースフォア → 自分フォアハンド系の成功率が高い場合には、フォア対フォアで主導権を握れている。
-"""
-    display_prompt_card("ラリー戦術分析プロンプト", prompt)
-
-
+    """ラリー戦術分析プロンプトの指示文とセクションを作る。"""
+    sections = _analysis_sections([
+        'match_summary',
+        'previous_ball',
+        'consecutive_ball',
+        'rally_markov',
+    ], df, df_opponents)
+    instruction = "あなたは卓球の優秀なコーチです。ラリーの戦術を分析してください。バック対バックで主導権を握れているのか、フォア対フォアで打ち勝っているのか。"
+    return instruction, sections
+
+
+@_prompt_card("試合運び分析プロンプト")
 def run_match_tactics_analysis(df, df_opponents):
-    """試合運び(戦術)分析プロンプトを生成して表示する。"""
-    match_summary_for_ai = get_match_summary_for_ai(df, df_opponents)
-    game_ending_analysis_for_ai = get_game_ending_analysis_for_ai(df)
-    prompt = f"""
-{COMMON_PROMPT_HEADER}
-あなたは卓球の優秀なコーチです。試合運び(戦術)を分析してください。
-
-■試合全体のサマリー:
-{match_summary_for_ai}
-
-分析観点１：試合終盤での得点率
+    """試合運び(戦術)分析プロンプトの指示文とセクションを作る。"""
+    context = create_context(df, df_opponents)
+    sections = _analysis_sections(['match_summary'], df, df_opponents, context)
+    sections.append(_text_block("""分析観点１：試合終盤での得点率
 分析観点２：試合終盤でのサーブの選択の評価。
 　これまで得点率の高かったサーブを選択しているか（成功率は60%を越えているか）。
 　今まで選択していないプレーで得点を狙っているか。相手の意表を突くサーブで仕掛けたか。
@@ -426,7 +398,7 @@ def run_match_tactics_analysis(df, df_opponents):
 分析観点３：得点と失点の内容から終盤の傾向を分析。
 （例：相手が勝負をしかけてきて対応できなかった。自分のミスで崩れた。自分が勝負をかけて勝利。相手がミスで崩れた等）
 
-■ゲーム序盤・中盤と終盤の得点データ:
-{game_ending_analysis_for_ai}
-"""
-    display_prompt_card("試合運び分析プロンプト", prompt)
+分析観点４：試合を取る確率が大きく変わる重要なポイントで得点できていたか。"""))
+    sections += _analysis_sections(['game_ending', 'match_win_probability'], df, df_opponents, context)
+    instruction = "あなたは卓球の優秀なコーチです。試合運び(戦術)を分析してください。"
+    return instruction, sections
@@ -0,0 +1,81 @@
+"""
+Gemini APIの代わりに使うローカルのスタブサーバー。
+AI_BACKEND=stub で起動したアプリや bench_ai_client.py から、APIキーなしでAI機能を試せる。
+
+使い方:
+    python ai_stub_server.py --port 8765 --delay 0.05
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def build_stub_answer(prompt, model):
+    """プロンプトの内容から決まった回答を作る（同じプロンプトには同じ回答を返す）。"""
+    first_line = next((line for line in prompt.splitlines() if line.strip()), '')
+    return (
+        f"【スタブ回答 / {model}】\n"
+        f"プロンプトを受け取りました（{len(prompt)}文字）。\n"
+        f"先頭行: {first_line[:50]}\n"
+        "1. サーブからの3球目攻撃を強化しましょう。\n"
+        "2. レシーブのミスを減らしましょう。\n"
+        "3. 終盤は得点率の高いサーブを選びましょう。\n"
+    )
+
+
+def make_handler(delay, chunk_size, stats):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.0'
+
+        def do_POST(self):
+            if self.path != '/generate':
+                self.send_error(404)
+                return
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length).decode('utf-8'))
+            with stats['lock']:
+                stats['requests'] += 1
+
+            answer = build_stub_answer(request.get('prompt', ''), request.get('model', ''))
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; charset=utf-8')
+            self.end_headers()
+            # 本物のAPIのストリーミングのように、少しずつ遅延を入れて返す
+            for start in range(0, len(answer), chunk_size):
+                self.wfile.write(answer[start:start + chunk_size].encode('utf-8'))
+                self.wfile.flush()
+                time.sleep(delay)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def start_stub_server(host='127.0.0.1', port=8765, delay=0.05, chunk_size=20):
+    """
+    スタブサーバーを別スレッドで起動する。
+
+    Returns:
+        tuple: (サーバー, 受け付けたリクエスト数を持つdict)
+    """
+    stats = {'requests': 0, 'lock': threading.Lock()}
+    server = ThreadingHTTPServer((host, port), make_handler(delay, chunk_size, stats))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, stats
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Gemini APIのローカルスタブ')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--delay', type=float, default=0.05, help='チャンクごとの遅延（秒）')
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port),
+                                 make_handler(args.delay, 20, {'requests': 0, 'lock': threading.Lock()}))
+    print(f"スタブサーバーを起動しました: http://{args.host}:{args.port}/generate")
+    server.serve_forever()
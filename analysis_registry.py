@@ -0,0 +1,527 @@
+import importlib
+
+import streamlit as st
+
+from game_rules import SHOT_COLUMNS, build_score_state
+from rally_tensor import encode_rallies
+
+# 派生データの名前 → 作り方と、作るために必要な列
+DERIVED_INPUTS = {
+    # 各ラリーの前のスコアとゲームの局面（game_rules.build_score_state）
+    'score_state': {
+        'builder': build_score_state,
+        'required_columns': ['ゲーム数', '自分の得点', '相手の得点', '得点者'],
+    },
+    # 1〜6球目の打球を uint8 の配列にしたもの（rally_tensor.encode_rallies の (配列, 語彙)）
+    'shots': {
+        'builder': encode_rallies,
+        'required_columns': [],
+    },
+}
+
+# --- 分析の登録 ---
+# title: 画面に表示する分析名
+# module: 分析のモジュール名（実行するときに初めて読み込む）
+# display / ai: 画面表示用の関数名 / AIプロンプト用の文字列を返す関数名（ない場合は None）
+# inputs: 関数に渡すデータ（'df', 'df_opponents', または DERIVED_INPUTS の名前）。引数名と同じ名前で渡す
+# params: ビューやプロンプトから指定する引数の名前
+# required_columns: 分析に必要な列
+# ai_title: AIプロンプトのセクション見出し
+_PATTERN_COLUMNS = ['開始時刻', '得失点の種類', 'ゲーム数', '誰のサーブか', '得点者', 'コメント・課題', 'YouTubeリンク']
+_RALLY_COLUMNS = [
+    '誰のサーブか', 'サーブのコース', 'レシーブの種類', 'レシーブのコース', 'レシーブの質',
+    '３球目の種類', '３球目のコース', '３球目の質', '４球目の種類', '４球目のコース', '４球目の質',
+    '５球目の種類', '５球目のコース', '５球目の質', '６球目の種類', '６球目のコース', '６球目の質',
+]
+
+ANALYSES = {
+    'match_summary': {
+        'title': '試合結果のサマリー',
+        'module': 'match_summary',
+        'display': 'display_match_summary',
+        'ai': 'get_match_summary_for_ai',
+        'inputs': ['df', 'df_opponents'],
+        'required_columns': ['ゲーム数', '自分の得点', '相手の得点'],
+        'ai_title': '試合全体のサマリー',
+    },
+    'score_summary': {
+        'title': '得失点合計と内訳',
+        'module': 'score_summary',
+        'display': 'display_score_summary',
+        'ai': 'get_score_summary_for_ai',
+        'inputs': ['df'],
+        'required_columns': ['得失点の種類', 'ゲーム数'],
+        'ai_title': '試合全体の試合の得失点データ',
+    },
+    'point_breakdown': {
+        'title': '得失点の傾向',
+        'module': 'point_breakdown_analysis',
+        'display': 'display_point_breakdown_analysis',
+        'ai': 'get_point_breakdown_analysis_for_ai',
+        'inputs': ['df'],
+        'required_columns': ['得失点の種類', 'ゲーム数'],
+        'ai_title': '試合全体の得失点の傾向データ',
+    },
+    'serve_receive': {
+        'title': 'サーブ・レシーブ別得失点分析',
+        'module': 'serve_receive_analysis',
+        'display': 'display_serve_receive_analysis',
+        'ai': 'get_serve_receive_analysis_for_ai',
+        'inputs': ['df'],
+        'required_columns': ['得失点の種類', 'ゲーム数', '誰のサーブか'],
+        'ai_title': 'サーブ・レシーブ別得失点分析データ',
+    },
+    'serve_win_rate': {
+        'title': 'サーブ種類別の得点率',
+        'module': 'serve_win_rate_analysis',
+        'display': 'display_serve_win_rate_analysis',
+        'ai': 'get_serve_win_rate_analysis_for_ai',
+        'inputs': ['df', 'score_state'],
+        'params': ['current_player'],
+        'required_columns': ['誰のサーブか', 'サーブの種類', '得点者', '自分の得点', '相手の得点'],
+        'ai_title': 'サーブ種類別の得点率データ',
+    },
+    'serve_court_map': {
+        'title': 'サーブコースの分析',
+        'module': 'serve_court_map',
+        'display': 'display_serve_court_map',
+        'ai': None,
+        'inputs': ['df', 'df_opponents', 'score_state'],
+        'params': ['current_server_type', 'phase'],
+        'required_columns': ['サーブのコース', 'サーブの種類', '誰のサーブか', '自分の得点', '相手の得点', '得点者'],
+    },
+    'serve_rate_transition': {
+        'title': 'ゲーム別サーブ種類別得点率の推移',
+        'module': 'serve_rate_transition',
+        'display': 'display_serve_rate_transition',
+        'ai': 'get_serve_rate_transition_for_ai',
+        'inputs': ['df'],
+        'params': ['current_player'],
+        'required_columns': ['誰のサーブか', 'ゲーム数', 'サーブの種類', '得点者'],
+        'ai_title': 'ゲーム別サーブ種類別得点率の推移データ',
+    },
+    'serve_analysis': {
+        'title': 'サーブ種類別の得点・失点内容分析',
+        'module': 'serve_analysis',
+        'display': 'display_serve_analysis',
+        'ai': 'get_serve_analysis_for_ai',
+        'inputs': ['df'],
+        'required_columns': ['誰のサーブか', 'サーブの種類', '得点者', '得点の種類', '得点の内容', '失点の種類', '失点の内容', 'サーブのコース'],
+        'ai_title': '自分のサーブ種類別の得点・失点内容分析データ',
+    },
+    'overall_receive': {
+        'title': '相手サーブコース別のレシーブ分析',
+        'module': 'overall_receive_analysis',
+        'display': 'display_overall_receive_analysis',
+        'ai': 'get_overall_receive_analysis_for_ai',
+        'inputs': ['df'],
+        'required_columns': ['誰のサーブか', 'サーブのコース', 'レシーブの種類', '得点者', '６球目の種類'],
+        'ai_title': '相手サーブコース別のレシーブ分析データ',
+    },
+    'overall_score_miss': {
+        'title': '得点・失点の種類別集計',
+        'module': 'overall_score_miss_analysis',
+        'display': 'display_overall_score_miss_analysis',
+        'ai': 'get_overall_score_miss_analysis_for_ai',
+        'inputs': ['df'],
+        'required_columns': ['ゲーム数', '得点の種類', '失点の種類', '開始時刻', '得点の内容', '失点の内容', 'YouTubeリンク', '得失点の種類'],
+        'ai_title': '全ゲーム合計の得点・失点の種類別集計データ',
+    },
+    'first_drive': {
+        'title': 'どちらが先にドライブを仕掛けたか分析',
+        'module': 'first_drive_analysis',
+        'display': 'display_first_drive_analysis',
+        'ai': 'get_first_drive_analysis_for_ai',
+        'inputs': ['df'],
+        'required_columns': ['誰のサーブか', 'レシーブの種類', '３球目の種類', '４球目の種類', '５球目の種類', '６球目の種類', '得点者'],
+        'ai_title': 'どちらが先にドライブを仕掛けたかの分析データ',
+    },
+    'my_first_play': {
+        'title': '自分が最初に仕掛けたプレーの成功率',
+        'module': 'my_first_play_success_rate',
+        'display': 'display_my_first_play_success_rate',
+        'ai': 'get_my_first_play_success_rate_for_ai',
+        'inputs': ['df'],
+        'required_columns': [
+            '誰のサーブか', 'レシーブの種類', '３球目の種類', '４球目の種類', '５球目の種類', '６球目の種類',
+            'レシーブの質', '３球目の質', '４球目の質', '５球目の質', '６球目の質', '得失点の種類', '失点の内容',
+            '開始時刻', 'YouTubeリンク',
+        ],
+        'ai_title': '自分が最初に仕掛けたプレーの成功率データ',
+    },
+    'previous_ball': {
+        'title': '相手の直前コースと自分の打球技術の成功率',
+        'module': 'previous_ball_analysis',
+        'display': 'display_previous_ball_analysis',
+        'ai': 'get_previous_ball_analysis_for_ai',
+        'inputs': ['df'],
+        'required_columns': _RALLY_COLUMNS + ['得点者'],
+        'ai_title': '相手の直前コースと自分の打球技術の成功率データ',
+    },
+    'consecutive_ball': {
+        'title': '連続打球成功率',
+        'module': 'consecutive_ball_analysis',
+        'display': 'display_consecutive_ball_analysis',
+        'ai': 'get_consecutive_ball_analysis_for_ai',
+        'inputs': ['df'],
+        'required_columns': _RALLY_COLUMNS,
+        'ai_title': '連続打球成功率データ',
+    },
+    'my_drive_maps': {
+        'title': '自分のドライブ分析',
+        'module': 'drive_analysis_tab',
+        'display': 'display_my_drive_maps',
+        'ai': None,
+        'inputs': ['df', 'df_opponents'],
+        'required_columns': ['誰のサーブか'] + [col for shot in SHOT_COLUMNS for col in shot[1:]],
+    },
+    'opponent_drive_maps': {
+        'title': '相手のドライブ分析',
+        'module': 'drive_analysis_tab',
+        'display': 'display_opponent_drive_maps',
+        'ai': None,
+        'inputs': ['df', 'df_opponents'],
+        'required_columns': ['誰のサーブか'] + [col for shot in SHOT_COLUMNS for col in shot[1:]],
+    },
+    'game_ending': {
+        'title': 'ゲーム終盤の分析',
+        'module': 'game_ending_analysis',
+        'display': 'display_game_ending_analysis',
+        'ai': 'get_game_ending_analysis_for_ai',
+        'inputs': ['df'],
+        'required_columns': [
+            'ゲーム数', '誰のサーブか', '得点者', '自分の得点', '相手の得点', 'サーブの種類', 'サーブのコース',
+            'レシーブの種類', 'レシーブのコース', '得点の内容', '失点の内容',
+        ],
+        'ai_title': 'ゲーム序盤・中盤と終盤の得点データ',
+    },
+    'serve_score_pattern': {
+        'title': 'サーブ時の得点パターン一覧',
+        'module': 'serve_score_pattern',
+        'display': 'display_serve_score_pattern',
+        'ai': 'get_serve_score_pattern_for_ai',
+        'inputs': ['df'],
+        'required_columns': _PATTERN_COLUMNS + ['サーブの種類', 'サーブのコース', 'サーブの質', '得点の内容'],
+        'ai_title': '自分のサーブで得点したパターンデータ',
+    },
+    'serve_loss_pattern': {
+        'title': 'サーブ時の失点パターン一覧',
+        'module': 'serve_loss_pattern',
+        'display': 'display_serve_loss_pattern',
+        'ai': 'get_serve_loss_pattern_for_ai',
+        'inputs': ['df'],
+        'required_columns': _PATTERN_COLUMNS + ['サーブの種類', 'サーブのコース', 'サーブの質', '失点の内容'],
+        'ai_title': '自分のサーブで失点したパターンデータ',
+    },
+    'recieve_score_pattern': {
+        'title': 'レシーブ時の得点パターン一覧',
+        'module': 'recieve_score_pattern',
+        'display': 'display_recieve_score_pattern',
+        'ai': 'get_recieve_score_pattern_for_ai',
+        'inputs': ['df'],
+        'required_columns': _PATTERN_COLUMNS + ['レシーブの種類', '得点の内容'],
+        'ai_title': '自分のレシーブで得点したパターンデータ',
+    },
+    'recieve_loss_pattern': {
+        'title': 'レシーブ時の失点パターン一覧',
+        'module': 'recieve_loss_pattern',
+        'display': 'display_recieve_loss_pattern',
+        'ai': 'get_recieve_loss_pattern_for_ai',
+        'inputs': ['df'],
+        'required_columns': _PATTERN_COLUMNS + ['レシーブの種類', '失点の内容'],
+        'ai_title': '自分のレシーブで失点したパターンデータ',
+    },
+    'match_win_probability': {
+        'title': '試合を取る確率と重要なポイント',
+        'module': 'match_win_probability',
+        'display': 'display_match_win_probability',
+        'ai': 'get_match_win_probability_for_ai',
+        'inputs': ['df', 'score_state'],
+        'required_columns': ['ゲーム数', '自分の得点', '相手の得点', '得点者', '誰のサーブか'],
+        'ai_title': '試合の重要なポイントデータ',
+    },
+    'rally_tempo': {
+        'title': 'ラリー時間とテンポ',
+        'module': 'rally_tempo',
+        'display': 'display_rally_tempo',
+        'ai': 'get_rally_tempo_for_ai',
+        'inputs': ['df', 'score_state'],
+        'required_columns': ['ゲーム数', '自分の得点', '相手の得点', '得点者', '開始時刻', '終了時刻'],
+        'ai_title': 'ラリー時間とテンポのデータ',
+    },
+    'momentum': {
+        'title': '連続得点・連続失点とゲームの流れ',
+        'module': 'momentum',
+        'display': 'display_momentum',
+        'ai': 'get_momentum_for_ai',
+        'inputs': ['df', 'score_state'],
+        'required_columns': ['ゲーム数', '自分の得点', '相手の得点', '得点者'],
+        'ai_title': 'ゲームの流れ（連続得点・連続失点）のデータ',
+    },
+    'rally_markov': {
+        'title': '打球ごとの得点確率',
+        'module': 'rally_markov',
+        'display': 'display_rally_markov',
+        'ai': 'get_rally_markov_for_ai',
+        'inputs': ['df', 'shots'],
+        'required_columns': ['誰のサーブか', '得点者', 'サーブの種類'],
+        'ai_title': '打球ごとの得点確率データ',
+    },
+    'shot_sequences': {
+        'title': 'よく出てくる打球パターン',
+        'module': 'shot_sequence_mining',
+        'display': 'display_shot_sequence_patterns',
+        'ai': 'get_shot_sequence_patterns_for_ai',
+        'inputs': ['df', 'shots'],
+        'params': ['server'],
+        'required_columns': ['誰のサーブか', '得点者', 'サーブの種類'],
+        'ai_title': 'よく出てくる打球パターンデータ',
+    },
+    'match_data': {
+        'title': '試合データ一覧',
+        'module': 'match_data',
+        'display': 'display_match_data',
+        'ai': 'get_match_data_for_ai',
+        'inputs': ['df'],
+        'required_columns': ['開始時刻', 'ゲーム数', '自分の得点', '相手の得点', '得点者', 'コメント・課題', 'YouTubeリンク'],
+        'ai_title': '試合データ一覧',
+    },
+    'opponent_serve_sequence': {
+        'title': '相手のサーブの傾向',
+        'module': 'serve_trend_analysis',
+        'display': 'display_opponent_serve_sequence_analysis',
+        'ai': None,
+        'inputs': ['df', 'df_opponents'],
+        'required_columns': ['ゲーム数', '誰のサーブか', '自分の得点', '相手の得点', 'サーブの種類', 'サーブのコース'],
+    },
+    'opponent_scouting': {
+        'title': '対戦相手との全試合の傾向',
+        'module': 'scouting_report',
+        'display': 'display_opponent_scouting_report',
+        'ai': None,
+        'inputs': ['df_opponents'],
+        'required_columns': [],
+    },
+    'season_trend': {
+        'title': 'シーズンの推移',
+        'module': 'season_trend',
+        'display': 'display_season_trend',
+        'ai': None,
+        'inputs': [],
+        'required_columns': [],
+    },
+    'similar_rallies': {
+        'title': '似たラリーの検索',
+        'module': 'similar_rallies',
+        'display': 'display_similar_rallies',
+        'ai': None,
+        'inputs': ['df'],
+        'required_columns': ['ゲーム数', '自分の得点', '相手の得点', '得点者'],
+    },
+    'clip_playlist': {
+        'title': '動画クリップのプレイリスト',
+        'module': 'clip_playlist',
+        'display': 'display_clip_playlist',
+        'ai': None,
+        'inputs': ['df', 'score_state'],
+        'required_columns': ['ゲーム数', '自分の得点', '相手の得点', '得点者', '開始時刻'],
+    },
+    'rally_search': {
+        'title': 'ラリーのコメント検索',
+        'module': 'rally_search',
+        'display': 'display_rally_search',
+        'ai': None,
+        'inputs': [],
+        'required_columns': [],
+    },
+    'coach_comments': {
+        'title': '専属コーチのコメント',
+        'module': 'ai_functions',
+        'display': None,
+        'ai': 'get_ai_analysis_data',
+        'inputs': ['df'],
+        'params': ['analysis_type'],
+        'required_columns': ['コメント・課題'],
+        'ai_title': '専属コーチからのコメント',
+    },
+}
+
+# --- 画面（ビュー）ごとの表示順 ---
+# 要素は分析名、{'analysis': 分析名, 'params': {...}, 'divider': True} の辞書、
+# または横に並べて表示する要素のリスト（st.columns で表示する）
+VIEWS = {
+    'summary': ['match_summary'],
+    'analysis': [
+        'point_breakdown',
+        'serve_receive',
+        {'analysis': 'serve_win_rate', 'params': {'current_player': '自分'}},
+        [
+            {'analysis': 'serve_court_map', 'params': {'current_server_type': '自分', 'phase': 'all'}},
+            {'analysis': 'serve_court_map', 'params': {'current_server_type': '自分', 'phase': 'game_ending'}},
+        ],
+        {'analysis': 'serve_rate_transition', 'params': {'current_player': '自分'}},
+        'serve_analysis',
+        'overall_receive',
+        'overall_score_miss',
+        {'analysis': 'first_drive', 'divider': True},
+        'my_first_play',
+        'previous_ball',
+        'consecutive_ball',
+        'rally_markov',
+        'my_drive_maps',
+        'game_ending',
+        'match_win_probability',
+        'rally_tempo',
+        'momentum',
+        'similar_rallies',
+        'clip_playlist',
+        {'analysis': 'serve_score_pattern', 'divider': True, 'heading': '各種データ集'},
+        'serve_loss_pattern',
+        'recieve_score_pattern',
+        'recieve_loss_pattern',
+        'shot_sequences',
+        'match_data',
+    ],
+    'opponent': [
+        {'analysis': 'serve_win_rate', 'params': {'current_player': '相手'}},
+        [
+            {'analysis': 'serve_court_map', 'params': {'current_server_type': '相手', 'phase': 'all'}, 'divider': True},
+            {'analysis': 'serve_court_map', 'params': {'current_server_type': '相手', 'phase': 'game_ending'}, 'divider': True},
+        ],
+        'opponent_drive_maps',
+        {'analysis': 'serve_rate_transition', 'params': {'current_player': '相手'}, 'divider': True},
+        'opponent_serve_sequence',
+        'opponent_scouting',
+    ],
+    'season': ['season_trend', 'rally_search'],
+}
+
+
+# --- スケジューラー ---
+def _normalize_item(item):
+    if isinstance(item, str):
+        return {'analysis': item}
+    return item
+
+
+def create_context(df, df_opponents):
+    """
+    1回の画面表示（またはプロンプト生成）の間で共有する実行コンテキストを作る。
+    列のチェック結果と派生データはここにキャッシュし、同じ処理を繰り返さない。
+    """
+    return {
+        'inputs': {'df': df, 'df_opponents': df_opponents},
+        'columns': set(df.columns),
+        'missing_columns': {},
+    }
+
+
+def get_missing_columns(analysis_name, context):
+    """分析に必要な列のうち、データにない列を返す（派生データに必要な列も含む）。"""
+    if analysis_name not in context['missing_columns']:
+        analysis = ANALYSES[analysis_name]
+        required = list(analysis.get('required_columns', []))
+        for input_name in analysis.get('inputs', []):
+            if input_name in DERIVED_INPUTS:
+                required += DERIVED_INPUTS[input_name]['required_columns']
+        context['missing_columns'][analysis_name] = sorted(
+            {col for col in required if col not in context['columns']}, key=required.index)
+    return context['missing_columns'][analysis_name]
+
+
+def _resolve_input(input_name, context):
+    # 派生データは最初に必要になったときに一度だけ作る
+    inputs = context['inputs']
+    if input_name not in inputs:
+        inputs[input_name] = DERIVED_INPUTS[input_name]['builder'](inputs['df'])
+    return inputs[input_name]
+
+
+def run_analysis(item, context, renderer='display'):
+    """
+    登録された分析を1つ実行する。必要な列がない場合は実行しない。
+
+    Args:
+        item (str or dict): 分析名、または {'analysis': 分析名, 'params': {...}}
+        context (dict): create_context で作ったコンテキスト
+        renderer (str): 'display'（画面表示）または 'ai'（AIプロンプト用の文字列）
+
+    Returns:
+        実行した関数の戻り値。実行しなかった場合は None
+    """
+    item = _normalize_item(item)
+    analysis = ANALYSES[item['analysis']]
+    function_name = analysis.get(renderer)
+    if function_name is None or get_missing_columns(item['analysis'], context):
+        return None
+
+    kwargs = {name: _resolve_input(name, context) for name in analysis.get('inputs', [])}
+    kwargs.update(item.get('params', {}))
+    module = importlib.import_module(analysis['module'])
+    return getattr(module, function_name)(**kwargs)
+
+
+def _render_item(item, context):
+    item = _normalize_item(item)
+    if item.get('divider'):
+        st.write("---")
+    if item.get('heading'):
+        st.subheader(item['heading'])
+    run_analysis(item, context)
+
+
+def run_view(view_name, df, df_opponents, context=None):
+    """
+    ビューに登録された分析を順番に表示する。
+    必要な列がない分析は表示せず、最後にまとめて知らせる。
+
+    Args:
+        view_name (str): VIEWS のキー
+        df (pd.DataFrame): 試合の得失点データ
+        df_opponents (pd.DataFrame): 対戦相手の情報
+        context (dict): 他のビューと共有するコンテキスト（省略時は新しく作る）
+    """
+    context = context or create_context(df, df_opponents)
+    skipped = {}
+    for item in VIEWS[view_name]:
+        group = item if isinstance(item, list) else [item]
+        for member in group:
+            name = _normalize_item(member)['analysis']
+            missing = get_missing_columns(name, context)
+            if missing:
+                skipped[name] = missing
+
+        if isinstance(item, list):
+            for column, member in zip(st.columns(len(item)), item):
+                with column:
+                    _render_item(member, context)
+        else:
+            _render_item(item, context)
+
+    if skipped:
+        with st.expander("⚠️ 必要な列がないため表示しなかった分析"):
+            for name, missing in skipped.items():
+                st.write(f"- {ANALYSES[name]['title']}: {', '.join(missing)}")
+
+
+def run_for_ai(items, df, df_opponents, context=None):
+    """
+    AIプロンプト用に、指定した分析の文字列を作る。必要な列がない分析は含めない。
+
+    Args:
+        items (list): 分析名、または {'analysis': 分析名, 'params': {...}, ...} のリスト
+        df (pd.DataFrame): 試合の得失点データ
+        df_opponents (pd.DataFrame): 対戦相手の情報
+        context (dict): 共有するコンテキスト（省略時は新しく作る）
+
+    Returns:
+        list: (要素の辞書, セクション見出し, 分析結果の文字列) のリスト
+    """
+    context = context or create_context(df, df_opponents)
+    results = []
+    for item in items:
+        item = _normalize_item(item)
+        text = run_analysis(item, context, renderer='ai')
+        if text is not None:
+            results.append((item, ANALYSES[item['analysis']]['ai_title'], text))
+    return results
@@ -0,0 +1,77 @@
+"""
+ai_client のベンチマーク。ローカルのスタブサーバーを相手に、
+同時実行数・重複リクエストの排除・ディスクキャッシュの効果を計測する。
+
+使い方:
+    python bench_ai_client.py --prompts 8 --delay 0.02
+"""
+import argparse
+import asyncio
+import os
+import socket
+import tempfile
+import time
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ai_client のベンチマーク')
+    parser.add_argument('--prompts', type=int, default=8, help='送信する異なるプロンプトの数')
+    parser.add_argument('--duplicates', type=int, default=4, help='各プロンプトを同時に送る回数')
+    parser.add_argument('--delay', type=float, default=0.02, help='スタブのチャンクごとの遅延（秒）')
+    args = parser.parse_args()
+
+    port = _free_port()
+    os.environ['AI_BACKEND'] = 'stub'
+    os.environ['AI_STUB_URL'] = f"http://127.0.0.1:{port}"
+
+    # 環境変数を設定してから読み込む
+    import ai_client
+    from ai_stub_server import start_stub_server
+
+    server, stats = start_stub_server(port=port, delay=args.delay)
+    ai_client.AI_CACHE_DIR = tempfile.mkdtemp(prefix='ai_cache_bench_')
+    prompts = [f"ベンチマーク用のプロンプト {i}\n" + "サーブの得点率を分析してください。" * 20 for i in range(args.prompts)]
+
+    def run(label, coro_factory, clear_cache=True):
+        if clear_cache:
+            ai_client.clear_cache()
+        before = stats['requests']
+        start = time.perf_counter()
+        asyncio.run(coro_factory())
+        elapsed = time.perf_counter() - start
+        print(f"{label:<36} {elapsed * 1000:9.1f} ms   スタブへのリクエスト: {stats['requests'] - before}")
+
+    async def sequential():
+        for prompt in prompts:
+            await ai_client.generate_response(prompt, use_cache=False)
+
+    async def concurrent():
+        await ai_client.generate_responses(prompts, use_cache=False)
+
+    async def duplicated():
+        await ai_client.generate_responses(prompts * args.duplicates, use_cache=False)
+
+    async def cached():
+        await ai_client.generate_responses(prompts)
+
+    print(f"プロンプト数: {args.prompts}, 重複: {args.duplicates}, 遅延: {args.delay}s")
+    ai_client.set_max_concurrency(1)
+    run("逐次実行", sequential)
+    for limit in (1, 4, args.prompts):
+        ai_client.set_max_concurrency(limit)
+        run(f"並行実行（同時実行数 {limit}）", concurrent)
+    run(f"重複あり（{args.duplicates}倍, 同時実行数 {args.prompts}）", duplicated)
+    run("キャッシュ作成", cached)
+    run("キャッシュ利用", cached, clear_cache=False)
+
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""
+アプリのコールドスタート時間を計測するベンチマーク。
+my_opp3.py が読み込むモジュールを新しいPythonプロセスで読み込み、
+インポート時間が予算内に収まっているか、重いモジュールが起動時に読み込まれていないかを確認する。
+
+使い方:
+    python bench_startup.py --runs 5 --budget-ms 2500
+"""
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from lazy_import import DEFERRED_MODULES
+
+APP_FILE = 'my_opp3.py'
+# 起動時のインポートにかけてよい時間（ミリ秒）
+IMPORT_TIME_BUDGET_MS = 2500
+
+
+def get_startup_modules(app_file=APP_FILE):
+    """アプリのスクリプトが import しているモジュール名を、書かれている順に返す。"""
+    with open(app_file, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            names = [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom) and node.module and node.level == 0:
+            names = [node.module]
+        else:
+            continue
+        for name in names:
+            if name not in modules:
+                modules.append(name)
+    return modules
+
+
+# 子プロセスで実行するスクリプト。インポート時間と、重いモジュールが読み込まれたかを返す
+_CHILD_SCRIPT = """
+import importlib, json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    importlib.import_module(name)
+elapsed = time.perf_counter() - start
+from lazy_import import is_loaded
+print(json.dumps({{'elapsed_ms': elapsed * 1000, 'loaded': [m for m in {deferred!r} if is_loaded(m)]}}))
+"""
+
+
+def measure_once(modules, importtime=False):
+    """新しいプロセスでモジュールを読み込み、(計測結果, -X importtime の出力) を返す。"""
+    command = [sys.executable]
+    if importtime:
+        command += ['-X', 'importtime']
+    command += ['-c', _CHILD_SCRIPT.format(modules=modules, deferred=DEFERRED_MODULES)]
+    result = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if result.returncode != 0:
+        raise RuntimeError(f"モジュールの読み込みに失敗しました:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(importtime_output, top=10):
+    """-X importtime の出力から、自身の読み込みにかかった時間が長いモジュールを返す。"""
+    rows = []
+    for line in importtime_output.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = [part.strip() for part in line[len('import time:'):].split('|')]
+        rows.append((int(self_us), int(cumulative_us), name.strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='アプリのコールドスタート時間の計測')
+    parser.add_argument('--runs', type=int, default=5, help='計測回数')
+    parser.add_argument('--budget-ms', type=float, default=IMPORT_TIME_BUDGET_MS, help='インポート時間の予算（ミリ秒）')
+    args = parser.parse_args()
+
+    modules = get_startup_modules()
+    print(f"起動時に読み込むモジュール: {len(modules)} 個")
+
+    timings = []
+    for _ in range(args.runs):
+        measurement, _ = measure_once(modules)
+        timings.append(measurement['elapsed_ms'])
+    median_ms = statistics.median(timings)
+    print(f"インポート時間（中央値 / {args.runs} 回）: {median_ms:.0f} ms（予算 {args.budget_ms:.0f} ms）")
+
+    measurement, importtime_output = measure_once(modules, importtime=True)
+    print("\n自身の読み込みに時間がかかっているモジュール:")
+    for self_us, cumulative_us, name in slowest_imports(importtime_output):
+        print(f"  {self_us / 1000:8.1f} ms（累計 {cumulative_us / 1000:8.1f} ms）  {name}")
+
+    ok = True
+    if measurement['loaded']:
+        print(f"\n起動時に読み込まないはずのモジュールが読み込まれています: {', '.join(measurement['loaded'])}")
+        ok = False
+    if median_ms > args.budget_ms:
+        print(f"\nインポート時間が予算を超えています: {median_ms:.0f} ms > {args.budget_ms:.0f} ms")
+        ok = False
+
+    print("\n結果: " + ("OK" if ok else "NG"))
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
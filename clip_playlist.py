@@ -0,0 +1,250 @@
+"""
+分析の条件に合うラリーを、動画のクリップ（開始・終了の秒）の一覧（プレイリスト）にするモジュール。
+例: 終盤の自分のサーブでの失点、バック前のサーブのレシーブミス、自分が最初に仕掛けたプレーの失敗。
+
+build_clip_index でラリーごとのクリップの時間と、条件ごとの該当ラリーの真偽の配列を1回だけ作って
+同じ試合データの間はキャッシュし、プレイリストは配列の AND で取り出すため、条件を変えるたびにラリーを調べ直さない。
+書き出しの形式は、YouTube のURLの一覧、M3U（VLC の開始・停止時刻付き）、EDL（CMX3600）、ffmpeg で切り出すシェルスクリプト。
+"""
+import os
+import shlex
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from game_rules import get_score_state
+from my_first_play_success_rate import analyze_my_first_play_success
+from utils import create_youtube_link, display_linked_table, group_detailed_serve_course, times_to_seconds
+
+# クリップの前後に足す秒数
+PRE_ROLL_SECONDS = 2
+POST_ROLL_SECONDS = 2
+# 終了時刻がない（または開始時刻より前の）ラリーのクリップの長さ（秒）
+DEFAULT_CLIP_SECONDS = 10
+# EDL のタイムコードのフレームレート
+EDL_FPS = 30
+CLIP_COLUMNS = ['ファイル名', 'ゲーム数', '自分の得点', '相手の得点', '得点者', '開始時刻', '終了時刻',
+                'クリップ開始_秒', 'クリップ終了_秒', 'YouTubeリンク']
+
+# 最初に仕掛けたプレーの判定に必要な列（my_first_play_success_rate と同じ）
+_FIRST_PLAY_COLUMNS = ['誰のサーブか', 'レシーブの種類', '３球目の種類', '４球目の種類', '５球目の種類', '６球目の種類',
+                       'レシーブの質', '３球目の質', '４球目の質', '５球目の質', '６球目の質']
+
+# プレイリストの条件。mask は build_clip_index で作るラリーの特徴の表から、該当するラリーの真偽を返す
+PLAYLIST_FILTERS = {
+    'lost': {
+        'title': '失点',
+        'mask': lambda f: f['得点者'] == '相手',
+    },
+    'won': {
+        'title': '得点',
+        'mask': lambda f: f['得点者'] == '自分',
+    },
+    'endgame_serve_loss': {
+        'title': '終盤（8-8以降）の自分のサーブでの失点',
+        'mask': lambda f: (f['サーブ'] == '自分') & (f['ゲームフェーズ'] == '終盤') & (f['得点者'] == '相手'),
+    },
+    'back_short_receive_miss': {
+        'title': 'バック前のサーブのレシーブミス',
+        'mask': lambda f: ((f['サーブ'] == '相手') & (f['サーブのコース'] == 'バック前')
+                           & f['失点の種類'].str.contains('レシーブミス', na=False)),
+    },
+    'first_attack_failure': {
+        'title': '自分が最初に仕掛けたプレーの失敗',
+        'mask': lambda f: f['最初に仕掛けた結果'].str.endswith('_失敗', na=False),
+    },
+    'first_attack_success': {
+        'title': '自分が最初に仕掛けたプレーの成功',
+        'mask': lambda f: f['最初に仕掛けた結果'].str.endswith('_成功', na=False),
+    },
+}
+
+
+def _video_of(link):
+    """create_youtube_link で作ったリンクから、タイムスタンプを除いた動画のURLを返す（リンクがない場合は None）。"""
+    if not isinstance(link, str) or link in ('', '#'):
+        return None
+    return link.rsplit('&t=', 1)[0]
+
+
+@st.cache_data(show_spinner=False)
+def build_clip_index(df, score_state=None):
+    """
+    ラリーごとのクリップの時間と、PLAYLIST_FILTERS の条件ごとの該当ラリーを計算する。
+    最初に仕掛けたプレーの判定はラリーごとの処理なので、条件を変えて再実行したときは同じ試合データの結果を使う。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（1試合分でも、複数の試合をまとめたものでもよい）
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
+
+    Returns:
+        dict: {'clips': CLIP_COLUMNS の列を持つ表（df と同じ順）, 'masks': {条件名: 真偽の配列}}
+    """
+    state = get_score_state(df, score_state)
+    start = times_to_seconds(df['開始時刻']) if '開始時刻' in df.columns else pd.Series(np.nan, index=df.index)
+    end = times_to_seconds(df['終了時刻']) if '終了時刻' in df.columns else pd.Series(np.nan, index=df.index)
+    clip_start = (start - PRE_ROLL_SECONDS).clip(lower=0)
+    clip_end = (end + POST_ROLL_SECONDS).where(end > start, start + DEFAULT_CLIP_SECONDS)
+
+    clips = df[[col for col in CLIP_COLUMNS if col in df.columns]].copy()
+    clips['クリップ開始_秒'] = clip_start
+    clips['クリップ終了_秒'] = clip_end
+    clips = clips[[col for col in CLIP_COLUMNS if col in clips.columns]].reset_index(drop=True)
+
+    if all(col in df.columns for col in _FIRST_PLAY_COLUMNS):
+        first_play = df.apply(analyze_my_first_play_success, axis=1)
+    else:
+        first_play = pd.Series('その他', index=df.index)
+    serve_course = df['サーブのコース'] if 'サーブのコース' in df.columns else pd.Series(np.nan, index=df.index)
+    features = pd.DataFrame({
+        '得点者': state['得点者'],
+        'サーブ': state['サーブ'],
+        'ゲームフェーズ': state['ゲームフェーズ'],
+        'サーブのコース': serve_course.map(group_detailed_serve_course),
+        '失点の種類': df['失点の種類'].astype(str) if '失点の種類' in df.columns else pd.Series('', index=df.index),
+        '最初に仕掛けた結果': first_play.astype(str),
+    }, index=df.index)
+    # 開始時刻がないラリーは動画の位置が分からないため、どの条件にも入れない
+    has_time = start.notna().to_numpy()
+    masks = {name: np.asarray(spec['mask'](features), dtype=bool) & has_time for name, spec in PLAYLIST_FILTERS.items()}
+    return {'clips': clips, 'masks': masks}
+
+
+def build_playlist(index, filters, mask=None):
+    """
+    条件すべてに合うラリーのクリップを、試合の順に返す。
+
+    Args:
+        index (dict): build_clip_index の結果
+        filters (list): PLAYLIST_FILTERS の条件名（すべてに合うラリー。空の場合は開始時刻のある全ラリー）
+        mask (array-like): 他の分析で絞り込んだラリーの真偽（index['clips'] と同じ順）。あれば条件に加える
+
+    Returns:
+        pd.DataFrame: CLIP_COLUMNS の列に 'ラベル' と 'URL'（クリップ開始時刻のリンク）を加えた表
+    """
+    selected = np.ones(len(index['clips']), dtype=bool)
+    for name in filters:
+        selected &= index['masks'][name]
+    if not filters:
+        selected &= index['clips']['クリップ開始_秒'].notna().to_numpy()
+    if mask is not None:
+        selected &= np.asarray(mask, dtype=bool)
+    clips = index['clips'][selected].reset_index(drop=True)
+
+    prefix = clips['ファイル名'].astype(str) + ' ' if 'ファイル名' in clips.columns else ''
+    clips['ラベル'] = (prefix + 'ゲーム' + clips['ゲーム数'].astype(str) + ' ' + clips['自分の得点'].astype(str) + '-'
+                     + clips['相手の得点'].astype(str) + '（' + clips['得点者'].astype(str) + 'の得点）')
+    videos = clips['YouTubeリンク'].map(_video_of) if 'YouTubeリンク' in clips.columns else pd.Series(None, index=clips.index)
+    clips['URL'] = [create_youtube_link(video, int(start)) if video else None
+                    for video, start in zip(videos, clips['クリップ開始_秒'])]
+    return clips
+
+
+def to_url_list(clips):
+    """クリップの開始時刻付きの YouTube のURLを1行ずつ並べた文字列にする（URLがないクリップは除く）。"""
+    return '\n'.join(url for url in clips['URL'] if url)
+
+
+def to_m3u(clips, media=None):
+    """
+    VLC で再生できる M3U のプレイリストにする（クリップごとに開始・停止時刻を指定する）。
+
+    Args:
+        clips (pd.DataFrame): build_playlist の結果
+        media (str): 動画ファイルのパス（None の場合は各クリップの YouTube の動画）
+    """
+    lines = ['#EXTM3U']
+    for row in clips.itertuples(index=False):
+        source = media or _video_of(row.URL)
+        if not source:
+            continue
+        start, end = int(row.クリップ開始_秒), int(row.クリップ終了_秒)
+        lines += [f'#EXTINF:{end - start},{row.ラベル}',
+                  f'#EXTVLCOPT:start-time={start}',
+                  f'#EXTVLCOPT:stop-time={end}',
+                  source]
+    return '\n'.join(lines) + '\n'
+
+
+def _timecode(seconds, fps=EDL_FPS):
+    frames = int(round(seconds * fps))
+    return f"{frames // (3600 * fps):02d}:{frames // (60 * fps) % 60:02d}:{frames // fps % 60:02d}:{frames % fps:02d}"
+
+
+def to_edl(clips, media, title='rally clips', fps=EDL_FPS):
+    """
+    動画編集ソフトに読み込める EDL（CMX3600）にする。クリップをつなげた順に並べる。
+
+    Args:
+        clips (pd.DataFrame): build_playlist の結果
+        media (str): 動画ファイルのパス（クリップ名に使う）
+        title (str): EDL のタイトル
+        fps (int): タイムコードのフレームレート
+    """
+    lines = [f'TITLE: {title}', 'FCM: NON-DROP FRAME', '']
+    record = 0.0
+    for number, row in enumerate(clips.itertuples(index=False), start=1):
+        duration = row.クリップ終了_秒 - row.クリップ開始_秒
+        lines += [f'{number:03d}  AX       V     C        '
+                  f'{_timecode(row.クリップ開始_秒, fps)} {_timecode(row.クリップ終了_秒, fps)} '
+                  f'{_timecode(record, fps)} {_timecode(record + duration, fps)}',
+                  f'* FROM CLIP NAME: {os.path.basename(media)}',
+                  f'* COMMENT: {row.ラベル}',
+                  '']
+        record += duration
+    return '\n'.join(lines)
+
+
+def to_ffmpeg_script(clips, media, output_prefix='clip'):
+    """
+    ffmpeg でクリップを切り出すシェルスクリプトにする（再エンコードしないため、切れ目はキーフレームに合わせられる）。
+
+    Args:
+        clips (pd.DataFrame): build_playlist の結果
+        media (str): 動画ファイルのパス
+        output_prefix (str): 切り出したファイル名の先頭（'clip_001.mp4' のようになる）
+    """
+    extension = os.path.splitext(media)[1] or '.mp4'
+    lines = ['#!/bin/sh', '# 正確な位置で切り出す場合は -c copy を外す（再エンコードする）']
+    for number, row in enumerate(clips.itertuples(index=False), start=1):
+        duration = row.クリップ終了_秒 - row.クリップ開始_秒
+        output = f'{output_prefix}_{number:03d}{extension}'
+        lines += [f'# {row.ラベル}',
+                  f'ffmpeg -y -ss {row.クリップ開始_秒:g} -i {shlex.quote(media)} -t {duration:g} -c copy {shlex.quote(output)}']
+    return '\n'.join(lines) + '\n'
+
+
+def display_clip_playlist(df, score_state=None):
+    """
+    条件に合うラリーのクリップの一覧を表示し、URLの一覧・M3U・EDL・ffmpeg のスクリプトとしてダウンロードできるようにする。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
+    """
+    st.subheader("動画クリップのプレイリスト")
+    filters = st.multiselect("条件（すべてに合うラリー）", list(PLAYLIST_FILTERS),
+                             default=['endgame_serve_loss'], format_func=lambda name: PLAYLIST_FILTERS[name]['title'],
+                             key="clip_playlist_filters")
+    clips = build_playlist(build_clip_index(df, score_state), filters)
+    if clips.empty:
+        st.info("条件に合うラリーはありません。")
+        return
+
+    total = (clips['クリップ終了_秒'] - clips['クリップ開始_秒']).sum()
+    st.caption(f"{len(clips)}クリップ（合計 {int(total) // 60}分{int(total) % 60}秒、前後に{PRE_ROLL_SECONDS}秒・{POST_ROLL_SECONDS}秒を含む）")
+    display_linked_table(clips[['ラベル', '開始時刻', '終了時刻']], clips['URL'])
+
+    media = st.text_input("動画ファイルのパス（M3U・EDL・ffmpeg 用。空欄の場合 M3U は YouTube の動画）",
+                          value=st.session_state.get('video_path_input_rallytab', ''), key="clip_playlist_media")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.download_button("URLの一覧", to_url_list(clips), file_name="rally_clips.txt", mime="text/plain")
+    with col2:
+        st.download_button("M3U", to_m3u(clips, media or None), file_name="rally_clips.m3u", mime="audio/x-mpegurl")
+    if media:
+        with col3:
+            st.download_button("EDL", to_edl(clips, media), file_name="rally_clips.edl", mime="text/plain")
+        with col4:
+            st.download_button("ffmpeg", to_ffmpeg_script(clips, media), file_name="cut_rally_clips.sh", mime="text/x-sh")
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 
+from rate_intervals import INTERVAL_LABEL, format_wilson_intervals
+
 def display_consecutive_ball_analysis(df):
     """
     バックハンド系打球で相手の1つ前のコースがバック、
@@ -118,8 +120,9 @@ def display_consecutive_ball_analysis(df):
 
     summary_df['成功率 (%)'] = (summary_df['成功数'] / summary_df['総数']) * 100
     summary_df['成功率 (%)'] = summary_df['成功率 (%)'].round(1)
+    summary_df[INTERVAL_LABEL] = format_wilson_intervals(summary_df['成功数'], summary_df['総数'])
     
-    summary_df = summary_df[['連続パターン', '総数', '成功率 (%)']]
+    summary_df = summary_df[['連続パターン', '総数', '成功率 (%)', INTERVAL_LABEL]]
 
     # UI表示
     st.markdown("---")
@@ -237,8 +240,9 @@ def get_consecutive_ball_analysis_for_ai(df):
 
     summary_df['成功率 (%)'] = (summary_df['成功数'] / summary_df['総数']) * 100
     summary_df['成功率 (%)'] = summary_df['成功率 (%)'].round(1)
+    summary_df[INTERVAL_LABEL] = format_wilson_intervals(summary_df['成功数'], summary_df['総数'])
     
-    summary_df = summary_df[['連続パターン', '総数', '成功数', '成功率 (%)']]
+    summary_df = summary_df[['連続パターン', '総数', '成功数', '成功率 (%)', INTERVAL_LABEL]]
 
     analysis_text = "## 特定の連続打球成功率\n\n"
     analysis_text += "（同じコース・同じ打球技術の組み合わせが連続した際の成功率）\n\n"
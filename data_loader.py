@@ -1,44 +1,90 @@
 import streamlit as st
-import os
 import pandas as pd
 from utils import (time_to_seconds, create_youtube_link)
 
+# 1試合のExcelファイルに必要なシート
+MATCH_SHEETS = ['試合分析', '対戦者']
+
+
+def read_match_workbook(file_path):
+    """
+    1つの試合のExcelファイルから「試合分析」と「対戦者」のシートを読み込み、画面表示用の列を追加する。
+    画面には何も表示しないため、複数のファイルをまとめて読み込むときにも使える。
+
+    Args:
+        file_path (str): Excelファイルのパス
+
+    Returns:
+        tuple: (試合分析のDataFrame, 対戦者のDataFrame, YouTube動画ID)
+               「対戦者」シートに「Youtube Id」列がない場合、動画IDは None
+
+    Raises:
+        KeyError: 「試合分析」または「対戦者」シートがない場合
+    """
+    # ファイルは1回だけ開いて、2つのシートを読む
+    with pd.ExcelFile(file_path) as workbook:
+        missing = [sheet for sheet in MATCH_SHEETS if sheet not in workbook.sheet_names]
+        if missing:
+            raise KeyError(f"シート {'、'.join(missing)} が見つかりません")
+        df_opponents = pd.read_excel(workbook, sheet_name='対戦者', header=0)
+        df = pd.read_excel(workbook, sheet_name='試合分析', header=0, usecols=lambda x: x not in ['Unnamed: 0'])
+
+    df_opponents = df_opponents.dropna(how='all')
+    df_opponents.columns = df_opponents.columns.str.strip()
+
+    youtube_video_id = None
+    if 'Youtube Id' in df_opponents.columns:
+        youtube_video_id = df_opponents.loc[0, 'Youtube Id']
+
+    df = df.dropna(how='all')
+    df.columns = df.columns.str.strip()
+
+    if '開始時刻' in df.columns:
+        # rally_tempo は分析用のモジュールを読み込むため、ここで読み込む
+        from rally_tempo import add_tempo_columns
+
+        df['開始時刻_秒'] = df['開始時刻'].astype(str).apply(time_to_seconds)
+        df['YouTubeリンク'] = df.apply(lambda row: create_youtube_link(youtube_video_id, row['開始時刻_秒']), axis=1)
+        # ラリー時間とラリーの間の時間も読み込み時に1回だけ計算する
+        df = add_tempo_columns(df)
+    else:
+        df['YouTubeリンク'] = "#"
+
+    return df, df_opponents, youtube_video_id
+
+
 def load_and_process_data():
     """
     Excelファイルを読み込み、必要なデータ処理を行う。
     処理されたDataFrameとYouTube動画IDを返す。
     """
-    excel_files = sorted([f for f in os.listdir('.') if f.endswith('.xlsx')]) #
-    if not excel_files:
+    # match_catalog は read_match_workbook を使うため、ここで読み込む
+    from match_catalog import get_catalog, select_match_file
+    from data_validation import display_validation_report
+
+    if get_catalog('.').empty:
         st.error("エラー: Excelファイルが見つかりません。リポジトリに.xlsxファイルをアップロードしてください。") #
         st.stop() #
 
-    selected_file = st.selectbox("分析する試合データを選択してください", excel_files) #
+    selected_file = select_match_file('.')
+    if selected_file is None:
+        st.stop()
 
     df = pd.DataFrame() #
     youtube_video_id = None #
 
     try:
-        df_opponents = pd.read_excel(selected_file, sheet_name='対戦者', header=0) #
-        df_opponents = df_opponents.dropna(how='all') #
-        df_opponents.columns = df_opponents.columns.str.strip() #
+        df, df_opponents, youtube_video_id = read_match_workbook(selected_file)
 
-        if 'Youtube Id' in df_opponents.columns: #
-            youtube_video_id = df_opponents.loc[0, 'Youtube Id'] #
-        else:
+        if youtube_video_id is None:
             st.error("エラー: 「対戦者」シートに「Youtube Id」列が見つかりません。") #
             st.stop() #
 
-        df = pd.read_excel(selected_file, sheet_name='試合分析', header=0, usecols=lambda x: x not in ['Unnamed: 0']) #
-        df = df.dropna(how='all') #
-        df.columns = df.columns.str.strip() #
-
-        if '開始時刻' in df.columns: #
-            df['開始時刻_秒'] = df['開始時刻'].astype(str).apply(time_to_seconds) #
-            df['YouTubeリンク'] = df.apply(lambda row: create_youtube_link(youtube_video_id, row['開始時刻_秒']), axis=1) #
-        else:
+        if '開始時刻' not in df.columns: #
             st.error("「開始時刻」列が見つかりませんでした。スプレッドシートを確認してください。") #
-            df['YouTubeリンク'] = "#" #
+
+        # スコア・サーブの順番・打球の入力漏れを確認して、問題があれば知らせる
+        display_validation_report(df, key="load")
 
         return df, df_opponents, youtube_video_id
 
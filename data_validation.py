@@ -0,0 +1,227 @@
+"""
+入力された試合データの誤りを、ラリーごとに見つけるモジュール。
+スコアの進み方・サーブの順番・ゲームの終わり方・打球の入力漏れを、ゲームごとにずらした列との差でまとめて確認し、
+問題のあるラリーを1行1件の表にする。入力の誤りは各分析の結果にそのまま混ざるため、読み込み時と入力の保存時に表示する。
+
+使い方（取り込んだ全試合をまとめて確認する）:
+    python data_validation.py --dir .
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from game_rules import POINTS_TO_WIN, SHOT_COLUMNS
+from serve_turns import compute_serve_turns, game_keys
+
+# 問題の種類 → 表に出す名前
+ISSUE_KINDS = {
+    'invalid_score': '得点が数値でない',
+    'missing_scorer': '得点者が空欄',
+    'score_jump': 'スコアの進み方',
+    'game_order': 'ゲーム数の順番',
+    'after_game_end': 'ゲーム終了後のラリー',
+    'unfinished_game': 'ゲームの終わり方',
+    'serve_order': 'サーブの順番',
+    'missing_serve': 'サーブの入力漏れ',
+    'shot_gap': '打球の入力漏れ',
+    'shot_after_miss': 'ミスの後の打球',
+    'shot_outcome': '最後の打球と得点者',
+}
+ISSUE_COLUMNS = ['行', 'ゲーム数', '自分の得点', '相手の得点', '種類', '内容']
+
+_SERVERS = ['自分', '相手']
+
+
+def _is_game_over(my_score, opponent_score):
+    """11点以上で2点差がついたスコアか（配列をまとめて判定する）。"""
+    leader = np.maximum(my_score, opponent_score)
+    return (leader >= POINTS_TO_WIN) & (np.abs(my_score - opponent_score) >= 2)
+
+
+def _is_filled(df, column):
+    if column not in df.columns:
+        return np.zeros(len(df), dtype=bool)
+    return (df[column].notna() & (df[column].astype(str).str.strip() != '')).to_numpy()
+
+
+def _check_scores(df, add, in_progress):
+    my_score = pd.to_numeric(df['自分の得点'], errors='coerce')
+    opponent_score = pd.to_numeric(df['相手の得点'], errors='coerce')
+    invalid = (my_score.isna() | opponent_score.isna()).to_numpy()
+    add(invalid, 'invalid_score', "「自分の得点」または「相手の得点」が数値ではありません")
+
+    scorer = df['得点者'].astype(str).str.strip()
+    add(~scorer.isin(_SERVERS).to_numpy(), 'missing_scorer', "「得点者」が「自分」「相手」のどちらでもありません")
+
+    # ゲームごとに1つ前のラリーの後のスコア（ゲームの最初は 0-0）と比べる
+    games = game_keys(df)
+    my_score = my_score.fillna(0).to_numpy(dtype=np.int64)
+    opponent_score = opponent_score.fillna(0).to_numpy(dtype=np.int64)
+    is_first = np.r_[True, games[1:] != games[:-1]]
+    previous_my = np.where(is_first, 0, np.r_[0, my_score[:-1]])
+    previous_opponent = np.where(is_first, 0, np.r_[0, opponent_score[:-1]])
+    my_won = (scorer == '自分').to_numpy()
+    opponent_won = (scorer == '相手').to_numpy()
+    expected = ((my_won & (my_score - previous_my == 1) & (opponent_score == previous_opponent))
+                | (opponent_won & (opponent_score - previous_opponent == 1) & (my_score == previous_my)))
+    jump = ~expected & ~invalid & (my_won | opponent_won)
+    scorer = scorer.to_numpy()
+    add(jump, 'score_jump', lambda i: f"{previous_my[i]}-{previous_opponent[i]} から {my_score[i]}-{opponent_score[i]} "
+                                      f"になっています（得点者: {scorer[i]}）")
+
+    # 同じゲームの行は続けて並び、ゲーム数は試合の中で増えていく
+    game_numbers = pd.to_numeric(df['ゲーム数'], errors='coerce').to_numpy()
+    same_match = np.ones(len(df), dtype=bool)
+    if '試合ID' in df.columns:
+        same_match = np.r_[False, df['試合ID'].to_numpy()[1:] == df['試合ID'].to_numpy()[:-1]]
+    seen_before = pd.Series(games).duplicated().to_numpy() & is_first
+    add((same_match & (np.r_[np.nan, game_numbers[:-1]] > game_numbers)) | seen_before, 'game_order',
+        "ゲーム数が前の行より小さいか、同じゲームの行が離れています")
+
+    add(_is_game_over(previous_my, previous_opponent) & ~is_first, 'after_game_end',
+        lambda i: f"{previous_my[i]}-{previous_opponent[i]} でゲームが終わった後のラリーです")
+    is_last = np.r_[games[1:] != games[:-1], True]
+    if in_progress:
+        # 入力中の最後のゲームは、まだ終わっていなくてよい
+        is_last &= games != games[-1]
+    add(is_last & ~_is_game_over(my_score, opponent_score), 'unfinished_game',
+        lambda i: f"ゲームの最後のラリーが {my_score[i]}-{opponent_score[i]} で、ゲームが終わっていません")
+
+
+def _check_serve_order(df, add):
+    turns = compute_serve_turns(df)
+    recorded = df['誰のサーブか'].astype(str).str.strip().to_numpy()
+    expected = turns['想定のサーブ'].to_numpy()
+    add(~turns['サーブ順の一致'].to_numpy(dtype=bool), 'serve_order',
+        lambda i: f"スコアから求めたサーブは「{expected[i]}」ですが、「誰のサーブか」は「{recorded[i]}」です")
+
+
+def _check_shots(df, add):
+    type_columns = [type_col for _, type_col, _, _ in SHOT_COLUMNS]
+    quality_columns = [quality_col for _, _, _, quality_col in SHOT_COLUMNS]
+    filled = np.column_stack([_is_filled(df, column) for column in type_columns])
+    misses = np.column_stack([(df[column].astype(str).str.strip() == 'ミス').to_numpy() if column in df.columns
+                              else np.zeros(len(df), dtype=bool) for column in quality_columns])
+    add(~filled[:, 0], 'missing_serve', "「サーブの種類」が空欄です")
+
+    # 空欄の球より後ろに入力された球がある
+    last_ball = np.where(filled.any(axis=1), len(SHOT_COLUMNS) - np.argmax(filled[:, ::-1], axis=1), 0)
+    gaps = filled.sum(axis=1) < last_ball
+    add(gaps, 'shot_gap', lambda i: f"{last_ball[i]}球目まで入力されていますが、途中に空欄の球があります")
+
+    # ミスの球より後ろに入力された球がある
+    first_miss = np.where(misses.any(axis=1), np.argmax(misses, axis=1) + 1, 0)
+    add((first_miss > 0) & (first_miss < last_ball), 'shot_after_miss',
+        lambda i: f"{first_miss[i]}球目がミスですが、その後の球が入力されています")
+
+    # 最後の球がミスなら打った人の失点、ミスでなければ打った人の得点（6球目で終わらず続いたラリーは確認しない）
+    server = df['誰のサーブか'].astype(str).str.strip().to_numpy()
+    scorer = df['得点者'].astype(str).str.strip().to_numpy()
+    receiver = np.where(server == '自分', '相手', '自分')
+    hitter = np.where(last_ball % 2 == 1, server, receiver)
+    last_is_miss = misses[np.arange(len(df)), np.maximum(last_ball - 1, 0)]
+    checked = ((last_ball > 0) & (last_ball < len(SHOT_COLUMNS)) & ~gaps & np.isin(server, _SERVERS)
+               & np.isin(scorer, _SERVERS))
+    mismatch = checked & np.where(last_is_miss, scorer == hitter, scorer != hitter)
+    add(mismatch, 'shot_outcome',
+        lambda i: f"{last_ball[i]}球目（{hitter[i]}の打球{'、ミス' if last_is_miss[i] else ''}）で終わっていますが、"
+                  f"得点者は「{scorer[i]}」です。{'' if last_is_miss[i] else 'その後の球の入力漏れの可能性があります'}")
+
+
+def validate_rallies(df, in_progress=False):
+    """
+    試合データの誤りをラリーごとに確認する（複数の試合をまとめたデータでも、'試合ID' 列があれば試合ごとに確認する）。
+
+    確認する内容:
+        スコア: 得点者の得点だけが1点増えているか、ゲーム数の順番、ゲームが終わった後のラリー、ゲームの終わり方
+        サーブ: スコアから求めたサーブの順番（2本交代、10-10からは1本交代）と「誰のサーブか」
+        打球: サーブの入力、途中の空欄、ミスの後の打球、最後の打球と得点者の組み合わせ
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（行はラリーの順）
+        in_progress (bool): 入力中のデータの場合は True（最後のゲームが終わっていなくても問題にしない）
+
+    Returns:
+        pd.DataFrame: 1行1件の問題の表（ISSUE_COLUMNS の列。'行' はExcelの行番号、
+                      'ラリーNo' / '試合ID' / 'ファイル名' 列があればそれも付ける）
+    """
+    extra_columns = [col for col in ['ファイル名', '試合ID', 'ラリーNo'] if col in df.columns]
+    required = ['ゲーム数', '自分の得点', '相手の得点', '得点者', '誰のサーブか']
+    if df.empty or not all(col in df.columns for col in required):
+        return pd.DataFrame(columns=extra_columns + ISSUE_COLUMNS)
+    df = df.reset_index(drop=True)
+    found = []
+
+    def add(mask, kind, message):
+        # 内容の文字列は、問題のあった行の分だけ作る（message は文字列か、行番号から文字列を作る関数）
+        rows = np.flatnonzero(mask)
+        if rows.size == 0:
+            return
+        messages = message if isinstance(message, str) else [message(i) for i in rows]
+        found.append(pd.DataFrame({'_row': rows, '_order': list(ISSUE_KINDS).index(kind),
+                                   '種類': ISSUE_KINDS[kind], '内容': messages}))
+
+    _check_scores(df, add, in_progress)
+    _check_serve_order(df, add)
+    _check_shots(df, add)
+    if not found:
+        return pd.DataFrame(columns=extra_columns + ISSUE_COLUMNS)
+
+    issues = pd.concat(found, ignore_index=True).sort_values(['_row', '_order'], kind='stable')
+    rows = issues['_row'].to_numpy()
+    report = df.loc[rows, extra_columns + ['ゲーム数', '自分の得点', '相手の得点']].reset_index(drop=True)
+    # Excelの行番号（1行目は列名）。取り込んだ全試合の場合は試合の中での行番号
+    within = df.groupby('試合ID').cumcount().to_numpy()[rows] if '試合ID' in df.columns else rows
+    report.insert(len(extra_columns), '行', within + 2)
+    report['種類'] = issues['種類'].to_numpy()
+    report['内容'] = issues['内容'].to_numpy()
+    return report
+
+
+def display_validation_report(df, key, in_progress=False):
+    """
+    データの確認結果を表示する。問題がなければ何も表示しない。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+        key (str): 画面の中で表示場所を区別する名前
+        in_progress (bool): 入力中のデータの場合は True
+
+    Returns:
+        pd.DataFrame: validate_rallies の結果
+    """
+    report = validate_rallies(df, in_progress)
+    if report.empty:
+        return report
+    counts = report['種類'].value_counts()
+    st.warning(f"入力データに確認が必要な箇所が{len(report)}件あります（"
+               + "、".join(f"{kind} {count}件" for kind, count in counts.items()) + "）。")
+    with st.expander("確認が必要なラリー"):
+        kinds = st.multiselect("種類", list(counts.index), key=f"validation_kinds_{key}")
+        st.dataframe(report[report['種類'].isin(kinds)] if kinds else report, hide_index=True)
+    return report
+
+
+if __name__ == '__main__':
+    # match_store は読み込みに時間がかかるため、コマンドとして実行したときだけ読み込む
+    from match_store import MATCH_DB_PATH, connect, ingest_directory, query_rallies
+
+    parser = argparse.ArgumentParser(description='取り込んだ全試合の入力データをまとめて確認する')
+    parser.add_argument('--dir', default='.', help='Excelファイルのあるフォルダ')
+    parser.add_argument('--db', default=MATCH_DB_PATH, help='データベースのファイル')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    ingest_directory(conn, args.dir)
+    df = query_rallies(conn)
+    start = time.perf_counter()
+    report = validate_rallies(df)
+    seconds = time.perf_counter() - start
+    print(f"ラリー数: {len(df)}、問題: {len(report)} 件、処理時間: {seconds:.3f} 秒"
+          f"（{len(df) / seconds if seconds > 0 else 0:,.0f} ラリー/秒）")
+    if not report.empty:
+        print(report['種類'].value_counts().to_string())
+        print(report.to_string(index=False))
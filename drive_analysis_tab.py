@@ -1,10 +1,12 @@
 import streamlit as st
 import pandas as pd
-import plotly.graph_objects as go
-import plotly.express as px
+from lazy_import import lazy_module
+
+go = lazy_module('plotly.graph_objects')
+px = lazy_module('plotly.express')
 
 # --- 卓球台のマップを描画する関数 ---
-def draw_court_map(df, title, player_to_analyze, df_opponents):
+def draw_court_map(df, title, player_to_analyze, df_opponents, key=None):
     opponent_handedness = None
     if not df_opponents.empty and '相手の戦型' in df_opponents.columns:
         opponent_style_val = df_opponents['相手の戦型'].iloc [0]
@@ -180,7 +182,7 @@ def draw_court_map(df, title, player_to_analyze, df_opponents):
     config = {
         'staticPlot': True
     }
-    st.plotly_chart(fig, use_container_width=False, config=config)
+    st.plotly_chart(fig, use_container_width=False, config=config, key=key)
 
 # --- データを抽出・集計するコアロジック ---
 def find_forehand_drives(all_rallies_df, player_to_analyze):
@@ -334,3 +336,88 @@ def find_backhand_drives(all_rallies_df, player_to_analyze):
     backhand_df = pd.DataFrame(backhand_drives)
 
     return backhand_df
+
+
+# --- 自分・相手のドライブ分析をまとめて表示する関数 ---
+def display_my_drive_maps(df, df_opponents):
+    """自分のフォアドライブ・回り込みフォアドライブ・バックドライブのコースを表示する。"""
+    # 2つのカラムを作成
+    col3, col4 = st.columns(2)
+    with col3:
+        st.write("---")
+        st.markdown("##### 自分のフォアドライブ分析")
+        if not df.empty:
+            # dfを利用してドライブデータを抽出
+            my_forehand_df, my_round_df = find_forehand_drives(df, '自分')
+
+            # フォア側からのフォアドライブ (自分)
+            st.markdown("###### フォア側からのフォアドライブ")
+            if not my_forehand_df.empty:
+                draw_court_map(my_forehand_df, "フォア側からのフォアドライブ", '自分', df_opponents)
+            else:
+                st.info("データがありません。")
+
+        else:
+            st.warning("ラリー入力タブでデータを追加してください。")
+
+        st.markdown("##### 自分のバックドライブ分析")
+        if not df.empty:
+            my_backhand_df = find_backhand_drives(df, '自分')
+            if not my_backhand_df.empty:
+                draw_court_map(my_backhand_df, "バックドライブ", '自分', df_opponents)
+            else:
+                st.info("データがありません。")
+        else:
+            st.warning("ラリー入力タブでデータを追加してください。")
+
+        st.markdown("---") # 区切り線
+
+    with col4:
+        st.write("---")
+        st.markdown("##### 自分のフォアドライブ分析")
+        if not df.empty:
+            st.markdown("###### 回り込みフォアドライブ")
+            if not my_round_df.empty:
+                draw_court_map(my_round_df, "回り込みフォアドライブ", '自分', df_opponents)
+            else:
+                st.info("データがありません。")
+        else:
+            st.warning("ラリー入力タブでデータを追加してください。")
+
+
+def display_opponent_drive_maps(df, df_opponents):
+    """相手のフォアドライブ・回り込みフォアドライブ・バックドライブのコースを表示する。"""
+    # 2つのカラムを作成
+    col3, col4 = st.columns(2)
+    with col3:
+        st.markdown("##### 相手のフォアドライブ分析")
+        if not df.empty:
+            # dfを利用してドライブデータを抽出
+            opp_forehand_df, opp_round_df = find_forehand_drives(df, '相手')
+
+            # フォア側からのフォアドライブ (相手)
+            st.markdown("###### フォア側からのフォアドライブ")
+            if not opp_forehand_df.empty:
+                draw_court_map(opp_forehand_df, "フォア側からのフォアドライブ", '相手', df_opponents)
+            else:
+                st.info("データがありません。")
+
+            st.markdown("###### 回り込みフォアドライブ")
+            if not opp_round_df.empty:
+                draw_court_map(opp_round_df, "回り込みフォアドライブ", '相手', df_opponents)
+            else:
+                st.info("データがありません。")
+        else:
+            st.warning("ラリー入力タブでデータを追加してください。")
+
+    with col4:
+        st.markdown("---") # 区切り線
+        st.markdown("##### 相手のバックドライブ分析")
+        if not df.empty:
+            opp_backhand_df = find_backhand_drives(df, '相手')
+            if not opp_backhand_df.empty:
+                draw_court_map(opp_backhand_df, "バックドライブ", '相手', df_opponents)
+            else:
+                st.info("データがありません。")
+        else:
+            st.warning("ラリー入力タブでデータを追加してください。")
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 
+from rate_intervals import INTERVAL_LABEL, format_wilson_intervals
+
 def display_first_drive_analysis(df):
     """
     どちらが先にドライブを仕掛けたかの分析結果をStreamlitのUIに表示する関数
@@ -78,6 +80,7 @@ def display_first_drive_analysis(df):
             
             crosstab_count.loc['Total'] = crosstab_count.sum()
             crosstab_rate.loc['Total'] = crosstab_count.loc['Total'] / crosstab_count.loc['Total'].sum()
+            row_totals = crosstab_count.sum(axis=1)
 
             if '自分' in crosstab_count.columns and '相手' in crosstab_count.columns:
                 crosstab_count = crosstab_count[['自分', '相手']]
@@ -87,12 +90,14 @@ def display_first_drive_analysis(df):
             
             for col in combined_df.columns:
                 combined_df[col] = crosstab_count[col].astype(str) + ' (' + crosstab_rate[col].apply(lambda x: f'{x:.1%}') + ')'
+            if '自分' in crosstab_count.columns:
+                combined_df[INTERVAL_LABEL] = format_wilson_intervals(crosstab_count['自分'], row_totals)
             
             combined_df = combined_df.rename(index={'相手': '相手が先に仕掛けた', '自分': '自分が先に仕掛けた', 'Total': '合計', '仕掛けなし': '仕掛けなし'})
             combined_df = combined_df.rename(columns={'自分': '自分の得点', '相手': '相手の得点'})
 
             st.dataframe(combined_df)
-            st.caption("※（）内は、それぞれの分類（行）における得点者の割合を示しています。")
+            st.caption(f"※（）内は、それぞれの分類（行）における得点者の割合を示しています。{INTERVAL_LABEL}は自分の得点の割合の区間です。")
 
         else:
             st.info("分析対象のラリーデータがありません。")
@@ -159,6 +164,7 @@ def get_first_drive_analysis_for_ai(df):
     # 分類ごとの得点結果
     crosstab_count = pd.crosstab(df_rally['先に仕掛けたプレーヤー'], df_rally['得点者']).rename_axis(None)
     crosstab_rate = pd.crosstab(df_rally['先に仕掛けたプレーヤー'], df_rally['得点者'], normalize='index').rename_axis(None)
+    row_totals = crosstab_count.sum(axis=1)
     
     if '自分' in crosstab_count.columns and '相手' in crosstab_count.columns:
         crosstab_count = crosstab_count[['自分', '相手']]
@@ -167,11 +173,14 @@ def get_first_drive_analysis_for_ai(df):
     combined_df = pd.DataFrame(index=crosstab_count.index, columns=crosstab_count.columns)
     for col in combined_df.columns:
         combined_df[col] = crosstab_count[col].astype(str) + ' (' + crosstab_rate[col].apply(lambda x: f'{x:.1%}') + ')'
+    if '自分' in crosstab_count.columns:
+        combined_df[INTERVAL_LABEL] = format_wilson_intervals(crosstab_count['自分'], row_totals)
     
     combined_df = combined_df.rename(index={'相手': '相手が先に仕掛けた', '自分': '自分が先に仕掛けた', '仕掛けなし': '仕掛けなし'})
     combined_df = combined_df.rename(columns={'自分': '自分の得点', '相手': '相手の得点'})
 
     summary_text += f"### 分類ごとの得点結果 (得点数と得点率)\n"
+    summary_text += f"※{INTERVAL_LABEL}: 自分の得点率の区間。回数が少ないほど広くなる。\n"
     summary_text += combined_df.to_markdown()
     
     return summary_text
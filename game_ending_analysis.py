@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+from rate_intervals import INTERVAL_LABEL, format_wilson_intervals
 from utils import(time_to_seconds, create_youtube_link, group_serve_type, group_serve_course)
 
 def display_game_ending_analysis(df):
@@ -235,6 +236,7 @@ def display_game_ending_analysis(df):
         })
 
     summary_rates_df = pd.DataFrame(summary_rates)
+    summary_rates_df[INTERVAL_LABEL] = format_wilson_intervals(summary_rates_df['自分の得点数'], summary_rates_df['総ラリー数'])
     st.dataframe(summary_rates_df.style.format({'得点率 (%)': "{:.1f}%"}))
 
     st.markdown("---")
@@ -248,6 +250,8 @@ def display_game_ending_analysis(df):
             lambda row: round((row['得点に繋がった回数 (終盤前まで)'] / row['総回数 (終盤前まで)']) * 100, 1) 
             if row['総回数 (終盤前まで)'] > 0 else 0.0, axis=1
         )
+        summary_serve_df[INTERVAL_LABEL] = format_wilson_intervals(
+            summary_serve_df['得点に繋がった回数 (終盤前まで)'], summary_serve_df['総回数 (終盤前まで)'])
         
         # 表示する列の順序と名称を調整
         summary_serve_df = summary_serve_df[[
@@ -256,7 +260,8 @@ def display_game_ending_analysis(df):
             '結果', # 新しい「結果」列
             '総回数 (終盤前まで)', 
             '得点に繋がった回数 (終盤前まで)', 
-            '得点率 (%) (終盤前まで)'
+            '得点率 (%) (終盤前まで)',
+            INTERVAL_LABEL
         ]].sort_values(by=['場面'], ascending=[True]) # 場面でソート
 
         st.dataframe(summary_serve_df.style.format({
@@ -506,6 +511,7 @@ def get_game_ending_analysis_for_ai(df):
         })
 
     summary_rates_df = pd.DataFrame(summary_rates)
+    summary_rates_df[INTERVAL_LABEL] = format_wilson_intervals(summary_rates_df['自分の得点数'], summary_rates_df['総ラリー数'])
     analysis_text += summary_rates_df.to_markdown(index=False)
     analysis_text += "\n\n"
 
@@ -520,6 +526,8 @@ def get_game_ending_analysis_for_ai(df):
             lambda row: round((row['得点に繋がった回数 (終盤前まで)'] / row['総回数 (終盤前まで)']) * 100, 1) 
             if row['総回数 (終盤前まで)'] > 0 else 0.0, axis=1
         )
+        summary_serve_df[INTERVAL_LABEL] = format_wilson_intervals(
+            summary_serve_df['得点に繋がった回数 (終盤前まで)'], summary_serve_df['総回数 (終盤前まで)'])
         
         # 表示する列の順序と名称を調整
         summary_serve_df = summary_serve_df[[
@@ -528,7 +536,8 @@ def get_game_ending_analysis_for_ai(df):
             '結果', # 新しい「結果」列
             '総回数 (終盤前まで)', 
             '得点に繋がった回数 (終盤前まで)', 
-            '得点率 (%) (終盤前まで)'
+            '得点率 (%) (終盤前まで)',
+            INTERVAL_LABEL
         ]].sort_values(by=['場面'], ascending=[True]) # 場面でソート
 
         analysis_text += summary_serve_df.to_markdown(index=False)
@@ -643,7 +652,8 @@ def display_aite_game_ending_serve_analysis(df):
         )
         
         analysis_df = analysis_df.rename(columns={'相手のサーブ（種類・コース）': '相手のサーブ'})
-        analysis_df = analysis_df[['相手のサーブ', '総回数', '自分の得点', '相手の得点', '自分の得点率 (%)', '相手の得点率 (%)']]
+        analysis_df[INTERVAL_LABEL] = format_wilson_intervals(analysis_df['自分の得点'], analysis_df['総回数'])
+        analysis_df = analysis_df[['相手のサーブ', '総回数', '自分の得点', '相手の得点', '自分の得点率 (%)', INTERVAL_LABEL, '相手の得点率 (%)']]
         
         st.markdown(f"##### ゲーム{phase_name}の相手サーブ傾向")
         st.dataframe(analysis_df)
@@ -0,0 +1,119 @@
+"""
+試合のルール（点数・ゲーム数・サーブの交代）と、1行1ラリーの試合データから作る共通の派生データ
+（各ラリーの前のスコアとゲームの局面、1行1打球のショット表）。
+分析の登録や実行（analysis_registry）とは分けて、ルールだけが必要なモジュールからも読み込めるようにする。
+"""
+import numpy as np
+import pandas as pd
+
+# 試合のルール（11点先取・3ゲーム先取・サーブは2本交代）
+POINTS_TO_WIN = 11
+GAMES_TO_WIN = 3
+SERVES_PER_TURN = 2
+# 10-10からはサーブが1本交代になり、2点差がつくまで続く
+DEUCE_SCORE = POINTS_TO_WIN - 1
+# ゲーム終盤とみなす点数（両者がこの点数以上）
+GAME_ENDING_SCORE = 8
+
+
+def serve_turn(total):
+    """
+    ラリー前の両者の得点の合計から、ゲームの何回目のサーブの番か（0から）と、その番の何本目か（1 または 2）を返す。
+    サーブは SERVES_PER_TURN 本ずつ交代し、10-10からは1本ずつ交代する（何本目かは常に 1）。
+    サーブの番が偶数ならゲームの最初にサーブした人、奇数なら相手がサーブする。
+
+    Args:
+        total (int or array-like): ラリー前の自分の得点と相手の得点の合計
+
+    Returns:
+        tuple: (サーブの番, 何本目か)。total が配列の場合はそれぞれ同じ形の配列
+    """
+    total = np.asarray(total)
+    deuce_points = 2 * DEUCE_SCORE
+    is_deuce = total >= deuce_points
+    turn = np.where(is_deuce, deuce_points // SERVES_PER_TURN + (total - deuce_points), total // SERVES_PER_TURN)
+    position = np.where(is_deuce, 1, total % SERVES_PER_TURN + 1)
+    return turn, position
+
+
+# 1球ごとの列（球目, 種類, コース, 質）
+SHOT_COLUMNS = [
+    (1, 'サーブの種類', 'サーブのコース', 'サーブの質'),
+    (2, 'レシーブの種類', 'レシーブのコース', 'レシーブの質'),
+    (3, '３球目の種類', '３球目のコース', '３球目の質'),
+    (4, '４球目の種類', '４球目のコース', '４球目の質'),
+    (5, '５球目の種類', '５球目のコース', '５球目の質'),
+    (6, '６球目の種類', '６球目のコース', '６球目の質'),
+]
+
+
+def build_shot_table(df):
+    """
+    1行1ラリーの試合データを、1行1打球の表（ショット表）に変換する。
+    奇数球目はサーブを出した人、偶数球目はレシーブした人の打球になる。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+
+    Returns:
+        pd.DataFrame: 'ラリー番号', 'ゲーム数', '球目', '打者', '種類', 'コース', '質', '得点者' を持つ表
+    """
+    server = df['誰のサーブか']
+    receiver = server.map({'自分': '相手', '相手': '自分'})
+    frames = []
+    for shot_number, type_col, course_col, quality_col in SHOT_COLUMNS:
+        if type_col not in df.columns:
+            continue
+        frames.append(pd.DataFrame({
+            'ラリー番号': df.index,
+            'ゲーム数': df['ゲーム数'].values if 'ゲーム数' in df.columns else np.nan,
+            '球目': shot_number,
+            '打者': (server if shot_number % 2 == 1 else receiver).values,
+            '種類': df[type_col].values,
+            'コース': df[course_col].values if course_col in df.columns else np.nan,
+            '質': df[quality_col].values if quality_col in df.columns else np.nan,
+            '得点者': df['得点者'].values if '得点者' in df.columns else np.nan,
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['ラリー番号', 'ゲーム数', '球目', '打者', '種類', 'コース', '質', '得点者'])
+    shots = pd.concat(frames, ignore_index=True)
+    shots = shots[shots['種類'].notna() & (shots['種類'].astype(str).str.strip() != '')]
+    return shots.sort_values(['ラリー番号', '球目'], kind='stable').reset_index(drop=True)
+
+
+def build_score_state(df):
+    """
+    各ラリーが始まる前のスコアとゲームの局面を計算する。
+    '自分の得点'と'相手の得点'はラリー後の点数なので、得点者の点数から1を引いてラリー前の点数にする。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+
+    Returns:
+        pd.DataFrame: df と同じインデックスで 'ゲーム数', 'サーブ', '自分の得点_前', '相手の得点_前',
+            '得点者', 'ゲームフェーズ', 'デュース' を持つ表
+    """
+    my_score = pd.to_numeric(df['自分の得点'], errors='coerce').fillna(0).astype(int)
+    opponent_score = pd.to_numeric(df['相手の得点'], errors='coerce').fillna(0).astype(int)
+    my_before = my_score - (df['得点者'] == '自分').astype(int)
+    opponent_before = opponent_score - (df['得点者'] == '相手').astype(int)
+    is_game_ending = (my_before >= GAME_ENDING_SCORE) & (opponent_before >= GAME_ENDING_SCORE)
+    return pd.DataFrame({
+        'ゲーム数': df['ゲーム数'],
+        'サーブ': df['誰のサーブか'] if '誰のサーブか' in df.columns else np.nan,
+        '自分の得点_前': my_before,
+        '相手の得点_前': opponent_before,
+        '得点者': df['得点者'],
+        'ゲームフェーズ': np.where(is_game_ending, '終盤', '序盤・中盤'),
+        'デュース': (my_before >= DEUCE_SCORE) & (opponent_before >= DEUCE_SCORE),
+    }, index=df.index)
+
+
+def get_score_state(df, score_state=None):
+    """
+    build_score_state の結果を返す。score_state（画面表示やプロンプト生成で共有しているもの）があればそれを使う。
+    build_score_state は行ごとの計算なので、df が絞り込んだ行でも、共有している表から同じインデックスの行を取り出せばよい。
+    """
+    if score_state is None:
+        return build_score_state(df)
+    return score_state.loc[df.index]
@@ -0,0 +1,66 @@
+"""
+重いモジュールを、実際に使うときまで読み込まないための仕組み。
+各モジュールでは import の代わりに `px = lazy_module('plotly.express')` のようにモジュールの先頭で定義しておくと、
+グラフを描くなど最初に属性を使ったときに初めて読み込まれるため、アプリの起動が速くなる。
+"""
+import importlib.util
+import sys
+import types
+
+# 起動時に読み込まない重いモジュール（bench_startup.py で読み込まれていないことを確認する）
+# plotly.graph_objects は streamlit 自体が読み込むため対象外
+DEFERRED_MODULES = [
+    'plotly.express',
+    'google.generativeai',
+    'toml',
+    'gspread',
+]
+
+
+def _missing_module(name):
+    """インストールされていないモジュールの代わり。使われたときに初めてエラーにする。"""
+    module = types.ModuleType(name)
+
+    def __getattr__(attr):
+        raise ModuleNotFoundError(f"モジュール '{name}' がインストールされていません。", name=name)
+
+    module.__getattr__ = __getattr__
+    return module
+
+
+def lazy_module(name):
+    """
+    最初に属性へアクセスしたときに読み込まれるモジュールを返す。
+    グラフ描画ライブラリやAI関連のライブラリを、実際に使うまで読み込まないために使う。
+
+    Args:
+        name (str): モジュール名（例: 'plotly.express'）
+
+    Returns:
+        module: 遅延読み込みされるモジュール（インストールされていない場合は、使ったときにエラーになるモジュール）
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+
+    try:
+        spec = importlib.util.find_spec(name)
+    except ModuleNotFoundError:
+        spec = None
+    if spec is None:
+        return _missing_module(name)
+
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+def is_loaded(name):
+    """モジュールが実際に読み込まれているか（遅延読み込みの待機中ではないか）を返す。"""
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    # LazyLoader のモジュールは、読み込みが終わるまで _LazyModule クラスになっている
+    return type(module).__name__ != '_LazyModule'
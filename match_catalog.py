@@ -0,0 +1,242 @@
+"""
+試合ファイルの一覧（カタログ）を管理するモジュール。
+Excelファイルごとに対戦相手・所属・戦型・日付・ゲームスコア・ラリー数を1行で保存しておき、
+ファイル選択の画面ではExcelを開かずに絞り込み・並べ替えができるようにする。
+更新時刻とサイズが変わったファイルだけを読み直す。
+
+使い方:
+    python match_catalog.py --dir . --db match_store.db
+"""
+import argparse
+import hashlib
+import os
+
+import pandas as pd
+import streamlit as st
+
+from data_loader import read_match_workbook
+from match_store import MATCH_DB_PATH, connect, parse_match_date
+
+_CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog (
+    file_name TEXT PRIMARY KEY,
+    file_mtime REAL NOT NULL,
+    file_size INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,
+    match_date TEXT,
+    opponent_name TEXT,
+    affiliation TEXT,
+    opponent_style TEXT,
+    my_style TEXT,
+    my_games INTEGER,
+    opponent_games INTEGER,
+    game_scores TEXT,
+    rally_count INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_date ON catalog (match_date);
+CREATE INDEX IF NOT EXISTS idx_catalog_opponent ON catalog (opponent_name);
+CREATE INDEX IF NOT EXISTS idx_catalog_style ON catalog (opponent_style);
+"""
+
+# ファイル選択の画面でフォルダを走査し直す間隔（秒）
+CATALOG_REFRESH_SECONDS = 60
+
+CATALOG_COLUMNS = [
+    'file_name', 'file_mtime', 'file_size', 'content_hash', 'match_date', 'opponent_name', 'affiliation',
+    'opponent_style', 'my_style', 'my_games', 'opponent_games', 'game_scores', 'rally_count', 'error',
+]
+
+
+def connect_catalog(db_path=MATCH_DB_PATH):
+    """カタログのテーブルを持つデータベースに接続する。"""
+    conn = connect(db_path)
+    conn.executescript(_CATALOG_SCHEMA)
+    return conn
+
+
+def file_hash(path, chunk_size=1 << 20):
+    """ファイルの内容のハッシュ値（sha256）を返す。"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def compute_game_score(df):
+    """
+    各ゲームの最後の得点から、ゲームスコアを計算する（match_summary と同じ数え方）。
+
+    Returns:
+        tuple: (自分の取ったゲーム数, 相手の取ったゲーム数, '11-9, 8-11' 形式のスコア)
+    """
+    if df.empty or not {'ゲーム数', '自分の得点', '相手の得点'}.issubset(df.columns):
+        return None, None, None
+    last_points = df.groupby('ゲーム数', sort=True)[['自分の得点', '相手の得点']].last()
+    my_games = int((last_points['自分の得点'] > last_points['相手の得点']).sum())
+    scores = ', '.join(f"{my}-{opponent}" for my, opponent in last_points.itertuples(index=False, name=None))
+    return my_games, len(last_points) - my_games, scores
+
+
+def _read_entry(path):
+    """Excelファイルを開いてカタログの1行分の情報を作る。"""
+    entry = {'match_date': parse_match_date(path)}
+    try:
+        df, df_opponents, _ = read_match_workbook(path)
+    except Exception as e:
+        entry['error'] = str(e)
+        return entry
+
+    def get(column):
+        if column not in df_opponents.columns or df_opponents.empty or pd.isna(df_opponents.iloc[0][column]):
+            return None
+        return str(df_opponents.iloc[0][column]).strip()
+
+    entry.update({
+        'opponent_name': get('名前'),
+        'affiliation': get('所属'),
+        'opponent_style': get('相手の戦型'),
+        'my_style': get('自分の戦型'),
+        'rally_count': len(df),
+        'error': None,
+    })
+    entry['my_games'], entry['opponent_games'], entry['game_scores'] = compute_game_score(df)
+    return entry
+
+
+def refresh_catalog(conn, directory='.'):
+    """
+    フォルダを走査して、変更のあったファイルだけカタログを更新する。
+    更新時刻とサイズが同じファイルは開かない。更新時刻だけ変わって内容が同じファイルは、ハッシュ値で判定して読み直さない。
+
+    Returns:
+        dict: {'updated': 読み直したファイル, 'removed': カタログから消したファイル}
+    """
+    stored = {row[0]: row[1:] for row in conn.execute(
+        'SELECT file_name, file_mtime, file_size, content_hash FROM catalog')}
+    result = {'updated': [], 'removed': []}
+    found = set()
+    with conn:
+        for entry in os.scandir(directory):
+            if not entry.is_file() or not entry.name.endswith('.xlsx') or entry.name.startswith('~$'):
+                continue
+            found.add(entry.name)
+            stat = entry.stat()
+            previous = stored.get(entry.name)
+            if previous is not None and previous[0] == stat.st_mtime and previous[1] == stat.st_size:
+                continue
+
+            content_hash = file_hash(entry.path)
+            if previous is not None and previous[2] == content_hash:
+                conn.execute('UPDATE catalog SET file_mtime = ?, file_size = ? WHERE file_name = ?',
+                             (stat.st_mtime, stat.st_size, entry.name))
+                continue
+
+            row = {'file_name': entry.name, 'file_mtime': stat.st_mtime, 'file_size': stat.st_size,
+                   'content_hash': content_hash}
+            row.update(_read_entry(entry.path))
+            conn.execute(
+                f'INSERT OR REPLACE INTO catalog ({", ".join(CATALOG_COLUMNS)}) '
+                f'VALUES ({", ".join("?" * len(CATALOG_COLUMNS))})',
+                [row.get(column) for column in CATALOG_COLUMNS])
+            result['updated'].append(entry.name)
+
+        result['removed'] = sorted(set(stored) - found)
+        conn.executemany('DELETE FROM catalog WHERE file_name = ?', [(name,) for name in result['removed']])
+    return result
+
+
+def load_catalog(conn):
+    """カタログを日付の新しい順のDataFrameで返す（日付のないファイルは最後）。"""
+    return pd.read_sql_query(
+        f'SELECT {", ".join(CATALOG_COLUMNS)} FROM catalog '
+        'ORDER BY match_date IS NULL, match_date DESC, file_name', conn)
+
+
+def format_catalog_entry(row):
+    """ファイル選択に表示する1行の文字列を作る。"""
+    parts = [row['match_date'] if pd.notna(row['match_date']) else '日付なし']
+    if pd.notna(row['opponent_name']):
+        opponent = row['opponent_name']
+        if pd.notna(row['affiliation']):
+            opponent += f"({row['affiliation']})"
+        parts.append(opponent)
+    if pd.notna(row['my_games']):
+        parts.append(f"{int(row['my_games'])}-{int(row['opponent_games'])}")
+    if pd.notna(row['rally_count']):
+        parts.append(f"{int(row['rally_count'])}ラリー")
+    return f"{' / '.join(parts)}  [{row['file_name']}]"
+
+
+@st.cache_data(ttl=CATALOG_REFRESH_SECONDS, show_spinner=False)
+def get_catalog(directory='.', db_path=MATCH_DB_PATH):
+    """カタログを更新して返す。再実行のたびにフォルダを走査しないよう、一定時間キャッシュする。"""
+    conn = connect_catalog(db_path)
+    try:
+        refresh_catalog(conn, directory)
+        return load_catalog(conn)
+    finally:
+        conn.close()
+
+
+SORT_OPTIONS = {
+    '日付（新しい順）': (['match_date', 'file_name'], [False, True]),
+    '日付（古い順）': (['match_date', 'file_name'], [True, True]),
+    '対戦相手': (['opponent_name', 'match_date'], [True, False]),
+    'ラリー数': (['rally_count', 'match_date'], [False, False]),
+}
+
+
+def select_match_file(directory='.'):
+    """
+    カタログから試合ファイルを選ぶ画面を表示する。対戦相手・戦型で絞り込み、並べ替えができる。
+
+    Returns:
+        str: 選ばれたファイル名（ファイルがない場合は None）
+    """
+    catalog = get_catalog(directory)
+    if catalog.empty:
+        return None
+
+    with st.expander("🔍 試合の絞り込み・並べ替え"):
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            keyword = st.text_input("対戦相手・所属・ファイル名", key="catalog_keyword")
+        with col2:
+            styles = sorted(catalog['opponent_style'].dropna().unique())
+            selected_styles = st.multiselect("相手の戦型", styles, key="catalog_styles")
+        with col3:
+            sort_label = st.selectbox("並べ替え", list(SORT_OPTIONS), key="catalog_sort")
+        if st.button("🔄 一覧を更新", key="catalog_refresh"):
+            get_catalog.clear()
+            catalog = get_catalog(directory)
+
+    filtered = catalog
+    if keyword:
+        text = filtered[['opponent_name', 'affiliation', 'file_name']].fillna('').agg(' '.join, axis=1)
+        filtered = filtered[text.str.contains(keyword, case=False, regex=False)]
+    if selected_styles:
+        filtered = filtered[filtered['opponent_style'].isin(selected_styles)]
+    by, ascending = SORT_OPTIONS[sort_label]
+    filtered = filtered.sort_values(by, ascending=ascending, na_position='last', kind='stable')
+
+    if filtered.empty:
+        st.info("条件に合う試合がありません。絞り込みの条件を変えてください。")
+        return None
+
+    labels = {row['file_name']: format_catalog_entry(row) for _, row in filtered.iterrows()}
+    return st.selectbox("分析する試合データを選択してください", list(labels), format_func=labels.get)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='試合ファイルのカタログを更新する')
+    parser.add_argument('--dir', default='.', help='Excelファイルのあるフォルダ')
+    parser.add_argument('--db', default=MATCH_DB_PATH, help='データベースのファイル')
+    args = parser.parse_args()
+
+    conn = connect_catalog(args.db)
+    result = refresh_catalog(conn, args.dir)
+    print(f"更新: {len(result['updated'])} 件、削除: {len(result['removed'])} 件")
+    for _, row in load_catalog(conn).iterrows():
+        print(format_catalog_entry(row))
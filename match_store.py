@@ -0,0 +1,513 @@
+"""
+全試合のラリーデータを1つのSQLiteデータベースにまとめるモジュール。
+フォルダ内のExcelファイル（「試合分析」「対戦者」シート）を取り込み、
+試合・選手・ラリー・打球の4つのテーブルに保存する。
+1つの試合、1人の対戦相手、期間などで絞り込んだラリーを、既存の分析関数と同じ形のDataFrameで取り出せる。
+
+フォルダの取り込みでは、Excelの読み込みと集計を複数のプロセスで並列に行い、
+データベースへの書き込みだけをメインのプロセスで行う。読み込めないファイルがあっても止めずに、
+ファイルごとのエラー・警告をまとめて返す。
+
+使い方:
+    python match_store.py --dir . --db match_store.db --workers 4
+"""
+import argparse
+import os
+import re
+import sqlite3
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+import streamlit as st
+
+from data_loader import read_match_workbook
+from data_validation import validate_rallies
+from game_rules import build_shot_table
+from momentum import MOMENTUM_COLUMNS, compute_momentum_partials
+from rally_tempo import add_tempo_columns
+from scouting_report import PARTIAL_COLUMNS, compute_opponent_partials
+from season_trend import SUMMARY_COLUMNS, compute_match_summary
+from utils import STORE_REFRESH_SECONDS, create_youtube_link, find_invalid_times
+
+MATCH_DB_PATH = 'match_store.db'
+# 取り込み時に作るテーブルが変わったら上げる（古いデータベースの試合は取り込み直す）
+STORE_VERSION = 4
+
+# ラリーのテーブルに保存する「試合分析」シートの列（ファイルによってない列は NULL になる）
+RALLY_COLUMNS = [
+    'ラリーNo', '開始時刻', '終了時刻', '自分の戦型', '相手の戦型', 'ゲーム数', '自分の得点', '相手の得点',
+    '得失点の種類', '得点者', '誰のサーブか',
+    'サーブの種類', 'サーブのコース', 'サーブの質',
+    'レシーブの種類', 'レシーブのコース', 'レシーブの質',
+    '３球目の種類', '３球目のコース', '３球目の質',
+    '４球目の種類', '４球目のコース', '４球目の質',
+    '５球目の種類', '５球目のコース', '５球目の質',
+    '６球目の種類', '６球目のコース', '６球目の質',
+    '７球目以降', '得点の種類', '得点の内容', '失点の種類', '失点の内容',
+    'フットワークの評価', '戦術の意図', 'メンタルの評価', 'コメント・課題', '開始時刻_秒',
+]
+_INTEGER_COLUMNS = ['ラリーNo', 'ゲーム数', '自分の得点', '相手の得点', '開始時刻_秒']
+
+# ファイル名に含まれる日付（例: 2026-02-08、2025-05）
+_DATE_PATTERN = re.compile(r'(\d{4})-(\d{1,2})(?:-(\d{1,2}))?')
+
+
+def _quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS players (
+    player_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    affiliation TEXT NOT NULL DEFAULT '',
+    style TEXT,
+    UNIQUE (name, affiliation)
+);
+CREATE TABLE IF NOT EXISTS matches (
+    match_id INTEGER PRIMARY KEY,
+    file_name TEXT NOT NULL UNIQUE,
+    file_mtime REAL NOT NULL,
+    match_date TEXT,
+    opponent_id INTEGER REFERENCES players (player_id),
+    opponent_style TEXT,
+    my_style TEXT,
+    youtube_id TEXT
+);
+CREATE TABLE IF NOT EXISTS rallies (
+    rally_id INTEGER PRIMARY KEY,
+    match_id INTEGER NOT NULL REFERENCES matches (match_id) ON DELETE CASCADE,
+    rally_index INTEGER NOT NULL,
+    {', '.join(f'{_quote(col)} {"INTEGER" if col in _INTEGER_COLUMNS else "TEXT"}' for col in RALLY_COLUMNS)}
+);
+CREATE TABLE IF NOT EXISTS shots (
+    rally_id INTEGER NOT NULL REFERENCES rallies (rally_id) ON DELETE CASCADE,
+    ball_number INTEGER NOT NULL,
+    hitter TEXT,
+    shot_type TEXT,
+    course TEXT,
+    quality TEXT,
+    PRIMARY KEY (rally_id, ball_number)
+);
+CREATE TABLE IF NOT EXISTS opponent_partials (
+    match_id INTEGER NOT NULL REFERENCES matches (match_id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    phase TEXT NOT NULL,
+    category TEXT NOT NULL,
+    detail TEXT NOT NULL,
+    total INTEGER NOT NULL,
+    won INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_opponent_partials_match ON opponent_partials (match_id);
+CREATE TABLE IF NOT EXISTS match_summaries (
+    match_id INTEGER NOT NULL REFERENCES matches (match_id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    numerator INTEGER NOT NULL,
+    denominator INTEGER NOT NULL,
+    PRIMARY KEY (match_id, metric)
+);
+CREATE TABLE IF NOT EXISTS momentum_partials (
+    match_id INTEGER NOT NULL REFERENCES matches (match_id) ON DELETE CASCADE,
+    metric TEXT NOT NULL,
+    player TEXT NOT NULL,
+    length INTEGER NOT NULL,
+    total INTEGER NOT NULL,
+    won INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_momentum_partials_match ON momentum_partials (match_id);
+CREATE INDEX IF NOT EXISTS idx_players_name ON players (name);
+CREATE INDEX IF NOT EXISTS idx_players_style ON players (style);
+CREATE INDEX IF NOT EXISTS idx_matches_opponent ON matches (opponent_id);
+CREATE INDEX IF NOT EXISTS idx_matches_style ON matches (opponent_style);
+CREATE INDEX IF NOT EXISTS idx_matches_date ON matches (match_date);
+CREATE INDEX IF NOT EXISTS idx_rallies_match_game ON rallies (match_id, "ゲーム数");
+CREATE INDEX IF NOT EXISTS idx_shots_type ON shots (shot_type, hitter);
+"""
+
+
+def connect(db_path=MATCH_DB_PATH):
+    """データベースに接続し、テーブルとインデックスがなければ作る。"""
+    conn = sqlite3.connect(db_path)
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.executescript(_SCHEMA)
+    if conn.execute('PRAGMA user_version').fetchone()[0] < STORE_VERSION:
+        # 古いバージョンで取り込んだ試合には新しいテーブルのデータがないため、取り込み直させる
+        with conn:
+            conn.execute('DELETE FROM matches')
+        conn.execute(f'PRAGMA user_version = {STORE_VERSION}')
+    return conn
+
+
+def parse_match_date(file_name):
+    """
+    ファイル名から試合の日付を取り出す。
+
+    Returns:
+        str: 'YYYY-MM-DD'（日がない場合は 'YYYY-MM'）。日付がない場合は None
+    """
+    match = _DATE_PATTERN.search(os.path.basename(file_name))
+    if match is None:
+        return None
+    year, month, day = match.groups()
+    if day is None:
+        return f"{year}-{int(month):02d}"
+    return f"{year}-{int(month):02d}-{int(day):02d}"
+
+
+def _to_db_value(value):
+    # SQLite に保存できない型（時刻など）は文字列にする
+    if value is None or (not isinstance(value, str) and pd.isna(value)):
+        return None
+    if isinstance(value, (int, float, str)):
+        return value
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
+
+
+def _opponent_info(df_opponents):
+    row = df_opponents.iloc[0] if not df_opponents.empty else pd.Series(dtype=object)
+
+    def get(column):
+        value = _to_db_value(row.get(column))
+        return str(value).strip() if value is not None else None
+
+    return {
+        'name': get('名前') or '不明',
+        'affiliation': get('所属') or '',
+        'style': get('相手の戦型'),
+        'my_style': get('自分の戦型'),
+    }
+
+
+def _upsert_player(conn, name, affiliation, style):
+    conn.execute(
+        'INSERT INTO players (name, affiliation, style) VALUES (?, ?, ?) '
+        'ON CONFLICT (name, affiliation) DO UPDATE SET style = COALESCE(excluded.style, players.style)',
+        (name, affiliation, style))
+    return conn.execute('SELECT player_id FROM players WHERE name = ? AND affiliation = ?',
+                        (name, affiliation)).fetchone()[0]
+
+
+def compute_match_tables(df):
+    """
+    1試合分のデータから、ラリー以外に保存する表（打球・相手の部分集計・推移の指標・連続得失点の集計）を計算する。
+
+    Returns:
+        dict: {'shots': 打球の表（サーブの列がない場合は None）, 'partials': 部分集計, 'summary': 推移の指標,
+               'momentum': 連続得失点の集計}
+    """
+    df = df.reset_index(drop=True)
+    return {
+        'shots': build_shot_table(df) if '誰のサーブか' in df.columns else None,
+        'partials': compute_opponent_partials(df),
+        'summary': compute_match_summary(df),
+        'momentum': compute_momentum_partials(df),
+    }
+
+
+def ingest_match(conn, file_name, file_mtime, df, df_opponents, youtube_video_id, tables=None):
+    """
+    読み込み済みの1試合分のデータをデータベースに保存する（同じファイルの古いデータは置き換える）。
+
+    Args:
+        conn (sqlite3.Connection): connect で作った接続
+        file_name (str): Excelファイル名（試合を区別するキー）
+        file_mtime (float): ファイルの更新時刻
+        df (pd.DataFrame): 「試合分析」シートのデータ
+        df_opponents (pd.DataFrame): 「対戦者」シートのデータ
+        youtube_video_id (str): YouTube動画ID
+        tables (dict): compute_match_tables の結果（None の場合はここで計算する）
+
+    Returns:
+        int: 試合ID
+    """
+    if tables is None:
+        tables = compute_match_tables(df)
+    opponent = _opponent_info(df_opponents)
+    with conn:
+        conn.execute('DELETE FROM matches WHERE file_name = ?', (file_name,))
+        opponent_id = _upsert_player(conn, opponent['name'], opponent['affiliation'], opponent['style'])
+        match_id = conn.execute(
+            'INSERT INTO matches (file_name, file_mtime, match_date, opponent_id, opponent_style, my_style, youtube_id) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (file_name, file_mtime, parse_match_date(file_name), opponent_id,
+             opponent['style'], opponent['my_style'], _to_db_value(youtube_video_id))).lastrowid
+
+        df = df.reset_index(drop=True)
+        columns = [col for col in RALLY_COLUMNS if col in df.columns]
+        insert_rally = (f'INSERT INTO rallies (match_id, rally_index, {", ".join(_quote(c) for c in columns)}) '
+                        f'VALUES (?, ?, {", ".join("?" * len(columns))})')
+        rally_ids = []
+        for rally_index, values in enumerate(df[columns].itertuples(index=False, name=None)):
+            cursor = conn.execute(insert_rally, (match_id, rally_index, *[_to_db_value(v) for v in values]))
+            rally_ids.append(cursor.lastrowid)
+
+        shots = tables['shots']
+        if shots is not None:
+            conn.executemany(
+                'INSERT INTO shots (rally_id, ball_number, hitter, shot_type, course, quality) VALUES (?, ?, ?, ?, ?, ?)',
+                [(rally_ids[row[0]], int(row[1]), *[_to_db_value(v) for v in row[2:]])
+                 for row in shots[['ラリー番号', '球目', '打者', '種類', 'コース', '質']].itertuples(index=False, name=None)])
+
+        partials = tables['partials']
+        conn.executemany(
+            f'INSERT INTO opponent_partials (match_id, {", ".join(PARTIAL_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?, ?)',
+            [(match_id, *[_to_db_value(v) for v in row]) for row in partials.itertuples(index=False, name=None)])
+
+        summary = tables['summary']
+        conn.executemany(
+            f'INSERT INTO match_summaries (match_id, {", ".join(SUMMARY_COLUMNS)}) VALUES (?, ?, ?, ?)',
+            [(match_id, *[_to_db_value(v) for v in row]) for row in summary.itertuples(index=False, name=None)])
+
+        momentum = tables['momentum']
+        conn.executemany(
+            f'INSERT INTO momentum_partials (match_id, {", ".join(MOMENTUM_COLUMNS)}) VALUES (?, ?, ?, ?, ?, ?)',
+            [(match_id, *[_to_db_value(v) for v in row]) for row in momentum.itertuples(index=False, name=None)])
+    return match_id
+
+
+def _issue(kind, message):
+    return {'kind': kind, 'message': message}
+
+
+def parse_match_file(path):
+    """
+    1つのExcelファイルを読み込み、保存する表をすべて計算する（ワーカープロセスで実行する）。
+    エラーは例外にせず、種類とメッセージで返す。
+
+    エラーの種類:
+        missing_sheet: 「試合分析」または「対戦者」シートがない（取り込まない）
+        missing_column: 「試合分析」シートに集計に必要な列がない（取り込まない）
+        unreadable: ファイルが読み込めない（取り込まない）
+        missing_youtube_id: 「対戦者」シートに「Youtube Id」列がない（リンクなしで取り込む）
+        missing_start_time: 「開始時刻」列がない（リンクなしで取り込む）
+        invalid_time: 時刻の形式が不正な行がある（その行は0秒として取り込む）
+        data_integrity: スコア・サーブの順番・打球の入力に確認が必要な行がある（そのまま取り込む）
+
+    Returns:
+        dict: {'error': 取り込めない場合のエラー（ない場合は None）, 'warnings': 警告のリスト,
+               'data': read_match_workbook の結果と compute_match_tables の結果（取り込めない場合は None）}
+    """
+    result = {'error': None, 'warnings': [], 'data': None}
+    try:
+        df, df_opponents, youtube_video_id = read_match_workbook(path)
+    except KeyError as e:
+        result['error'] = _issue('missing_sheet', e.args[0] if e.args else str(e))
+        return result
+    except Exception as e:
+        result['error'] = _issue('unreadable', f"{type(e).__name__}: {e}")
+        return result
+
+    try:
+        tables = compute_match_tables(df)
+    except KeyError as e:
+        column = e.args[0] if e.args else str(e)
+        result['error'] = _issue('missing_column', f"「試合分析」シートに「{column}」列がありません")
+        return result
+    except Exception as e:
+        result['error'] = _issue('unreadable', f"{type(e).__name__}: {e}")
+        return result
+
+    if youtube_video_id is None or pd.isna(youtube_video_id):
+        result['warnings'].append(_issue('missing_youtube_id', "「対戦者」シートに「Youtube Id」がありません"))
+    if '開始時刻' not in df.columns:
+        result['warnings'].append(_issue('missing_start_time', "「試合分析」シートに「開始時刻」列がありません"))
+    else:
+        invalid = find_invalid_times(df['開始時刻'])
+        if not invalid.empty:
+            rows = ', '.join(f"{index + 2}行目({value})" for index, value in invalid.head(5).items())
+            more = f" ほか{len(invalid) - 5}件" if len(invalid) > 5 else ''
+            result['warnings'].append(_issue('invalid_time', f"開始時刻の形式が不正です: {rows}{more}"))
+    report = validate_rallies(df)
+    if not report.empty:
+        counts = '、'.join(f"{kind} {count}件" for kind, count in report['種類'].value_counts().items())
+        rows = ', '.join(f"{row}行目" for row in report['行'].drop_duplicates().head(5))
+        result['warnings'].append(_issue('data_integrity', f"確認が必要な入力があります: {counts}（{rows}など）"))
+    result['data'] = (df, df_opponents, youtube_video_id, tables)
+    return result
+
+
+def _parse_files(paths, workers):
+    """ファイルを読み込む。workers が2以上でファイルが複数ある場合はプロセスを分けて並列に読み込む。"""
+    if workers == 1 or len(paths) <= 1:
+        yield from map(parse_match_file, paths)
+        return
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        # 読み込みが終わった順ではなくファイル名の順に、順次受け取って書き込む
+        yield from executor.map(parse_match_file, paths)
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def ingest_directory(conn, directory='.', workers=None):
+    """
+    フォルダ内のExcelファイルをすべてデータベースに取り込む。
+    前回の取り込みから更新されていないファイルは読み込まない。
+    読み込めないファイルがあっても止めずに、残りのファイルを取り込む。
+
+    Args:
+        conn (sqlite3.Connection): connect で作った接続
+        directory (str): Excelファイルのあるフォルダ
+        workers (int): 読み込みに使うプロセス数（None の場合はCPUの数、1 の場合は並列にしない）
+
+    Returns:
+        dict: {'ingested': 取り込んだファイル, 'skipped': 変更がなかったファイル,
+               'failed': {ファイル名: {'kind': エラーの種類, 'message': 内容}},
+               'warnings': {ファイル名: [{'kind': 警告の種類, 'message': 内容}, ...]},
+               'seconds': 読み込みと書き込みにかかった秒数, 'files_per_second': 1秒あたりの処理ファイル数}
+    """
+    stored = dict(conn.execute('SELECT file_name, file_mtime FROM matches'))
+    result = {'ingested': [], 'skipped': [], 'failed': {}, 'warnings': {}}
+    file_names = sorted(f for f in os.listdir(directory) if f.endswith('.xlsx') and not f.startswith('~$'))
+    targets = []
+    for file_name in file_names:
+        mtime = os.path.getmtime(os.path.join(directory, file_name))
+        if stored.get(file_name) == mtime:
+            result['skipped'].append(file_name)
+        else:
+            targets.append((file_name, mtime))
+
+    start = time.perf_counter()
+    parsed = _parse_files([os.path.join(directory, name) for name, _ in targets], workers or os.cpu_count() or 1)
+    for (file_name, mtime), parsed_file in zip(targets, parsed):
+        if parsed_file['warnings']:
+            result['warnings'][file_name] = parsed_file['warnings']
+        if parsed_file['error'] is not None:
+            result['failed'][file_name] = parsed_file['error']
+            continue
+        df, df_opponents, youtube_video_id, tables = parsed_file['data']
+        ingest_match(conn, file_name, mtime, df, df_opponents, youtube_video_id, tables)
+        result['ingested'].append(file_name)
+    result['seconds'] = time.perf_counter() - start
+    result['files_per_second'] = len(targets) / result['seconds'] if targets and result['seconds'] > 0 else 0.0
+
+    # フォルダからなくなったファイルの試合は削除する
+    removed = set(stored) - set(file_names)
+    with conn:
+        conn.executemany('DELETE FROM matches WHERE file_name = ?', [(name,) for name in removed])
+    return result
+
+
+@st.cache_data(ttl=STORE_REFRESH_SECONDS, show_spinner=False)
+def refresh_store(directory='.', db_path=MATCH_DB_PATH):
+    """画面表示用に、フォルダの試合をデータベースへ取り込む（一定時間は取り込み直さない）。"""
+    conn = connect(db_path)
+    try:
+        # 画面の表示中は変更のあった数ファイルだけを取り込むため、Streamlit のサーバーからプロセスを増やさない
+        return ingest_directory(conn, directory, workers=1)
+    finally:
+        conn.close()
+
+
+def list_matches(conn):
+    """取り込んだ試合の一覧を返す（日付の新しい順）。"""
+    return pd.read_sql_query(
+        'SELECT m.match_id, m.file_name, m.match_date, p.name AS opponent_name, p.affiliation, '
+        'm.opponent_style, m.my_style, COUNT(r.rally_id) AS rally_count '
+        'FROM matches m LEFT JOIN players p ON p.player_id = m.opponent_id '
+        'LEFT JOIN rallies r ON r.match_id = m.match_id '
+        'GROUP BY m.match_id ORDER BY m.match_date DESC, m.file_name', conn)
+
+
+def _match_filter(match_ids=None, opponent=None, opponent_style=None, date_from=None, date_to=None):
+    conditions, params = [], []
+    if match_ids is not None:
+        match_ids = list(match_ids)
+        conditions.append(f'm.match_id IN ({", ".join("?" * len(match_ids))})' if match_ids else '0')
+        params += match_ids
+    if opponent is not None:
+        conditions.append('p.name = ?')
+        params.append(opponent)
+    if opponent_style is not None:
+        conditions.append('m.opponent_style = ?')
+        params.append(opponent_style)
+    if date_from is not None:
+        conditions.append('m.match_date >= ?')
+        params.append(date_from)
+    if date_to is not None:
+        conditions.append('m.match_date <= ?')
+        params.append(date_to)
+    return (' WHERE ' + ' AND '.join(conditions)) if conditions else '', params
+
+
+def query_rallies(conn, match_ids=None, opponent=None, opponent_style=None, date_from=None, date_to=None, games=None):
+    """
+    条件に合うラリーを「試合分析」シートと同じ列のDataFrameで返す。
+    既存の display_* / get_*_for_ai 関数にそのまま渡せる。
+
+    Args:
+        conn (sqlite3.Connection): connect で作った接続
+        match_ids (list): 試合IDで絞り込む
+        opponent (str): 対戦相手の名前で絞り込む
+        opponent_style (str): 対戦相手の戦型で絞り込む
+        date_from (str): この日付以降の試合（'YYYY-MM-DD'）
+        date_to (str): この日付以前の試合（'YYYY-MM-DD'）
+        games (list): ゲーム数で絞り込む
+
+    Returns:
+        pd.DataFrame: ラリーのデータ（試合ID・ファイル名・YouTubeリンクの列を含む）
+    """
+    where, params = _match_filter(match_ids, opponent, opponent_style, date_from, date_to)
+    if games is not None:
+        games = list(games)
+        where += (' AND ' if where else ' WHERE ') + (
+            f'r."ゲーム数" IN ({", ".join("?" * len(games))})' if games else '0')
+        params += games
+    df = pd.read_sql_query(
+        f'SELECT m.match_id AS "試合ID", m.file_name AS "ファイル名", m.youtube_id AS "_youtube_id", '
+        f'{", ".join("r." + _quote(col) for col in RALLY_COLUMNS)} '
+        f'FROM rallies r JOIN matches m ON m.match_id = r.match_id '
+        f'LEFT JOIN players p ON p.player_id = m.opponent_id'
+        f'{where} ORDER BY m.match_date, m.match_id, r.rally_index', conn, params=params)
+
+    # 取り込んだファイルになかった列は落として、元のシートと同じ形にする
+    df = df.dropna(axis=1, how='all')
+    if '開始時刻_秒' in df.columns:
+        df['YouTubeリンク'] = [create_youtube_link(video_id, seconds)
+                               for video_id, seconds in zip(df['_youtube_id'], df['開始時刻_秒'])]
+    else:
+        df['YouTubeリンク'] = "#"
+    # ラリー時間の列は保存せず、読み込むたびに計算する（試合IDでゲームを区別する）
+    return add_tempo_columns(df.drop(columns=['_youtube_id'], errors='ignore'))
+
+
+def load_stored_rallies(**filters):
+    """画面表示用に、フォルダの試合を取り込んでから条件に合うラリーを返す（条件は query_rallies と同じ）。"""
+    refresh_store()
+    conn = connect()
+    try:
+        return query_rallies(conn, **filters)
+    finally:
+        conn.close()
+
+
+def query_opponents(conn, match_ids=None, opponent=None, opponent_style=None, date_from=None, date_to=None):
+    """条件に合う試合の「対戦者」シート相当のDataFrameを返す（1試合1行）。"""
+    where, params = _match_filter(match_ids, opponent, opponent_style, date_from, date_to)
+    return pd.read_sql_query(
+        'SELECT m.match_id AS "試合ID", p.affiliation AS "所属", p.name AS "名前", m.youtube_id AS "Youtube Id", '
+        'm.opponent_style AS "相手の戦型", m.my_style AS "自分の戦型", m.match_date AS "日付" '
+        'FROM matches m LEFT JOIN players p ON p.player_id = m.opponent_id'
+        f'{where} ORDER BY m.match_date, m.match_id', conn, params=params)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='全試合のラリーデータをデータベースに取り込む')
+    parser.add_argument('--dir', default='.', help='Excelファイルのあるフォルダ')
+    parser.add_argument('--db', default=MATCH_DB_PATH, help='データベースのファイル')
+    parser.add_argument('--workers', type=int, default=None, help='読み込みに使うプロセス数（省略時はCPUの数）')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    result = ingest_directory(conn, args.dir, args.workers)
+    print(f"取り込み: {len(result['ingested'])} 件、変更なし: {len(result['skipped'])} 件、失敗: {len(result['failed'])} 件")
+    print(f"処理時間: {result['seconds']:.2f} 秒（{result['files_per_second']:.2f} ファイル/秒）")
+    for file_name, error in result['failed'].items():
+        print(f"  [失敗] {file_name}: {error['kind']}: {error['message']}")
+    for file_name, warnings in result['warnings'].items():
+        for warning in warnings:
+            print(f"  [警告] {file_name}: {warning['kind']}: {warning['message']}")
+    print(list_matches(conn).to_string(index=False))
@@ -0,0 +1,319 @@
+"""
+スコアの状態（自分の得点・相手の得点・サーブ・ゲームカウント）ごとの、ゲームと試合を取る確率。
+自分のサーブ時とレシーブ時の得点率をデータから求め、卓球のルール（ai_config.COMMON_PROMPT_HEADER）どおりに
+11点先取・10-10からは2点差・サーブは2本交代（10-10からは1本交代）・5ゲーム制（3ゲーム先取）で計算する。
+
+各ラリーの重要度（レバレッジ）は「そのラリーを取ったときと落としたときの、試合を取る確率の差」で、
+スコアの状態ごとの確率の表を一度作ってから、全ラリーを配列の添字でまとめて計算する。
+"""
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from game_rules import DEUCE_SCORE, GAMES_TO_WIN, POINTS_TO_WIN, get_score_state, serve_turn
+from lazy_import import lazy_module
+
+px = lazy_module('plotly.express')
+
+_ME, _OPPONENT = 0, 1
+# 確率の表で持つ得点の範囲（10-10以降は、同じ点差で同じサーブ順の状態にまとめる）
+_SCORE_SIZE = POINTS_TO_WIN + 2
+
+
+def _normalize_score(my_score, opponent_score):
+    """10-10以降のスコアを、点差とサーブ順が同じ 10-10 / 11-10 / 10-11 などの状態にまとめる（1本ずつ引くので合計の偶奇は変わらない）。"""
+    excess = min(my_score, opponent_score) - DEUCE_SCORE
+    if excess > 0:
+        return my_score - excess, opponent_score - excess
+    return my_score, opponent_score
+
+
+def server_at(my_score, opponent_score, first_server):
+    """ゲームの最初にサーブした人とスコアから、次のラリーでサーブする人（0: 自分, 1: 相手）を返す。"""
+    turn, _ = serve_turn(my_score + opponent_score)
+    return first_server if turn % 2 == 0 else 1 - first_server
+
+
+@lru_cache(maxsize=None)
+def game_win_probability(my_score, opponent_score, first_server, p_serve, p_receive):
+    """
+    スコアの状態から自分がゲームを取る確率。
+
+    Args:
+        my_score (int): ラリー前の自分の得点
+        opponent_score (int): ラリー前の相手の得点
+        first_server (int): このゲームで最初にサーブした人（0: 自分, 1: 相手）
+        p_serve (float): 自分のサーブのときに自分が得点する確率
+        p_receive (float): 相手のサーブのときに自分が得点する確率
+
+    Returns:
+        float: ゲームを取る確率
+    """
+    my_score, opponent_score = _normalize_score(my_score, opponent_score)
+    if my_score >= POINTS_TO_WIN and my_score - opponent_score >= 2:
+        return 1.0
+    if opponent_score >= POINTS_TO_WIN and opponent_score - my_score >= 2:
+        return 0.0
+
+    rates = (p_serve, p_receive)
+    server = server_at(my_score, opponent_score, first_server)
+    first = rates[server]
+    if my_score == opponent_score == DEUCE_SCORE:
+        # 10-10からは1本交代なので、2本続けて取るか、1本ずつ分けて10-10に戻るかのどちらか
+        second = rates[1 - server]
+        split = first * (1 - second) + (1 - first) * second
+        return first * second / (1 - split) if split < 1 else 0.5
+    return (first * game_win_probability(my_score + 1, opponent_score, first_server, p_serve, p_receive)
+            + (1 - first) * game_win_probability(my_score, opponent_score + 1, first_server, p_serve, p_receive))
+
+
+@lru_cache(maxsize=None)
+def match_win_probability(my_games, opponent_games, my_score, opponent_score, first_server, p_serve, p_receive):
+    """
+    ゲームカウントとスコアの状態から自分が試合を取る確率。ゲームごとに最初にサーブする人は交代する。
+
+    Args:
+        my_games (int): 自分が取ったゲーム数
+        opponent_games (int): 相手が取ったゲーム数
+        my_score, opponent_score, first_server, p_serve, p_receive: game_win_probability と同じ
+
+    Returns:
+        float: 試合を取る確率
+    """
+    if my_games >= GAMES_TO_WIN:
+        return 1.0
+    if opponent_games >= GAMES_TO_WIN:
+        return 0.0
+    game = game_win_probability(my_score, opponent_score, first_server, p_serve, p_receive)
+    next_server = 1 - first_server
+    return (game * match_win_probability(my_games + 1, opponent_games, 0, 0, next_server, p_serve, p_receive)
+            + (1 - game) * match_win_probability(my_games, opponent_games + 1, 0, 0, next_server, p_serve, p_receive))
+
+
+def _game_over(my_score, opponent_score):
+    return max(my_score, opponent_score) >= POINTS_TO_WIN and abs(my_score - opponent_score) >= 2
+
+
+def build_match_tables(p_serve, p_receive):
+    """
+    試合ごとの得点率から、すべての状態の試合を取る確率の表をまとめて作る。
+    game_win_probability / match_win_probability と同じ計算を、後ろのスコアから順に配列で行う。
+    ゲームが終わったスコアには、次のゲームの 0-0 の確率を入れておく。
+
+    Args:
+        p_serve (array-like): 試合ごとの、自分のサーブ時の得点率
+        p_receive (array-like): 試合ごとの、レシーブ時の得点率
+
+    Returns:
+        np.ndarray: [試合, 自分のゲーム数, 相手のゲーム数, 自分の得点, 相手の得点, 最初のサーブ] の確率
+    """
+    rates = np.stack([np.atleast_1d(p_serve), np.atleast_1d(p_receive)]).astype(float)
+    count = rates.shape[1]
+
+    # ゲームを取る確率 [試合, 自分の得点, 相手の得点, 最初のサーブ]
+    game = np.zeros((count, _SCORE_SIZE, _SCORE_SIZE, 2))
+    for first_server in (_ME, _OPPONENT):
+        server = server_at(DEUCE_SCORE, DEUCE_SCORE, first_server)
+        first, second = rates[server], rates[1 - server]
+        split = first * (1 - second) + (1 - first) * second
+        game[:, DEUCE_SCORE, DEUCE_SCORE, first_server] = np.divide(
+            first * second, 1 - split, out=np.full(count, 0.5), where=split < 1)
+    for my_score in range(_SCORE_SIZE - 1, -1, -1):
+        for opponent_score in range(_SCORE_SIZE - 1, -1, -1):
+            normalized = _normalize_score(my_score, opponent_score)
+            if normalized == (DEUCE_SCORE, DEUCE_SCORE):
+                game[:, my_score, opponent_score] = game[:, DEUCE_SCORE, DEUCE_SCORE]
+                continue
+            if _game_over(*normalized):
+                game[:, my_score, opponent_score] = float(my_score > opponent_score)
+                continue
+            if normalized != (my_score, opponent_score) or max(my_score, opponent_score) == _SCORE_SIZE - 1:
+                continue
+            for first_server in (_ME, _OPPONENT):
+                point = rates[server_at(my_score, opponent_score, first_server)]
+                game[:, my_score, opponent_score, first_server] = (
+                    point * game[:, my_score + 1, opponent_score, first_server]
+                    + (1 - point) * game[:, my_score, opponent_score + 1, first_server])
+
+    # 10-11 より先のスコアは、まとめた状態の確率を使う
+    for my_score in range(DEUCE_SCORE, _SCORE_SIZE):
+        for opponent_score in range(DEUCE_SCORE, _SCORE_SIZE):
+            normalized = _normalize_score(my_score, opponent_score)
+            if normalized != (my_score, opponent_score):
+                game[:, my_score, opponent_score] = game[:, normalized[0], normalized[1]]
+
+    # ゲームの始まり（0-0）から試合を取る確率 [試合, 自分のゲーム数, 相手のゲーム数, 最初のサーブ]
+    start = np.zeros((count, GAMES_TO_WIN + 1, GAMES_TO_WIN + 1, 2))
+    start[:, GAMES_TO_WIN, :GAMES_TO_WIN] = 1.0
+    for my_games in range(GAMES_TO_WIN - 1, -1, -1):
+        for opponent_games in range(GAMES_TO_WIN - 1, -1, -1):
+            for first_server in (_ME, _OPPONENT):
+                won = game[:, 0, 0, first_server]
+                start[:, my_games, opponent_games, first_server] = (
+                    won * start[:, my_games + 1, opponent_games, 1 - first_server]
+                    + (1 - won) * start[:, my_games, opponent_games + 1, 1 - first_server])
+
+    # 途中のスコアから試合を取る確率（次のゲームは最初のサーブが交代する）
+    next_start = start[:, :, :, ::-1]
+    win_next = next_start[:, 1:, :GAMES_TO_WIN][:, :, :, None, None, :]
+    lose_next = next_start[:, :GAMES_TO_WIN, 1:][:, :, :, None, None, :]
+    game = game[:, None, None]
+    return game * win_next + (1 - game) * lose_next
+
+
+def estimate_point_rates(df):
+    """
+    自分のサーブ時とレシーブ時の得点率を求める（データがない場合は 0.5）。
+
+    Returns:
+        tuple: (サーブ時の得点率, レシーブ時の得点率)
+    """
+    rates = []
+    for server in ['自分', '相手']:
+        scorers = df.loc[df['誰のサーブか'] == server, '得点者']
+        scorers = scorers[scorers.isin(['自分', '相手'])]
+        rates.append(float((scorers == '自分').mean()) if len(scorers) else 0.5)
+    return tuple(rates)
+
+
+def _games_before(df, state):
+    """各ラリーの前に、自分と相手が取っていたゲーム数。"""
+    match_keys = df['試合ID'] if '試合ID' in df.columns else pd.Series(0, index=df.index)
+    game_keys = pd.DataFrame({'match': match_keys, 'game': state['ゲーム数']})
+    last = pd.DataFrame({'match': match_keys, 'game': state['ゲーム数'],
+                         'my': pd.to_numeric(df['自分の得点'], errors='coerce').fillna(0),
+                         'opponent': pd.to_numeric(df['相手の得点'], errors='coerce').fillna(0)})
+    last = last.groupby(['match', 'game'], sort=True).last()
+    last['my_won'] = (last['my'] > last['opponent']).astype(int)
+    last['opponent_won'] = 1 - last['my_won']
+    # そのゲームより前のゲームの勝敗だけを数える
+    before = last.groupby(level='match')[['my_won', 'opponent_won']].cumsum() - last[['my_won', 'opponent_won']]
+    before = game_keys.join(before, on=['match', 'game'])
+    return (before['my_won'].clip(upper=GAMES_TO_WIN - 1).to_numpy(dtype=int),
+            before['opponent_won'].clip(upper=GAMES_TO_WIN - 1).to_numpy(dtype=int))
+
+
+def compute_rally_leverage(df, score_state=None):
+    """
+    各ラリーの前の、試合を取る確率と重要度（取ったときと落としたときの確率の差）を計算する。
+    '試合ID' 列がある場合は、試合ごとにサーブ時とレシーブ時の得点率を求める。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（1試合分でも、複数の試合をまとめたものでもよい）
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
+
+    Returns:
+        pd.DataFrame: df と同じインデックスで 'ゲーム数', '自分のゲーム数', '相手のゲーム数', '自分の得点_前',
+            '相手の得点_前', 'サーブ', '試合を取る確率', '取った場合', '落とした場合', '重要度' を持つ表
+    """
+    df = df[df['誰のサーブか'].isin(['自分', '相手'])]
+    state = get_score_state(df, score_state)
+    my_games, opponent_games = _games_before(df, state)
+    my_before = state['自分の得点_前'].clip(lower=0).to_numpy()
+    opponent_before = state['相手の得点_前'].clip(lower=0).to_numpy()
+
+    # 10-10以降は1本ずつ引いて、確率の表の範囲にまとめる
+    excess = np.maximum(np.minimum(my_before, opponent_before) - DEUCE_SCORE, 0)
+    my_score = np.minimum(my_before - excess, _SCORE_SIZE - 2)
+    opponent_score = np.minimum(opponent_before - excess, _SCORE_SIZE - 2)
+    server = (df['誰のサーブか'] == '相手').to_numpy(dtype=int)
+    turn, _ = serve_turn(my_score + opponent_score)
+    first_server = np.where(turn % 2 == 0, server, 1 - server)
+
+    # 試合ごとの得点率で表を作り、全ラリーの状態をまとめて表から引く
+    match_codes, _ = pd.factorize(df['試合ID'] if '試合ID' in df.columns else pd.Series(0, index=df.index))
+    scorers = df['得点者'].where(df['得点者'].isin(['自分', '相手']))
+    rates = pd.DataFrame({'match': match_codes, 'server': server, 'won': scorers == '自分',
+                          'decided': scorers.notna()})
+    rates = rates.groupby(['match', 'server'])[['won', 'decided']].sum()
+    rates = (rates['won'] / rates['decided']).unstack('server').reindex(columns=[_ME, _OPPONENT])
+    rates = rates.reindex(range(match_codes.max() + 1)).fillna(0.5)
+    table = build_match_tables(rates[_ME].to_numpy(), rates[_OPPONENT].to_numpy())
+    index = (match_codes, my_games, opponent_games, my_score, opponent_score, first_server)
+    now = table[index]
+    won = table[match_codes, my_games, opponent_games, my_score + 1, opponent_score, first_server]
+    lost = table[match_codes, my_games, opponent_games, my_score, opponent_score + 1, first_server]
+
+    return pd.DataFrame({
+        'ゲーム数': state['ゲーム数'],
+        '自分のゲーム数': my_games,
+        '相手のゲーム数': opponent_games,
+        '自分の得点_前': my_before,
+        '相手の得点_前': opponent_before,
+        'サーブ': df['誰のサーブか'],
+        '試合を取る確率': now,
+        '取った場合': won,
+        '落とした場合': lost,
+        '重要度': won - lost,
+    }, index=df.index)
+
+
+def _required_columns_present(df):
+    return not df.empty and {'ゲーム数', '自分の得点', '相手の得点', '得点者', '誰のサーブか'}.issubset(df.columns)
+
+
+def display_match_win_probability(df, score_state=None):
+    """
+    試合を取る確率の推移と、重要度の高かったラリーを表示する。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
+    """
+    st.subheader("試合を取る確率の推移と重要なポイント")
+    if not _required_columns_present(df):
+        st.warning("試合を取る確率の計算に必要なデータ列が見つかりません。")
+        return
+
+    p_serve, p_receive = estimate_point_rates(df)
+    st.caption(f"この試合の自分のサーブ時の得点率 {p_serve * 100:.1f}%・レシーブ時の得点率 {p_receive * 100:.1f}% から、"
+               "11点先取・10-10からは2点差・サーブ2本交代（10-10からは1本交代）・3ゲーム先取で計算")
+    leverage = compute_rally_leverage(df, score_state)
+    if leverage.empty:
+        st.info("ラリーのデータがありません。")
+        return
+
+    leverage['ラリー'] = np.arange(1, len(leverage) + 1)
+    leverage['スコア'] = [f"G{game} {my}-{opponent}（ゲーム {my_games}-{opponent_games}）"
+                          for game, my, opponent, my_games, opponent_games in leverage[
+                              ['ゲーム数', '自分の得点_前', '相手の得点_前', '自分のゲーム数', '相手のゲーム数']
+                          ].itertuples(index=False, name=None)]
+    fig = px.line(leverage.assign(確率=leverage['試合を取る確率'] * 100), x='ラリー', y='確率', color='ゲーム数',
+                  hover_data=['スコア', 'サーブ'], labels={'確率': '試合を取る確率 (%)'})
+    fig.update_layout(yaxis_range=[0, 100])
+    st.plotly_chart(fig, use_container_width=True, key="match_win_probability_chart")
+
+    top = leverage.nlargest(10, '重要度')
+    top = top.assign(得点者=df.loc[top.index, '得点者'])
+    st.markdown("###### 重要度の高かったラリー（取ったときと落としたときの、試合を取る確率の差）")
+    st.dataframe(top[['スコア', 'サーブ', '得点者', '試合を取る確率', '重要度']].style.format(
+        {'試合を取る確率': lambda p: f"{p * 100:.1f}%", '重要度': lambda p: f"{p * 100:.1f}pt"}), hide_index=True)
+
+
+def get_match_win_probability_for_ai(df, score_state=None, limit=5):
+    """
+    重要度の高かったラリーと、そのラリーの結果を、AIに渡すためのMarkdown文字列にする。
+    """
+    if not _required_columns_present(df):
+        return "試合を取る確率の計算に必要なデータがありません。"
+    p_serve, p_receive = estimate_point_rates(df)
+    leverage = compute_rally_leverage(df, score_state)
+    if leverage.empty:
+        return "試合を取る確率の計算に必要なデータがありません。"
+
+    top = leverage.nlargest(limit, '重要度')
+    table = pd.DataFrame({
+        'ゲーム数': top['ゲーム数'],
+        'ゲームカウント': top['自分のゲーム数'].astype(str) + '-' + top['相手のゲーム数'].astype(str),
+        'スコア': top['自分の得点_前'].astype(str) + '-' + top['相手の得点_前'].astype(str),
+        'サーブ': top['サーブ'],
+        '得点者': df.loc[top.index, '得点者'],
+        '試合を取る確率': (top['試合を取る確率'] * 100).map("{:.1f}%".format),
+        '重要度': (top['重要度'] * 100).map("{:.1f}pt".format),
+    })
+    return ("## 試合の重要なポイント\n\n"
+            f"自分のサーブ時の得点率 {p_serve * 100:.1f}%、レシーブ時の得点率 {p_receive * 100:.1f}% から計算した、"
+            "取ったときと落としたときで試合を取る確率が最も変わるラリー（スコアはラリー前）\n\n"
+            f"{table.to_markdown(index=False)}")
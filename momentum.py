@@ -0,0 +1,264 @@
+"""
+ゲームの流れ（連続得点・連続失点）の分析。
+ゲームごとの得点者の並びをランレングス（同じ人が続けて取った点数）にして、
+連続の長さの分布、k点連続で失点（得点）したあとのラリーの得点率、ビハインドからの逆転・リードからの逆転負けを求める。
+
+試合ごとの集計は足し合わせられる回数（MOMENTUM_COLUMNS）だけにして match_store への取り込み時に保存しておき、
+全試合の分析では保存した回数を足すだけにする（opponent_partials と同じ考え方）。
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from game_rules import get_score_state
+from serve_turns import game_keys
+from utils import STORE_REFRESH_SECONDS
+
+MOMENTUM_COLUMNS = ['metric', 'player', 'length', 'total', 'won']
+# 連続の長さ・点差はこの値以上をまとめる
+MAX_STREAK = 5
+MAX_DEFICIT = 5
+_PLAYERS = ['自分', '相手']
+
+
+def _valid_rallies(df):
+    """得点者が '自分' か '相手' のラリーだけにする（空欄のラリーで連続を区切らない）。"""
+    return df[df['得点者'].isin(_PLAYERS)].reset_index(drop=True)
+
+
+def compute_runs(df):
+    """
+    ゲームごとの得点者の並びをランレングスにする。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（'試合ID' 列があれば試合ごとにゲームを区別する）
+
+    Returns:
+        pd.DataFrame: 連続ごとに 'ゲームキー', '得点者', '連続数', '開始行'（df の得点者のあるラリーの何番目から）の表
+    """
+    df = _valid_rallies(df)
+    if df.empty:
+        return pd.DataFrame(columns=['ゲームキー', '得点者', '連続数', '開始行'])
+    games = game_keys(df)
+    winners = df['得点者'].to_numpy()
+    is_start = np.r_[True, (games[1:] != games[:-1]) | (winners[1:] != winners[:-1])]
+    starts = np.flatnonzero(is_start)
+    return pd.DataFrame({
+        'ゲームキー': games[starts],
+        '得点者': winners[starts],
+        '連続数': np.diff(np.r_[starts, len(df)]),
+        '開始行': starts,
+    })
+
+
+def compute_momentum_partials(df, score_state=None):
+    """
+    連続得点・連続失点と逆転の回数を、足し合わせられる形で計算する。
+
+    metric:
+        streak: player が length 点連続で取った回数（total）
+        after_streak: player が直前に length 点連続で取っていたラリーの数（total）と、そのうち自分が取った数（won）
+        max_deficit / max_lead: ゲーム中の最大のビハインド / リードが length 点だったゲームの数（total）と、
+                                そのうち自分が取ったゲームの数（won）
+    length は MAX_STREAK（点差は MAX_DEFICIT）以上をまとめる。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
+
+    Returns:
+        pd.DataFrame: MOMENTUM_COLUMNS の列を持つ表
+    """
+    state = get_score_state(df, score_state)[df['得点者'].isin(_PLAYERS)].reset_index(drop=True)
+    df = _valid_rallies(df)
+    if df.empty:
+        return pd.DataFrame(columns=MOMENTUM_COLUMNS)
+    runs = compute_runs(df)
+    games = game_keys(df)
+    winners = df['得点者'].to_numpy()
+    won = winners == '自分'
+    frames = []
+
+    lengths = np.minimum(runs['連続数'].to_numpy(), MAX_STREAK)
+    frames.append(pd.DataFrame({'metric': 'streak', 'player': runs['得点者'], 'length': lengths, 'total': 1, 'won': 0}))
+
+    # 各ラリーの直前までの連続（同じゲームの前のラリーの得点者と、その人の何点目の連続か）
+    run_ids = np.cumsum(np.isin(np.arange(len(df)), runs['開始行'].to_numpy())) - 1
+    position = np.arange(len(df)) - runs['開始行'].to_numpy()[run_ids] + 1
+    has_previous = np.r_[False, games[1:] == games[:-1]]
+    frames.append(pd.DataFrame({
+        'metric': 'after_streak',
+        'player': np.r_[[''], winners[:-1]][has_previous],
+        'length': np.minimum(np.r_[0, position[:-1]], MAX_STREAK)[has_previous],
+        'total': 1,
+        'won': won[has_previous].astype(int),
+    }))
+
+    margin = (state['自分の得点_前'] - state['相手の得点_前']).to_numpy()
+    by_game = pd.DataFrame({'ビハインド': -margin, 'リード': margin, 'game': games}).groupby('game')
+    final = df.groupby(games).tail(1)
+    game_won = pd.Series((pd.to_numeric(final['自分の得点'], errors='coerce')
+                          > pd.to_numeric(final['相手の得点'], errors='coerce')).to_numpy(), index=games[final.index])
+    for metric, column in [('max_deficit', 'ビハインド'), ('max_lead', 'リード')]:
+        largest = by_game[column].max().clip(lower=0)
+        frames.append(pd.DataFrame({'metric': metric, 'player': '自分', 'length': np.minimum(largest, MAX_DEFICIT),
+                                    'total': 1, 'won': game_won.reindex(largest.index).astype(int)}))
+
+    partials = pd.concat(frames, ignore_index=True)
+    return partials.groupby(['metric', 'player', 'length'], as_index=False)[['total', 'won']].sum()[MOMENTUM_COLUMNS]
+
+
+def merge_momentum_partials(partials):
+    """複数の試合の compute_momentum_partials の結果（つなげた表）を足し合わせる。"""
+    if partials.empty:
+        return pd.DataFrame(columns=MOMENTUM_COLUMNS)
+    return partials.groupby(['metric', 'player', 'length'], as_index=False)[['total', 'won']].sum()[MOMENTUM_COLUMNS]
+
+
+def load_momentum_partials(conn, match_ids=None):
+    """保存されている試合の集計を足し合わせて返す（match_ids を指定した場合はその試合だけ）。"""
+    where, params = '', ()
+    if match_ids is not None:
+        match_ids = list(match_ids)
+        where, params = f' WHERE match_id IN ({", ".join("?" * len(match_ids))})', tuple(match_ids)
+    return pd.read_sql_query(
+        f'SELECT metric, player, length, SUM(total) AS total, SUM(won) AS won FROM momentum_partials{where} '
+        'GROUP BY metric, player, length', conn, params=params)[MOMENTUM_COLUMNS]
+
+
+def _length_label(length, maximum, unit):
+    return f"{length}{unit}以上" if length >= maximum else f"{length}{unit}"
+
+
+def summarize_streaks(partials):
+    """
+    連続の長さごとの回数（自分・相手）を返す。
+
+    Returns:
+        pd.DataFrame: '連続数', '自分', '相手' の表
+    """
+    streaks = partials[partials['metric'] == 'streak']
+    table = streaks.pivot_table(index='length', columns='player', values='total', aggfunc='sum', fill_value=0)
+    table = table.reindex(columns=_PLAYERS, fill_value=0).reindex(range(1, MAX_STREAK + 1), fill_value=0)
+    table.index = [_length_label(length, MAX_STREAK, '点') for length in table.index]
+    return table.rename_axis(index='連続数', columns=None).reset_index()
+
+
+def summarize_after_streaks(partials, player):
+    """
+    player が k 点連続で取った直後のラリーの、自分の得点率を返す。
+
+    Returns:
+        pd.DataFrame: '直前の連続', 'ラリー数', '得点数', '得点率' の表（得点率は %）
+    """
+    rows = partials[(partials['metric'] == 'after_streak') & (partials['player'] == player)]
+    rows = rows.set_index('length')[['total', 'won']].reindex(range(1, MAX_STREAK + 1), fill_value=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = rows['won'] / rows['total'].replace(0, np.nan) * 100
+    return pd.DataFrame({
+        '直前の連続': [f"{player}の{_length_label(length, MAX_STREAK, '連続')}" for length in rows.index],
+        'ラリー数': rows['total'].to_numpy(),
+        '得点数': rows['won'].to_numpy(),
+        '得点率': rate.to_numpy(),
+    })
+
+
+def summarize_comebacks(partials):
+    """
+    ゲーム中に k 点以上ビハインドだった（リードした）ゲームの数と、そこから取った（落とした）ゲームの数を返す。
+
+    Returns:
+        pd.DataFrame: '点差', 'ビハインドのゲーム数', '逆転勝ち', '逆転勝ちの割合', 'リードのゲーム数', '逆転負け', '逆転負けの割合'
+    """
+    rows = []
+    for threshold in range(1, MAX_DEFICIT + 1):
+        behind = partials[(partials['metric'] == 'max_deficit') & (partials['length'] >= threshold)]
+        ahead = partials[(partials['metric'] == 'max_lead') & (partials['length'] >= threshold)]
+        behind_games, comebacks = behind['total'].sum(), behind['won'].sum()
+        ahead_games, blown = ahead['total'].sum(), ahead['total'].sum() - ahead['won'].sum()
+        rows.append((f"{threshold}点以上", behind_games, comebacks,
+                     comebacks / behind_games * 100 if behind_games else np.nan,
+                     ahead_games, blown, blown / ahead_games * 100 if ahead_games else np.nan))
+    return pd.DataFrame(rows, columns=['点差', 'ビハインドのゲーム数', '逆転勝ち', '逆転勝ちの割合',
+                                       'リードのゲーム数', '逆転負け', '逆転負けの割合'])
+
+
+def _format_rates(table, columns):
+    table = table.copy()
+    for column in columns:
+        table[column] = table[column].map(lambda value: f"{value:.1f}%" if pd.notna(value) else '-')
+    return table
+
+
+@st.cache_data(ttl=STORE_REFRESH_SECONDS, show_spinner=False)
+def load_archive_momentum_partials():
+    """フォルダの試合を取り込んでから、保存されている全試合の集計を足し合わせる。"""
+    # match_store は取り込みのためにこのモジュールを読み込むため、ここで読み込む
+    from match_store import connect, refresh_store
+
+    refresh_store()
+    conn = connect()
+    try:
+        return load_momentum_partials(conn)
+    finally:
+        conn.close()
+
+
+def display_momentum(df, score_state=None):
+    """
+    連続得点・連続失点とゲームの逆転の分析を表示する。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
+    """
+    st.subheader("連続得点・連続失点とゲームの流れ")
+    scope = st.radio("対象", ['この試合', '全試合'], horizontal=True, key="momentum_scope")
+    partials = compute_momentum_partials(df, score_state) if scope == 'この試合' else load_archive_momentum_partials()
+    if partials.empty:
+        st.info("得点者が入力されたラリーがありません。")
+        return
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("##### 連続の長さの回数")
+        st.dataframe(summarize_streaks(partials), hide_index=True)
+    with col2:
+        st.markdown("##### 連続失点のあとの得点率")
+        st.dataframe(_format_rates(summarize_after_streaks(partials, '相手'), ['得点率']), hide_index=True)
+        st.markdown("##### 連続得点のあとの得点率")
+        st.dataframe(_format_rates(summarize_after_streaks(partials, '自分'), ['得点率']), hide_index=True)
+
+    st.markdown("##### ビハインドからの逆転とリードからの逆転負け")
+    st.dataframe(_format_rates(summarize_comebacks(partials), ['逆転勝ちの割合', '逆転負けの割合']), hide_index=True)
+
+    if scope == 'この試合':
+        runs = compute_runs(df)
+        longest = runs[runs['連続数'] >= 3].sort_values('連続数', ascending=False, kind='stable')
+        if not longest.empty:
+            with st.expander("3点以上の連続"):
+                rallies = _valid_rallies(df)
+                columns = [col for col in ['ゲーム数', '自分の得点', '相手の得点', '開始時刻', 'YouTubeリンク'] if col in rallies.columns]
+                table = rallies.loc[longest['開始行'], columns].reset_index(drop=True)
+                table.insert(0, '連続数', longest['連続数'].to_numpy())
+                table.insert(0, '得点者', longest['得点者'].to_numpy())
+                st.dataframe(table, hide_index=True,
+                             column_config={'YouTubeリンク': st.column_config.LinkColumn('YouTubeリンク')})
+
+
+def get_momentum_for_ai(df, score_state=None):
+    """連続得点・連続失点と逆転の集計を、AIに渡すためのMarkdown文字列にする。"""
+    if not {'ゲーム数', '自分の得点', '相手の得点', '得点者'}.issubset(df.columns):
+        return "ゲームの流れの分析に必要なデータがありません。"
+    partials = compute_momentum_partials(df, score_state)
+    if partials.empty:
+        return "ゲームの流れの分析に必要なデータがありません。"
+    after_losses = _format_rates(summarize_after_streaks(partials, '相手'), ['得点率'])
+    comebacks = _format_rates(summarize_comebacks(partials), ['逆転勝ちの割合', '逆転負けの割合'])
+    return ("## 連続得点・連続失点とゲームの流れ\n\n"
+            "### 連続の長さの回数\n\n"
+            f"{summarize_streaks(partials).to_markdown(index=False)}\n\n"
+            "### 連続失点のあとのラリーの得点率（連続失点を止められているか）\n\n"
+            f"{after_losses[after_losses['ラリー数'] > 0].to_markdown(index=False)}\n\n"
+            "### ビハインドからの逆転とリードからの逆転負け（ゲーム中の最大の点差）\n\n"
+            f"{comebacks.to_markdown(index=False)}")
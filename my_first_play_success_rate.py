@@ -1,6 +1,44 @@
 import streamlit as st
 import pandas as pd
 
+from rate_intervals import INTERVAL_LABEL, format_interval, wilson_interval
+
+
+def analyze_my_first_play_success(row):
+    """
+    ラリーの中で自分が最初に仕掛けたドライブ・チキータの種類と成否を返す（相手が先に仕掛けた場合は 'その他'）。
+
+    Args:
+        row (pd.Series): 1ラリーの行
+
+    Returns:
+        str: 'フォアドライブ_成功' のような「種類_成功/失敗」、または 'その他'
+    """
+    who_serves = row['誰のサーブか']
+
+    play_sequence = [
+        ('レシーブの種類', 'レシーブの質', '相手' if who_serves == '自分' else '自分'),
+        ('３球目の種類', '３球目の質', '自分' if who_serves == '自分' else '相手'),
+        ('４球目の種類', '４球目の質', '相手' if who_serves == '自分' else '自分'),
+        ('５球目の種類', '５球目の質', '自分' if who_serves == '自分' else '相手'),
+        ('６球目の種類', '６球目の質', '相手' if who_serves == '自分' else '自分')
+    ]
+
+    for play_col, quality_col, player in play_sequence:
+        if pd.notna(row[play_col]) and ('ドライブ' in str(row[play_col]) or 'チキータ' in str(row[play_col])):
+            if player == '自分':
+                is_successful = pd.notna(row[quality_col]) and 'ミス' not in str(row[quality_col])
+                if 'フォアドライブ' in str(row[play_col]):
+                    return 'フォアドライブ_成功' if is_successful else 'フォアドライブ_失敗'
+                elif 'バックドライブ' in str(row[play_col]):
+                    return 'バックドライブ_成功' if is_successful else 'バックドライブ_失敗'
+                elif 'バックチキータ' in str(row[play_col]):
+                    return 'バックチキータ_成功' if is_successful else 'バックチキータ_失敗'
+            else:
+                return 'その他'
+
+    return 'その他'
+
 def display_my_first_play_success_rate(df):
     """
     自分が最初に仕掛けたプレーの成功率をStreamlitのUIに表示する関数
@@ -23,33 +61,6 @@ def display_my_first_play_success_rate(df):
     
     if not df.empty and all(col in df.columns for col in required_cols):
         
-        def analyze_my_first_play_success(row):
-            who_serves = row['誰のサーブか']
-            
-            play_sequence = [
-                ('レシーブの種類', 'レシーブの質', '相手' if who_serves == '自分' else '自分'),
-                ('３球目の種類', '３球目の質', '自分' if who_serves == '自分' else '相手'),
-                ('４球目の種類', '４球目の質', '相手' if who_serves == '自分' else '自分'),
-                ('５球目の種類', '５球目の質', '自分' if who_serves == '自分' else '相手'),
-                ('６球目の種類', '６球目の質', '相手' if who_serves == '自分' else '自分')
-            ]
-            
-            for play_col, quality_col, player in play_sequence:
-                if pd.notna(row[play_col]) and ('ドライブ' in str(row[play_col]) or 'チキータ' in str(row[play_col])):
-                    if player == '自分':
-                        is_successful = pd.notna(row[quality_col]) and 'ミス' not in str(row[quality_col])
-                        
-                        if 'フォアドライブ' in str(row[play_col]):
-                            return 'フォアドライブ_成功' if is_successful else 'フォアドライブ_失敗'
-                        elif 'バックドライブ' in str(row[play_col]):
-                            return 'バックドライブ_成功' if is_successful else 'バックドライブ_失敗'
-                        elif 'バックチキータ' in str(row[play_col]):
-                            return 'バックチキータ_成功' if is_successful else 'バックチキータ_失敗'
-                    else:
-                        return 'その他'
-            
-            return 'その他'
-
         df_result = df.copy()
         df_result['自分が最初に仕掛けた結果'] = df_result.apply(analyze_my_first_play_success, axis=1)
 
@@ -70,7 +81,8 @@ def display_my_first_play_success_rate(df):
         with col1:
             st.markdown("##### フォアドライブ")
             if fore_total > 0:
-                st.metric(label="成功率", value=f"{fore_rate:.1f}%", delta=f"（成功: {fore_success}回, 失敗: {fore_failure}回）")
+                st.metric(label="成功率", value=f"{fore_rate:.1f}%", delta=f"（成功: {fore_success}回, 失敗: {fore_failure}回）",
+                          help=f"{INTERVAL_LABEL}: {format_interval(*wilson_interval(fore_success, fore_total))}")
                 if fore_failure > 0 and st.button("失敗の詳細", key="fore_drive_failure"):
                     st.session_state.display_details = 'fore_drive'
             else:
@@ -84,7 +96,8 @@ def display_my_first_play_success_rate(df):
         with col2:
             st.markdown("##### バックドライブ")
             if back_total > 0:
-                st.metric(label="成功率", value=f"{back_rate:.1f}%", delta=f"（成功: {back_success}回, 失敗: {back_failure}回）")
+                st.metric(label="成功率", value=f"{back_rate:.1f}%", delta=f"（成功: {back_success}回, 失敗: {back_failure}回）",
+                          help=f"{INTERVAL_LABEL}: {format_interval(*wilson_interval(back_success, back_total))}")
                 if back_failure > 0 and st.button("失敗の詳細", key="back_drive_failure"):
                     st.session_state.display_details = 'back_drive'
             else:
@@ -98,7 +111,8 @@ def display_my_first_play_success_rate(df):
         with col3:
             st.markdown("##### バックチキータ")
             if chiquita_total > 0:
-                st.metric(label="成功率", value=f"{chiquita_rate:.1f}%", delta=f"（成功: {chiquita_success}回, 失敗: {chiquita_failure}回）")
+                st.metric(label="成功率", value=f"{chiquita_rate:.1f}%", delta=f"（成功: {chiquita_success}回, 失敗: {chiquita_failure}回）",
+                          help=f"{INTERVAL_LABEL}: {format_interval(*wilson_interval(chiquita_success, chiquita_total))}")
                 if chiquita_failure > 0 and st.button("失敗の詳細", key="back_chiquita_failure"):
                     st.session_state.display_details = 'back_chiquita'
             else:
@@ -175,32 +189,6 @@ def get_my_first_play_success_rate_for_ai(df):
     if df.empty or not all(col in df.columns for col in required_cols):
         return "自分が最初に仕掛けたプレーの成功率分析データが利用できません。"
 
-    def analyze_my_first_play_success(row):
-        who_serves = row['誰のサーブか']
-        
-        play_sequence = [
-            ('レシーブの種類', 'レシーブの質', '相手' if who_serves == '自分' else '自分'),
-            ('３球目の種類', '３球目の質', '自分' if who_serves == '自分' else '相手'),
-            ('４球目の種類', '４球目の質', '相手' if who_serves == '自分' else '自分'),
-            ('５球目の種類', '５球目の質', '自分' if who_serves == '自分' else '相手'),
-            ('６球目の種類', '６球目の質', '相手' if who_serves == '自分' else '自分')
-        ]
-        
-        for play_col, quality_col, player in play_sequence:
-            if pd.notna(row[play_col]) and ('ドライブ' in str(row[play_col]) or 'チキータ' in str(row[play_col])):
-                if player == '自分':
-                    is_successful = pd.notna(row[quality_col]) and 'ミス' not in str(row[quality_col])
-                    if 'フォアドライブ' in str(row[play_col]):
-                        return 'フォアドライブ_成功' if is_successful else 'フォアドライブ_失敗'
-                    elif 'バックドライブ' in str(row[play_col]):
-                        return 'バックドライブ_成功' if is_successful else 'バックドライブ_失敗'
-                    elif 'バックチキータ' in str(row[play_col]):
-                        return 'バックチキータ_成功' if is_successful else 'バックチキータ_失敗'
-                else:
-                    return 'その他'
-        
-        return 'その他'
-
     df_result = df.copy()
     df_result['自分が最初に仕掛けた結果'] = df_result.apply(analyze_my_first_play_success, axis=1)
 
@@ -215,7 +203,8 @@ def get_my_first_play_success_rate_for_ai(df):
     fore_rate = (fore_success / fore_total) if fore_total > 0 else 0
     if fore_total > 0:
         summary_text += f"### フォアドライブ\n"
-        summary_text += f"・成功率: {fore_rate:.1%} (成功: {fore_success}回, 失敗: {fore_failure}回)\n"
+        summary_text += (f"・成功率: {fore_rate:.1%} (成功: {fore_success}回, 失敗: {fore_failure}回, "
+                         f"{INTERVAL_LABEL} {format_interval(*wilson_interval(fore_success, fore_total))})\n")
         if fore_failure > 0:
             summary_text += f"以下の詳細データは失敗したラリーです。\n"
             filtered_df = df_result[df_result['自分が最初に仕掛けた結果'] == 'フォアドライブ_失敗']
@@ -230,7 +219,8 @@ def get_my_first_play_success_rate_for_ai(df):
     back_rate = (back_success / back_total) if back_total > 0 else 0
     if back_total > 0:
         summary_text += f"### バックドライブ\n"
-        summary_text += f"・成功率: {back_rate:.1%} (成功: {back_success}回, 失敗: {back_failure}回)\n"
+        summary_text += (f"・成功率: {back_rate:.1%} (成功: {back_success}回, 失敗: {back_failure}回, "
+                         f"{INTERVAL_LABEL} {format_interval(*wilson_interval(back_success, back_total))})\n")
         if back_failure > 0:
             summary_text += f"以下の詳細データは失敗したラリーです。\n"
             filtered_df = df_result[df_result['自分が最初に仕掛けた結果'] == 'バックドライブ_失敗']
@@ -245,7 +235,8 @@ def get_my_first_play_success_rate_for_ai(df):
     chiquita_rate = (chiquita_success / chiquita_total) if chiquita_total > 0 else 0
     if chiquita_total > 0:
         summary_text += f"### バックチキータ\n"
-        summary_text += f"・成功率: {chiquita_rate:.1%} (成功: {chiquita_success}回, 失敗: {chiquita_failure}回)\n"
+        summary_text += (f"・成功率: {chiquita_rate:.1%} (成功: {chiquita_success}回, 失敗: {chiquita_failure}回, "
+                         f"{INTERVAL_LABEL} {format_interval(*wilson_interval(chiquita_success, chiquita_total))})\n")
         if chiquita_failure > 0:
             summary_text += f"以下の詳細データは失敗したラリーです。\n"
             filtered_df = df_result[df_result['自分が最初に仕掛けた結果'] == 'バックチキータ_失敗']
@@ -1,5 +1,6 @@
 import streamlit as st
 import pandas as pd
+from rate_intervals import INTERVAL_LABEL, format_interval, wilson_interval
 
 def display_overall_receive_analysis(df):
     """
@@ -78,6 +79,7 @@ def display_overall_receive_analysis(df):
                         'ラリー継続数': int(rally),
                         '総回数': int(total),
                         '得点率': win_rate_str,
+                        INTERVAL_LABEL: format_interval(*wilson_interval(points, total)),
                         '得点・ラリー率': win_and_rally_rate_str
                     })
         
@@ -138,14 +140,16 @@ def display_overall_receive_analysis(df):
         st.markdown("---")
         if back_receive_total > 0:
             st.markdown(f"**バックハンドレシーブ:**")
-            st.markdown(f"- **得点率:** {back_receive_rate:.1f}% ({back_receive_points}/{back_receive_total})")
+            st.markdown(f"- **得点率:** {back_receive_rate:.1f}% ({back_receive_points}/{back_receive_total}、"
+                        f"{INTERVAL_LABEL} {format_interval(*wilson_interval(back_receive_points, back_receive_total))})")
             st.markdown(f"- **得点・ラリー率:** {back_win_and_rally_rate:.1f}% ({back_receive_points + back_rally_continued}/{back_receive_total})")
         else:
             st.info("バックハンドレシーブのデータが見つかりませんでした。")
             
         if fore_receive_total > 0:
             st.markdown(f"**フォアハンドレシーブ:**")
-            st.markdown(f"- **得点率:** {fore_receive_rate:.1f}% ({fore_receive_points}/{fore_receive_total})")
+            st.markdown(f"- **得点率:** {fore_receive_rate:.1f}% ({fore_receive_points}/{fore_receive_total}、"
+                        f"{INTERVAL_LABEL} {format_interval(*wilson_interval(fore_receive_points, fore_receive_total))})")
             st.markdown(f"- **得点・ラリー率:** {fore_win_and_rally_rate:.1f}% ({fore_receive_points + fore_rally_continued}/{fore_receive_total})")
         else:
             st.info("フォアハンドレシーブのデータが見つかりませんでした。")
@@ -228,6 +232,7 @@ def get_overall_receive_analysis_for_ai(df):
                     'ラリー継続数': int(rally),
                     '総回数': int(total),
                     '得点率': f"{win_rate:.1f}%" if pd.notna(win_rate) else "-",
+                    INTERVAL_LABEL: format_interval(*wilson_interval(points, total)),
                     '得点・ラリー率': f"{win_and_rally_rate:.1f}%" if pd.notna(win_and_rally_rate) else "-"
                 })
     
@@ -253,6 +258,7 @@ def get_overall_receive_analysis_for_ai(df):
     analysis_text = "## 相手サーブコース別のレシーブ分析\n"
     analysis_text += "### 全体サマリー\n"
     analysis_text += "※得点・ラリー率: (得点数 + ラリー継続数) / 総回数。ラリー継続は５球目以降のラリーで失点した場合。\n"
+    analysis_text += f"※{INTERVAL_LABEL}: 得点率の区間。回数が少ないほど広くなり、区間が重なる差は偶然の可能性が高い。\n"
     total_summary_df = display_df[display_df['コース'] == '総合計'].set_index('レシーブの種類').drop(columns='コース')
     analysis_text += total_summary_df.to_markdown() + "\n\n"
 
@@ -271,7 +277,8 @@ def get_overall_receive_analysis_for_ai(df):
     
     if back_receive_total > 0:
         analysis_text += f"### バックハンドレシーブ\n"
-        analysis_text += f"- 得点率: {back_receive_rate:.1%} ({back_receive_points}/{back_receive_total})\n"
+        analysis_text += (f"- 得点率: {back_receive_rate:.1%} ({back_receive_points}/{back_receive_total}、"
+                          f"{INTERVAL_LABEL} {format_interval(*wilson_interval(back_receive_points, back_receive_total))})\n")
         analysis_text += f"- 得点・ラリー率: {back_win_and_rally_rate:.1%} ({back_receive_points + back_rally_continued}/{back_receive_total})\n\n"
 
     df_fore_receive = df_my_receive[df_my_receive['レシーブの種類'].str.contains('フォア', na=False)]
@@ -283,7 +290,8 @@ def get_overall_receive_analysis_for_ai(df):
     
     if fore_receive_total > 0:
         analysis_text += f"### フォアハンドレシーブ\n"
-        analysis_text += f"- 得点率: {fore_receive_rate:.1%} ({fore_receive_points}/{fore_receive_total})\n"
+        analysis_text += (f"- 得点率: {fore_receive_rate:.1%} ({fore_receive_points}/{fore_receive_total}、"
+                          f"{INTERVAL_LABEL} {format_interval(*wilson_interval(fore_receive_points, fore_receive_total))})\n")
         analysis_text += f"- 得点・ラリー率: {fore_win_and_rally_rate:.1%} ({fore_receive_points + fore_rally_continued}/{fore_receive_total})\n"
 
     return analysis_text
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+from lazy_import import lazy_module
+
+px = lazy_module('plotly.express')
 
 def display_overall_score_miss_analysis(df):
     """
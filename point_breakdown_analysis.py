@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 
+from rate_intervals import INTERVAL_LABEL, format_interval, wilson_interval
+
 def display_point_breakdown_analysis(df):
     """
     得失点合計と内訳をStreamlitのUIに表示する関数
@@ -219,6 +221,9 @@ def get_point_breakdown_analysis_for_ai(df):
     def safe_rate(count, total):
         return round(count / total * 100, 1) if total > 0 else 0.0
 
+    def rate_text(count, total):
+        return f"{safe_rate(count, total)}%（{format_interval(*wilson_interval(count, total))}）"
+
     for game_num in unique_game_numbers:
         df_game = df[df['ゲーム数'] == game_num]
 
@@ -238,16 +243,16 @@ def get_point_breakdown_analysis_for_ai(df):
         final_summary_rows.append({
             'ゲーム数': str(game_num), '種類': '得点', '合計': total_score,
             '自分のプレーで得点': player_play_score, '相手のミスで得点': opponent_mistake_score, '得点（判断迷う）': confusing_score,
-            '自分のプレーで得点率 (%)': f"{safe_rate(player_play_score, total_score)}%",
-            '相手のミスで得点率 (%)': f"{safe_rate(opponent_mistake_score, total_score)}%",
-            '得点（判断迷う）率 (%)': f"{safe_rate(confusing_score, total_score)}%"
+            '自分のプレーで得点率 (%)': rate_text(player_play_score, total_score),
+            '相手のミスで得点率 (%)': rate_text(opponent_mistake_score, total_score),
+            '得点（判断迷う）率 (%)': rate_text(confusing_score, total_score)
         })
         final_summary_rows.append({
             'ゲーム数': str(game_num), '種類': '失点', '合計': total_loss,
             '相手のプレーで失点': player_play_loss, '自分のミスで失点': opponent_mistake_loss, '失点（判断迷う）': confusing_loss,
-            '相手のプレーで失点率 (%)': f"{safe_rate(player_play_loss, total_loss)}%",
-            '自分のミスで失点率 (%)': f"{safe_rate(opponent_mistake_loss, total_loss)}%",
-            '失点（判断迷う）率 (%)': f"{safe_rate(confusing_loss, total_loss)}%"
+            '相手のプレーで失点率 (%)': rate_text(player_play_loss, total_loss),
+            '自分のミスで失点率 (%)': rate_text(opponent_mistake_loss, total_loss),
+            '失点（判断迷う）率 (%)': rate_text(confusing_loss, total_loss)
         })
         
         total_score_overall += total_score
@@ -264,23 +269,23 @@ def get_point_breakdown_analysis_for_ai(df):
     total_score_row = {
         'ゲーム数': 'Total', '種類': '得点', '合計': total_score_overall,
         '自分のプレーで得点': total_player_play_score, '相手のミスで得点': total_opponent_mistake_score, '得点（判断迷う）': total_confusing_score,
-        '自分のプレーで得点率 (%)': f"{safe_rate(total_player_play_score, total_score_overall)}%",
-        '相手のミスで得点率 (%)': f"{safe_rate(total_opponent_mistake_score, total_score_overall)}%",
-        '得点（判断迷う）率 (%)': f"{safe_rate(total_confusing_score, total_score_overall)}%"
+        '自分のプレーで得点率 (%)': rate_text(total_player_play_score, total_score_overall),
+        '相手のミスで得点率 (%)': rate_text(total_opponent_mistake_score, total_score_overall),
+        '得点（判断迷う）率 (%)': rate_text(total_confusing_score, total_score_overall)
     }
     total_loss_row = {
         'ゲーム数': 'Total', '種類': '失点', '合計': total_loss_overall,
         '相手のプレーで失点': total_player_play_loss, '自分のミスで失点': total_opponent_mistake_loss, '失点（判断迷う）': total_confusing_loss,
-        '相手のプレーで失点率 (%)': f"{safe_rate(total_player_play_loss, total_loss_overall)}%",
-        '自分のミスで失点率 (%)': f"{safe_rate(total_opponent_mistake_loss, total_loss_overall)}%",
-        '失点（判断迷う）率 (%)': f"{safe_rate(total_confusing_loss, total_loss_overall)}%"
+        '相手のプレーで失点率 (%)': rate_text(total_player_play_loss, total_loss_overall),
+        '自分のミスで失点率 (%)': rate_text(total_opponent_mistake_loss, total_loss_overall),
+        '失点（判断迷う）率 (%)': rate_text(total_confusing_loss, total_loss_overall)
     }
     
     final_summary_df = pd.concat([final_summary_df, pd.DataFrame([total_score_row, total_loss_row])], ignore_index=True)
     
     analysis_text = "## 得失点合計と内訳\n\n"
     analysis_text += "### 試合全体の得失点サマリー\n"
-    analysis_text += "試合全体の得失点の合計と、その内訳（プレー、ミス、その他）です。\n"
+    analysis_text += f"試合全体の得失点の合計と、その内訳（プレー、ミス、その他）です。括弧内は割合の{INTERVAL_LABEL}です。\n"
     total_df_markdown = final_summary_df[final_summary_df['ゲーム数'] == 'Total'].to_markdown(index=False)
     analysis_text += total_df_markdown + "\n\n"
     
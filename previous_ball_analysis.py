@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 
+from rate_intervals import INTERVAL_LABEL, format_wilson_intervals
+
 # --- 相手の直前コースと自分の打球技術の成功率分析関数 ---
 def display_previous_ball_analysis(df):
     """
@@ -147,8 +149,9 @@ def display_previous_ball_analysis(df):
 
     summary_df['成功率 (%)'] = (summary_df['成功数'] / summary_df['総数']) * 100
     summary_df['成功率 (%)'] = summary_df['成功率 (%)'].round(1)
+    summary_df[INTERVAL_LABEL] = format_wilson_intervals(summary_df['成功数'], summary_df['総数'])
     
-    summary_df = summary_df[['相手の直前コース', '自分の打球技術', '総数', '成功数', '成功率 (%)']]
+    summary_df = summary_df[['相手の直前コース', '自分の打球技術', '総数', '成功数', '成功率 (%)', INTERVAL_LABEL]]
 
     # UI表示
     st.markdown("---")
@@ -296,8 +299,9 @@ def get_previous_ball_analysis_for_ai(df):
 
     summary_df['成功率 (%)'] = (summary_df['成功数'] / summary_df['総数']) * 100
     summary_df['成功率 (%)'] = summary_df['成功率 (%)'].round(1)
+    summary_df[INTERVAL_LABEL] = format_wilson_intervals(summary_df['成功数'], summary_df['総数'])
     
-    summary_df = summary_df[['相手の直前コース', '自分の打球技術', '総数', '成功数', '成功率 (%)']]
+    summary_df = summary_df[['相手の直前コース', '自分の打球技術', '総数', '成功数', '成功率 (%)', INTERVAL_LABEL]]
 
     analysis_text = "## 相手の直前コースと自分の打球技術の成功率\n\n" # タイトルも修正
     analysis_text += summary_df.to_markdown(index=False)
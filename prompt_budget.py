@@ -0,0 +1,278 @@
+import re
+
+# --- トークン数の概算に使う正規表現 ---
+# 日本語（ひらがな・カタカナ・漢字・全角記号）はおおむね1文字1トークンとして数える
+_CJK_PATTERN = re.compile(r'[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]')
+# 英数字は4文字で1トークン程度
+_ALNUM_PATTERN = re.compile(r'[A-Za-z0-9]')
+# 記号の連続（表の罫線 '|' や '---' など）は1かたまりで1トークン程度
+_SYMBOL_RUN_PATTERN = re.compile(r'[^\w\s\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]+')
+# 連続した空白（表の桁揃えの余白など）は1かたまりで1トークン程度
+_SPACE_RUN_PATTERN = re.compile(r'[ \t\u3000]{2,}')
+# Markdownの表の区切り行（|:---|---:| など）
+_SEPARATOR_ROW_PATTERN = re.compile(r'^\|[\s:\-|]+\|$')
+
+# 圧縮を試す順番（弱い処理から強い処理へ）
+# 集計は生データ全体に対して行い、その後 top_k で件数の多いグループだけを残す
+STRATEGY_ORDER = ['compact', 'dedupe', 'aggregate', 'top_k', 'drop']
+
+STRATEGY_LABELS = {
+    'compact': '表の余白を削除',
+    'dedupe': '重複したコメントを省略',
+    'top_k': '上位の行のみ残す',
+    'aggregate': '生データを件数の集計に置換',
+    'drop': 'セクションを省略',
+}
+
+# 重複を省略する対象となる自由記述の列
+COMMENT_COLUMNS = ['コメント・課題', '得点の内容', '失点の内容']
+
+DEFAULT_TOP_K = 10
+
+
+def estimate_tokens(text):
+    """
+    APIを呼ばずにテキストのトークン数を概算する。
+    日本語は1文字≒1トークン、英数字は4文字≒1トークン、
+    記号の連続・空白の連続は1かたまり≒1トークンとして数える。
+
+    Args:
+        text (str): 対象のテキスト
+
+    Returns:
+        int: 概算トークン数
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_PATTERN.findall(text))
+    alnum_count = len(_ALNUM_PATTERN.findall(text))
+    symbol_runs = len(_SYMBOL_RUN_PATTERN.findall(text))
+    space_runs = len(_SPACE_RUN_PATTERN.findall(text))
+    return cjk_count + (alnum_count + 3) // 4 + symbol_runs + space_runs
+
+
+# --- Markdownの表の解析と再出力 ---
+def _split_row(line):
+    return [cell.strip() for cell in line.strip().strip('|').split('|')]
+
+
+def _parse_blocks(text):
+    """
+    テキストを「表以外の行」と「Markdownの表」のブロックに分解する。
+    表のブロックは {'header': [...], 'rows': [[...], ...]} として返す。
+    """
+    blocks = []
+    lines = text.split('\n')
+    i = 0
+    while i < len(lines):
+        line = lines[i].strip()
+        is_table_start = (
+            line.startswith('|') and i + 1 < len(lines)
+            and _SEPARATOR_ROW_PATTERN.match(lines[i + 1].strip())
+        )
+        if is_table_start:
+            header = _split_row(line)
+            rows = []
+            i += 2
+            while i < len(lines) and lines[i].strip().startswith('|'):
+                rows.append(_split_row(lines[i]))
+                i += 1
+            blocks.append({'header': header, 'rows': rows})
+        else:
+            blocks.append(lines[i])
+            i += 1
+    return blocks
+
+
+def _render_table(header, rows):
+    """余白を付けずに表をMarkdownで出力する。"""
+    def clean(cell):
+        return '' if cell.lower() == 'nan' else cell
+
+    lines = ['| ' + ' | '.join(header) + ' |', '|' + '|'.join(['---'] * len(header)) + '|']
+    for row in rows:
+        lines.append('| ' + ' | '.join(clean(cell) for cell in row) + ' |')
+    return '\n'.join(lines)
+
+
+def _render_blocks(blocks):
+    rendered = []
+    for block in blocks:
+        if isinstance(block, dict):
+            rendered.append(_render_table(block['header'], block['rows']))
+        else:
+            rendered.append(block)
+    return '\n'.join(rendered)
+
+
+# --- 圧縮処理 ---
+def _compact(blocks, section):
+    # 表を余白なしで出力し直すだけで、行は削らない
+    return blocks
+
+
+def _dedupe(blocks, section):
+    for block in blocks:
+        if not isinstance(block, dict):
+            continue
+        unique_rows = []
+        seen_rows = set()
+        for row in block['rows']:
+            key = tuple(row)
+            if key in seen_rows:
+                continue
+            seen_rows.add(key)
+            unique_rows.append(row)
+
+        # 同じ自由記述が繰り返される場合は2回目以降を「〃」にする
+        comment_indices = [idx for idx, col in enumerate(block['header']) if col in COMMENT_COLUMNS]
+        for idx in comment_indices:
+            seen_texts = set()
+            for row in unique_rows:
+                text = row[idx] if idx < len(row) else ''
+                if text in ('', 'nan'):
+                    continue
+                if text in seen_texts:
+                    row[idx] = '〃'
+                else:
+                    seen_texts.add(text)
+        block['rows'] = unique_rows
+    return blocks
+
+
+def _top_k(blocks, section):
+    top_k = section.get('top_k', DEFAULT_TOP_K)
+    result = []
+    for block in blocks:
+        result.append(block)
+        if isinstance(block, dict) and len(block['rows']) > top_k:
+            omitted = len(block['rows']) - top_k
+            block['rows'] = block['rows'][:top_k]
+            result.append(f"（他 {omitted} 行はトークン予算のため省略）")
+    return result
+
+
+def _aggregate(blocks, section):
+    group_by = section.get('group_by') or []
+    result = []
+    for block in blocks:
+        if not isinstance(block, dict):
+            result.append(block)
+            continue
+        key_indices = [block['header'].index(col) for col in group_by if col in block['header']]
+        if not key_indices:
+            # 集計キーがない表はそのまま残す（後段の drop に任せる）
+            result.append(block)
+            continue
+        counts = {}
+        for row in block['rows']:
+            key = tuple(row[idx] if idx < len(row) else '' for idx in key_indices)
+            counts[key] = counts.get(key, 0) + 1
+        sorted_counts = sorted(counts.items(), key=lambda item: item[1], reverse=True)
+        header = [block['header'][idx] for idx in key_indices] + ['件数']
+        rows = [list(key) + [str(count)] for key, count in sorted_counts]
+        result.append({'header': header, 'rows': rows})
+        result.append(f"（全 {len(block['rows'])} 行を {'・'.join(header[:-1])} ごとの件数に集計）")
+    return result
+
+
+def _drop(blocks, section):
+    return ["（トークン予算のため、このセクションは省略しました）"]
+
+
+_STRATEGY_FUNCTIONS = {
+    'compact': _compact,
+    'dedupe': _dedupe,
+    'top_k': _top_k,
+    'aggregate': _aggregate,
+    'drop': _drop,
+}
+
+
+def apply_strategy(text, strategy, section=None):
+    """
+    セクション本文に圧縮処理を1つ適用する。
+
+    Args:
+        text (str): セクション本文（Markdown）
+        strategy (str): STRATEGY_ORDER のいずれか
+        section (dict): top_k や group_by などのセクション設定
+
+    Returns:
+        str: 圧縮後の本文
+    """
+    blocks = _parse_blocks(text)
+    blocks = _STRATEGY_FUNCTIONS[strategy](blocks, section or {})
+    return _render_blocks(blocks)
+
+
+# --- プロンプト全体の組み立て ---
+def render_section(section):
+    """セクション設定を、プロンプトに埋め込む文字列に変換する。"""
+    parts = []
+    if section.get('title'):
+        parts.append(f"■{section['title']}:")
+    parts.append(section['body'])
+    if section.get('note'):
+        parts.append(section['note'])
+    return '\n'.join(parts)
+
+
+def build_prompt(header, sections):
+    """ヘッダーとセクションを連結してプロンプトを作る。"""
+    return header + '\n' + '\n\n'.join(render_section(section) for section in sections) + '\n'
+
+
+def fit_prompt_to_budget(header, sections, token_budget):
+    """
+    各セクションの優先度と圧縮方法に従い、プロンプトがトークン予算に収まるまで圧縮する。
+    優先度の低いセクションから順に、弱い圧縮処理 → 強い圧縮処理の順で適用する。
+
+    Args:
+        header (str): 共通ヘッダーと指示文（圧縮しない）
+        sections (list[dict]): 'title', 'body', 'note', 'priority', 'strategies',
+            'top_k', 'group_by' を持つセクション設定のリスト。
+            'strategies' を持たないセクションは圧縮しない。
+        token_budget (int): 許容する概算トークン数。None の場合は圧縮しない。
+
+    Returns:
+        tuple: (プロンプト文字列, 圧縮レポートのリスト, 最終的な概算トークン数)
+    """
+    sections = [dict(section) for section in sections]
+    section_tokens = [estimate_tokens(render_section(section)) for section in sections]
+    header_tokens = estimate_tokens(header)
+    total_tokens = header_tokens + sum(section_tokens)
+    report = []
+
+    if token_budget is None or total_tokens <= token_budget:
+        return build_prompt(header, sections), report, total_tokens
+
+    # 優先度が低い（数値が小さい）セクションから圧縮する
+    order = sorted(range(len(sections)), key=lambda idx: sections[idx].get('priority', 0))
+
+    for strategy in STRATEGY_ORDER:
+        for idx in order:
+            if total_tokens <= token_budget:
+                break
+            section = sections[idx]
+            if strategy not in section.get('strategies', []):
+                continue
+            new_section = dict(section, body=apply_strategy(section['body'], strategy, section))
+            new_tokens = estimate_tokens(render_section(new_section))
+            # トークンが減らない処理は適用しない
+            if new_tokens >= section_tokens[idx]:
+                continue
+            before_tokens = section_tokens[idx]
+            sections[idx] = section = new_section
+            section_tokens[idx] = new_tokens
+            total_tokens += new_tokens - before_tokens
+            report.append({
+                'セクション': section.get('title') or '(本文)',
+                '処理': STRATEGY_LABELS[strategy],
+                '変更前トークン': before_tokens,
+                '変更後トークン': section_tokens[idx],
+            })
+        if total_tokens <= token_budget:
+            break
+
+    return build_prompt(header, sections), report, total_tokens
@@ -4,6 +4,27 @@ import pandas as pd
 import datetime
 import io
 
+from data_validation import display_validation_report
+from serve_prediction import display_next_serve_prediction
+from utils import times_to_seconds
+from video_server import get_video_server
+
+# 球種、コース、質の選択肢
+SERVICE_TYPES = ["YGサーブ", "YGサーブ上","YGサーブ下","巻込み","巻込み上","巻込み下",
+                 "順横", "順横下", "順横上", "バック", "バック上", "バック下", "キックサーブ", "その他", ""]
+COMMON_TECH_TYPES = ["バックドライブ", "バックツッツキ", "バックチキータ", "バックフリック", "バックストップ", "バックブロック",
+                     "フォアドライブ", "フォアツッツキ", "フォアフリック", "フォアストップ", "フォア流し", "フォアブロック","フォアスマッシュ", "バックスマッシュ", "ロビング", "その他", ""]
+SERVE_COURSE_TYPES = ["フォア前", "ミドル前", "バック前", "バックサイド", "フォアサイド", "フォアロング", "ミドルロング", "バックロング", "その他", ""]
+COURSE_TYPES = ["フォア前", "ミドル前", "バック前", "バックサイド", "フォア", "バック", "ミドル", "バック(正面)", "フォアサイド", "その他", ""]
+SERVE_QUALITY_TYPES = ["良い", "普通", "少し浮いた", "浮いた", "ミス", "台から出てる", ""]
+QUALITY_TYPES = ["良い", "普通", "少し浮いた", "浮いた", "強打", "プッシュ気味", "ループ", "合わせた", "ネットイン", "エッジ", "ミス", ""]
+SCORE_LOSS_TYPES = ["自分のプレーで得点", "相手のプレーで失点", "相手のミスで得点", "自分のミスで失点", "失点（判断迷う）", "得点（判断迷う）", ""]
+SERVER_TYPES = ["自分", "相手"]
+OUTCOME_TECH_TYPES = ["バックドライブ", "フォアドライブ", "サービスエース", "バックチキータ", "フォアフリック", "バックフリック",
+                      "フォアストップ", "バックストップ", "フォアブロック", "バックブロック", "フォアツッツキ", "バックツッツキ", "フォア流し",
+                      "フォアスマッシュ", "バックスマッシュ", "ロビング", "サーブミス", "レシーブミス", "ラリー勝ち", "ラリー負け","相手のプレー", "相手のミス", "その他", ""]
+
+
 def display_common_data_and_video_settings():
     """
     試合共通データと動画表示設定のセクションを管理する関数。
@@ -31,7 +52,18 @@ def display_common_data_and_video_settings():
         st.slider("動画の幅を調整 (px)", min_value=200, max_value=1200, step=50, key="video_width_slider_rallytab")
 
     if st.session_state.video_path_input_rallytab and os.path.exists(st.session_state.video_path_input_rallytab):
-        st.video(st.session_state.video_path_input_rallytab, format="video/mp4", width=st.session_state.video_width_slider_rallytab)
+        # 編集中のラリーがある場合は、そのラリーの開始時刻から再生する
+        start_time = 0
+        if st.session_state.get('editing_rally_index') is not None:
+            editing_rally = st.session_state.all_rallies[st.session_state.editing_rally_index]
+            seconds = times_to_seconds(pd.Series([editing_rally.get('開始時刻')])).iloc[0]
+            start_time = int(seconds) if pd.notna(seconds) else 0
+        # ファイルを毎回アプリに読み込まないよう、ローカルの動画サーバーのURLを渡す（ブラウザが必要な範囲だけ取りに来る）
+        try:
+            video_source = get_video_server().url_for(st.session_state.video_path_input_rallytab)
+        except OSError:
+            video_source = st.session_state.video_path_input_rallytab
+        st.video(video_source, format="video/mp4", width=st.session_state.video_width_slider_rallytab, start_time=start_time)
     else:
         if st.expander("🎥 動画表示設定").expanded:
             st.warning("有効な動画ファイルパスを入力してください。")
@@ -203,21 +235,6 @@ def display_rally_input_tab():
         st.session_state.editing_rally_data = {}
         st.rerun()
 
-    # 球種、コース、質の選択肢
-    service_types = ["YGサーブ", "YGサーブ上","YGサーブ下","巻込み","巻込み上","巻込み下", 
-                     "順横", "順横下", "順横上", "バック", "バック上", "バック下", "キックサーブ", "その他", ""]
-    common_tech_types = ["バックドライブ", "バックツッツキ", "バックチキータ", "バックフリック", "バックストップ", "バックブロック",
-                   "フォアドライブ", "フォアツッツキ", "フォアフリック", "フォアストップ", "フォア流し", "フォアブロック","フォアスマッシュ", "バックスマッシュ", "ロビング", "その他", ""]
-    serve_course_types = ["フォア前", "ミドル前", "バック前", "バックサイド", "フォアサイド", "フォアロング", "ミドルロング", "バックロング", "その他", ""]
-    course_types = ["フォア前", "ミドル前", "バック前", "バックサイド", "フォア", "バック", "ミドル", "バック(正面)", "フォアサイド", "その他", ""]
-    serve_quality_types = ["良い", "普通", "少し浮いた", "浮いた", "ミス", "台から出てる", ""]
-    quality_types = ["良い", "普通", "少し浮いた", "浮いた", "強打", "プッシュ気味", "ループ", "合わせた", "ネットイン", "エッジ", "ミス", ""]
-    score_loss_types = ["自分のプレーで得点", "相手のプレーで失点", "相手のミスで得点", "自分のミスで失点", "失点（判断迷う）", "得点（判断迷う）", ""]
-    server_types = ["自分", "相手"]
-    outcome_tech_types = ["バックドライブ", "フォアドライブ", "サービスエース", "バックチキータ", "フォアフリック", "バックフリック", 
-                          "フォアストップ", "バックストップ", "フォアブロック", "バックブロック", "フォアツッツキ", "バックツッツキ", "フォア流し", 
-                          "フォアスマッシュ", "バックスマッシュ", "ロビング", "サーブミス", "レシーブミス", "ラリー勝ち", "ラリー負け","相手のプレー", "相手のミス", "その他", ""]
-    
     # --- 試合共通データと動画表示設定 ---
     display_common_data_and_video_settings()
     
@@ -225,6 +242,8 @@ def display_rally_input_tab():
     
     # --- ラリー詳細データ入力 ---
     st.subheader("📝 ラリー詳細データ入力")
+    # 次が相手のサーブなら、保存されている試合から相手が出しそうなサーブを出す
+    display_next_serve_prediction()
 
     with st.form(key='rally_input_form'):
         current_rally_no = len(st.session_state.all_rallies) + 1
@@ -251,7 +270,7 @@ def display_rally_input_tab():
 
         col_score_loss_type, col_scorer, col_serve_player, col_reset = st.columns([1, 0.7, 0.7, 0.3])
         with col_score_loss_type:
-            st.selectbox("得失点の種類", score_loss_types, key="score_loss_type_input")
+            st.selectbox("得失点の種類", SCORE_LOSS_TYPES, key="score_loss_type_input")
         with col_scorer:
             scorer = "不明"
             if st.session_state.score_loss_type_input in ["自分のプレーで得点", "相手のミスで得点", "得点（判断迷う）"]:
@@ -260,62 +279,62 @@ def display_rally_input_tab():
                 scorer = "相手"
             st.markdown(f"**得点者:** {scorer}")
         with col_serve_player:
-            st.selectbox("誰のサーブか", server_types, key="serve_player_input")
+            st.selectbox("誰のサーブか", SERVER_TYPES, key="serve_player_input")
         st.markdown("---")
 
         col_b1t, col_b1c, col_b1q, col_b2t, col_b2c, col_b2q = st.columns(6)
         with col_b1t:
-            st.selectbox("サーブの種類", service_types, key="ball1_type_input")
+            st.selectbox("サーブの種類", SERVICE_TYPES, key="ball1_type_input")
         with col_b1c:
-            st.selectbox("サーブのコース", serve_course_types, key="ball1_course_input")
+            st.selectbox("サーブのコース", SERVE_COURSE_TYPES, key="ball1_course_input")
         with col_b1q:
-            st.selectbox("サーブの質", serve_quality_types, key="ball1_quality_input")
+            st.selectbox("サーブの質", SERVE_QUALITY_TYPES, key="ball1_quality_input")
         with col_b2t:
-            st.selectbox("レシーブの種類", common_tech_types, key="ball2_type_input")
+            st.selectbox("レシーブの種類", COMMON_TECH_TYPES, key="ball2_type_input")
         with col_b2c:
-            st.selectbox("レシーブのコース", course_types, key="ball2_course_input")
+            st.selectbox("レシーブのコース", COURSE_TYPES, key="ball2_course_input")
         with col_b2q:
-            st.selectbox("レシーブの質", quality_types, key="ball2_quality_input")
+            st.selectbox("レシーブの質", QUALITY_TYPES, key="ball2_quality_input")
 
         col_b3t, col_b3c, col_b3q, col_b4t, col_b4c, col_b4q = st.columns(6)
         with col_b3t:
-            st.selectbox("３球目の種類", common_tech_types, key="ball3_type_input")
+            st.selectbox("３球目の種類", COMMON_TECH_TYPES, key="ball3_type_input")
         with col_b3c:
-            st.selectbox("３球目のコース", course_types, key="ball3_course_input")
+            st.selectbox("３球目のコース", COURSE_TYPES, key="ball3_course_input")
         with col_b3q:
-            st.selectbox("３球目の質", quality_types, key="ball3_quality_input")
+            st.selectbox("３球目の質", QUALITY_TYPES, key="ball3_quality_input")
         with col_b4t:
-            st.selectbox("４球目の種類", common_tech_types, key="ball4_type_input")
+            st.selectbox("４球目の種類", COMMON_TECH_TYPES, key="ball4_type_input")
         with col_b4c:
-            st.selectbox("４球目のコース", course_types, key="ball4_course_input")
+            st.selectbox("４球目のコース", COURSE_TYPES, key="ball4_course_input")
         with col_b4q:
-            st.selectbox("４球目の質", quality_types, key="ball4_quality_input")
+            st.selectbox("４球目の質", QUALITY_TYPES, key="ball4_quality_input")
 
         col_b5t, col_b5c, col_b5q, col_b6t, col_b6c, col_b6q = st.columns(6)
         with col_b5t:
-            st.selectbox("５球目の種類", common_tech_types, key="ball5_type_input")
+            st.selectbox("５球目の種類", COMMON_TECH_TYPES, key="ball5_type_input")
         with col_b5c:
-            st.selectbox("５球目のコース", course_types, key="ball5_course_input")
+            st.selectbox("５球目のコース", COURSE_TYPES, key="ball5_course_input")
         with col_b5q:
-            st.selectbox("５球目の質", quality_types, key="ball5_quality_input")
+            st.selectbox("５球目の質", QUALITY_TYPES, key="ball5_quality_input")
         with col_b6t:
-            st.selectbox("６球目の種類", common_tech_types, key="ball6_type_input")
+            st.selectbox("６球目の種類", COMMON_TECH_TYPES, key="ball6_type_input")
         with col_b6c:
-            st.selectbox("６球目のコース", course_types, key="ball6_course_input")
+            st.selectbox("６球目のコース", COURSE_TYPES, key="ball6_course_input")
         with col_b6q:
-            st.selectbox("６球目の質", quality_types, key="ball6_quality_input")
+            st.selectbox("６球目の質", QUALITY_TYPES, key="ball6_quality_input")
 
         st.text_input("７球目以降 (自由記述)", key="ball7_onwards_input")
 
         col_point_tech, col_point_content = st.columns([0.5, 2]) 
         with col_point_tech:
-            st.selectbox("得点の種類", outcome_tech_types, key="point_tech_type_select")
+            st.selectbox("得点の種類", OUTCOME_TECH_TYPES, key="point_tech_type_select")
         with col_point_content:
             st.text_input("得点の内容 (自由記述)", key="point_content_input")
 
         col_loss_tech, col_loss_content = st.columns([0.5, 2])
         with col_loss_tech:
-            st.selectbox("失点の種類", outcome_tech_types, key="loss_tech_type_select")
+            st.selectbox("失点の種類", OUTCOME_TECH_TYPES, key="loss_tech_type_select")
         with col_loss_content:
             st.text_input("失点の内容 (自由記述)", key="loss_content_input")
 
@@ -462,6 +481,8 @@ def display_rally_input_tab():
         
         valid_display_columns = [col for col in display_columns if col in df.columns]
         st.dataframe(df[valid_display_columns], use_container_width=True, height=300)
+        # 保存するたびに、スコアの進み方やサーブの順番が入力済みのラリーと合っているかを確認する
+        display_validation_report(df, key="rally_input", in_progress=True)
 
         col_download1, col_download2, col_download3 = st.columns(3)
         with col_download1:
@@ -0,0 +1,207 @@
+"""
+ラリーを打球の状態（打者・種類・コース・質）の移り変わりとして見るマルコフモデル。
+1球ごとに「次にどの打球になったか」「そこでラリーが終わってどちらが得点したか」を数えて遷移確率を求め、
+各状態から最終的に自分が得点する確率を計算する。
+
+遷移は観測された組み合わせだけを (遷移元, 遷移先, 回数) の疎な形で持ち、
+得点確率は「得点する確率 = すぐ得点する確率 + Σ 遷移確率 × 遷移先の得点確率」を収束するまで繰り返して求める。
+6球目のあとは、そのラリーの結果に進むものとして数える。
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rally_tensor import BALL_COUNT, SHOT_ATTRIBUTES, build_decoders, encode_rallies
+
+STATE_COLUMNS = ['打者', '種類', 'コース', '質']
+_SERVERS = ['自分', '相手']
+# 得点確率の繰り返し計算を終える変化量と回数
+_TOLERANCE = 1e-10
+_MAX_ITERATIONS = 1000
+
+
+def _state_keys(df, tensor, vocabularies):
+    """1球ごとの状態を1つの整数にした (ラリー数, 6) の配列を返す（種類が空欄の球と、それ以降の球は -1）。"""
+    sizes = [len(vocabularies[attribute]) for attribute in SHOT_ATTRIBUTES]
+    # 奇数球目はサーブを出した人、偶数球目はレシーブした人が打つ（0: 自分, 1: 相手）
+    server = (df['誰のサーブか'].astype(str).str.strip() == '相手').to_numpy(dtype=np.int64)
+    hitters = server[:, None] ^ (np.arange(BALL_COUNT) % 2)
+    keys = hitters
+    for attribute_index, size in enumerate(sizes):
+        keys = keys * size + tensor[:, :, attribute_index]
+    played = np.logical_and.accumulate(tensor[:, :, SHOT_ATTRIBUTES.index('種類')] > 0, axis=1)
+    return np.where(played, keys, -1), sizes
+
+
+def _decode_states(state_keys, vocabularies, sizes):
+    decoders = build_decoders(vocabularies)
+    columns = {}
+    rest = state_keys
+    for attribute, size in zip(reversed(SHOT_ATTRIBUTES), reversed(sizes)):
+        columns[attribute] = decoders[attribute][rest % size]
+        rest = rest // size
+    return pd.DataFrame({'打者': np.array(_SERVERS, dtype=object)[rest], **{a: columns[a] for a in SHOT_ATTRIBUTES}})
+
+
+def build_markov_model(df, shots=None):
+    """
+    ラリーのデータから、打球の状態の遷移確率と各状態からの得点確率を計算する。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（1試合分でも、複数の試合をまとめたものでもよい）
+        shots (tuple): df の encode_rallies の結果（None の場合はここで計算する）
+
+    Returns:
+        dict: {'states': '打者', '種類', 'コース', '質', '回数', '得点確率' の表（状態IDがインデックス）,
+               'transitions': '遷移元', '遷移先', '回数', '確率' の表（遷移先の '得点' / '失点' はラリーの終わり）}
+    """
+    empty = {'states': pd.DataFrame(columns=STATE_COLUMNS + ['回数', '得点確率']),
+             'transitions': pd.DataFrame(columns=['遷移元', '遷移先', '回数', '確率'])}
+    if df.empty or not {'誰のサーブか', '得点者', 'サーブの種類'}.issubset(df.columns):
+        return empty
+    rows = (df['誰のサーブか'].astype(str).str.strip().isin(_SERVERS) & df['得点者'].isin(_SERVERS)).to_numpy()
+    df = df[rows]
+    if df.empty:
+        return empty
+
+    tensor, vocabularies = (shots[0][rows], shots[1]) if shots is not None else encode_rallies(df)
+    keys, sizes = _state_keys(df, tensor, vocabularies)
+    state_keys, state_ids = np.unique(keys, return_inverse=True)
+    state_ids = state_ids.reshape(keys.shape)
+    if state_keys[0] == -1:
+        state_keys, state_ids = state_keys[1:], state_ids - 1
+    n_states = len(state_keys)
+    win, loss = n_states, n_states + 1
+
+    # 次の球がある球は次の状態へ、最後の球はラリーの結果（得点 / 失点）へ進む
+    outcome = np.where((df['得点者'] == '自分').to_numpy(), win, loss)
+    next_ids = np.concatenate([state_ids[:, 1:], np.full((len(df), 1), -1)], axis=1)
+    next_ids = np.where(next_ids >= 0, next_ids, outcome[:, None])
+    played = state_ids >= 0
+    pairs, counts = np.unique(state_ids[played] * (n_states + 2) + next_ids[played], return_counts=True)
+    sources, targets = pairs // (n_states + 2), pairs % (n_states + 2)
+    probabilities = counts / np.bincount(sources, weights=counts, minlength=n_states)[sources]
+
+    immediate = np.bincount(sources[targets == win], weights=probabilities[targets == win], minlength=n_states)
+    is_transient = targets < n_states
+    rows, cols, weights = sources[is_transient], targets[is_transient], probabilities[is_transient]
+    win_probability = immediate.copy()
+    for _ in range(_MAX_ITERATIONS):
+        updated = immediate + np.bincount(rows, weights=weights * win_probability[cols], minlength=n_states)
+        converged = np.abs(updated - win_probability).max() < _TOLERANCE
+        win_probability = updated
+        if converged:
+            break
+
+    states = _decode_states(state_keys, vocabularies, sizes)
+    states['回数'] = np.bincount(state_ids[played], minlength=n_states)
+    states['得点確率'] = win_probability
+    target_labels = np.array([str(i) for i in range(n_states)] + ['得点', '失点'], dtype=object)
+    transitions = pd.DataFrame({'遷移元': sources, '遷移先': target_labels[targets],
+                                '回数': counts, '確率': probabilities})
+    return {'states': states, 'transitions': transitions}
+
+
+def summarize_states(model, by=('打者', '種類')):
+    """
+    状態を指定した列でまとめ、回数で重みをつけた得点確率を返す（例: コースと質を区別しない打球の種類ごと）。
+
+    Returns:
+        pd.DataFrame: by の列と '回数', '得点確率' の表（回数の多い順）
+    """
+    states = model['states']
+    if states.empty:
+        return pd.DataFrame(columns=list(by) + ['回数', '得点確率'])
+    weighted = states.assign(_weighted=states['得点確率'] * states['回数'])
+    summary = weighted.groupby(list(by), dropna=False)[['回数', '_weighted']].sum().reset_index()
+    summary['得点確率'] = summary['_weighted'] / summary['回数']
+    return summary.drop(columns='_weighted').sort_values('回数', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def win_probability(model, hitter, shot_type, course=None, quality=None):
+    """
+    指定した打球のあとに自分が得点する確率を返す。コース・質を省略した場合は、その打球全体の確率（回数で重みづけ）。
+
+    Args:
+        model (dict): build_markov_model の結果
+        hitter (str): 打者（'自分' または '相手'）
+        shot_type (str): 打球の種類
+        course (str): コース
+        quality (str): 質
+
+    Returns:
+        float: 得点確率（0〜1）。該当する打球がない場合は None
+    """
+    states = model['states']
+    if states.empty:
+        return None
+    mask = (states['打者'] == hitter) & (states['種類'] == shot_type)
+    if course is not None:
+        mask &= states['コース'] == course
+    if quality is not None:
+        mask &= states['質'] == quality
+    matched = states[mask]
+    if matched.empty:
+        return None
+    return float((matched['得点確率'] * matched['回数']).sum() / matched['回数'].sum())
+
+
+def display_rally_markov(df, shots=None):
+    """
+    打球ごとの、そのあと自分が得点する確率を表示する。表示中の試合と全試合を切り替えられる。
+
+    Args:
+        df (pd.DataFrame): 表示中の試合の得失点データ
+        shots (tuple): df の encode_rallies の結果（None の場合はここで計算する）
+    """
+    st.subheader("打球ごとの得点確率（マルコフモデル）")
+    st.caption("その打球のあと、ラリーが続いた先も含めて最終的に自分が得点する確率")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        scope = st.radio("対象", ['この試合', '全試合'], horizontal=True, key="markov_scope")
+    with col2:
+        detail = st.selectbox("まとめ方", ['種類', '種類・コース', '種類・コース・質'], key="markov_detail")
+    with col3:
+        min_count = st.number_input("最低の回数", min_value=1, value=3, key="markov_min_count")
+
+    if scope == '全試合':
+        # match_store は読み込みに時間がかかるため、全試合を選んだときに読み込む
+        from match_store import load_stored_rallies
+
+        df, shots = load_stored_rallies(), None
+    model = build_markov_model(df, shots)
+    if model['states'].empty:
+        st.info("打球のデータがありません。")
+        return
+
+    by = ['打者'] + detail.split('・')
+    summary = summarize_states(model, by)
+    summary = summary[summary['回数'] >= min_count]
+    summary['得点確率'] = summary['得点確率'] * 100
+    for column, hitter in zip(st.columns(2), _SERVERS):
+        with column:
+            st.markdown(f"###### {hitter}の打球")
+            table = summary[summary['打者'] == hitter].drop(columns='打者')
+            if table.empty:
+                st.info("データがありません。")
+                continue
+            st.dataframe(table.style.format({'得点確率': "{:.1f}%"}), hide_index=True)
+
+
+def get_rally_markov_for_ai(df, shots=None, limit=10):
+    """
+    打球の種類ごとの、そのあと自分が得点する確率を、AIに渡すためのMarkdown文字列にする。
+    """
+    summary = summarize_states(build_markov_model(df, shots))
+    summary = summary[summary['回数'] >= 2]
+    if summary.empty:
+        return "打球ごとの得点確率を計算できるデータがありません。"
+
+    text = "## 打球ごとの得点確率（その打球のあと最終的に自分が得点する確率、2回以上の打球）\n\n"
+    for hitter in _SERVERS:
+        table = summary[summary['打者'] == hitter].head(limit).drop(columns='打者')
+        if table.empty:
+            continue
+        table['得点確率'] = table['得点確率'].map(lambda p: f"{p * 100:.1f}%")
+        text += f"### {hitter}の打球\n\n{table.to_markdown(index=False)}\n\n"
+    return text.rstrip()
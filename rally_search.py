@@ -0,0 +1,180 @@
+"""
+取り込んだ全試合の「コメント・課題」「得点の内容」「失点の内容」を検索するモジュール。
+日本語は単語の区切りがないため、文字の2-gram（1文字の語は1文字）を索引の単位にした転置インデックスを作り、
+BM25 で順位をつける。例: 「バックハンド オーバー」で、両方の語を含むラリーをYouTubeリンク付きで返す。
+
+索引は (n-gram, ラリー) の組を n-gram 順に並べた配列（CSR 形式）で持ち、検索は語の n-gram ごとの
+ラリー番号の配列をまとめて足し合わせるだけにする。
+"""
+import unicodedata
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import STORE_REFRESH_SECONDS, display_linked_table
+
+TEXT_COLUMNS = ['コメント・課題', '得点の内容', '失点の内容']
+RESULT_COLUMNS = ['ファイル名', 'ゲーム数', '自分の得点', '相手の得点', '得点者', '開始時刻', 'YouTubeリンク']
+# BM25 のパラメータ
+BM25_K1 = 1.2
+BM25_B = 0.75
+# 文字コードを何ビットずらして2文字を1つの整数にするか（Unicode は 21 ビットに収まる）
+_CODE_BITS = 21
+_SEPARATOR = '\n'
+
+
+def normalize_text(text):
+    """全角・半角や大文字・小文字の違いをなくす（'ＢＡＣＫ' と 'back' を同じにする）。"""
+    return unicodedata.normalize('NFKC', str(text)).lower()
+
+
+def _ngram_keys(codes):
+    """文字コードの配列から、1文字と隣り合う2文字の n-gram を整数にした配列を返す。"""
+    codes = codes.astype(np.int64)
+    unigrams = codes << _CODE_BITS
+    bigrams = (codes[:-1] << _CODE_BITS) | codes[1:]
+    return unigrams, bigrams
+
+
+def _to_codes(text):
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+def _query_terms(word):
+    """検索語を n-gram の整数の配列にする（2文字以上は2-gram、1文字は1文字）。"""
+    codes = _to_codes(word)
+    unigrams, bigrams = _ngram_keys(codes)
+    return np.unique(bigrams if len(codes) > 1 else unigrams)
+
+
+def build_search_index(df):
+    """
+    ラリーのテキスト列から転置インデックスを作る。
+
+    Args:
+        df (pd.DataFrame): ラリーのデータ（TEXT_COLUMNS の列のうち、あるものを使う）
+
+    Returns:
+        dict: {'terms': n-gram の整数（昇順）, 'indptr': n-gram ごとの postings の開始位置,
+               'docs': ラリー番号, 'tf': 出現回数, 'doc_lengths': ラリーごとの2-gram の数,
+               'texts': ラリーごとの正規化したテキスト, 'rallies': 結果に表示する列}
+    """
+    columns = [col for col in TEXT_COLUMNS if col in df.columns]
+    texts = pd.Series('', index=df.index)
+    for i, column in enumerate(columns):
+        # 行ごとに join するより、列の文字列をまとめて足すほうが速い
+        texts = texts + (_SEPARATOR if i else '') + df[column].fillna('').astype(str)
+    texts = texts.map(normalize_text).to_numpy(dtype=object)
+
+    # 全ラリーのテキストを1つの文字コードの配列にし、文字ごとのラリー番号と並べて n-gram を作る
+    lengths = np.fromiter((len(text) for text in texts), dtype=np.int64, count=len(texts))
+    codes = _to_codes(''.join(texts))
+    char_docs = np.repeat(np.arange(len(texts)), lengths)
+    is_text = ~np.isin(codes, [ord(c) for c in ' \t\r\n　'])
+    unigrams, bigrams = _ngram_keys(codes)
+    bigram_valid = (char_docs[:-1] == char_docs[1:]) & is_text[:-1] & is_text[1:]
+    keys = np.concatenate([unigrams[is_text], bigrams[bigram_valid]])
+    docs = np.concatenate([char_docs[is_text], char_docs[:-1][bigram_valid]])
+
+    terms, term_ids = np.unique(keys, return_inverse=True)
+    pairs, tf = np.unique(term_ids.astype(np.int64) * len(texts) + docs, return_counts=True)
+    postings_terms = pairs // max(len(texts), 1)
+    indptr = np.concatenate([[0], np.cumsum(np.bincount(postings_terms, minlength=len(terms)))])
+    rallies = df[[col for col in RESULT_COLUMNS if col in df.columns]].reset_index(drop=True)
+    for column in columns:
+        rallies[column] = df[column].to_numpy()
+    return {
+        'terms': terms,
+        'indptr': indptr,
+        'docs': pairs % max(len(texts), 1),
+        'tf': tf.astype(np.float64),
+        'doc_lengths': np.bincount(char_docs[:-1][bigram_valid], minlength=len(texts)).astype(np.float64),
+        'texts': texts,
+        'rallies': rallies,
+    }
+
+
+def search_rallies(index, query, limit=20, match_all=True):
+    """
+    検索語（空白区切りで複数可）を含むラリーを、BM25 のスコアの高い順に返す。
+
+    Args:
+        index (dict): build_search_index の結果
+        query (str): 検索語
+        limit (int): 返す件数
+        match_all (bool): True の場合はすべての語を含むラリーだけ、False の場合はどれかの語を含むラリー
+
+    Returns:
+        pd.DataFrame: index['rallies'] の列に 'スコア' を加えた表（スコアの高い順）
+    """
+    words = [word for word in normalize_text(query).split() if word]
+    doc_count = len(index['texts'])
+    empty = index['rallies'].iloc[:0].assign(スコア=pd.Series(dtype=float))
+    if not words or len(index['terms']) == 0:
+        return empty
+
+    scores = np.zeros(doc_count)
+    matched_words = np.zeros(doc_count, dtype=np.int64)
+    average_length = max(index['doc_lengths'].mean(), 1)
+    for word in words:
+        terms = _query_terms(word)
+        positions = np.searchsorted(index['terms'], terms)
+        found = (positions < len(index['terms'])) & (index['terms'][np.minimum(positions, len(index['terms']) - 1)] == terms)
+        if not found.all():
+            # 語の n-gram のどれかがどのラリーにもない場合、その語を含むラリーはない
+            continue
+        hits = np.zeros(doc_count, dtype=np.int64)
+        for position in positions:
+            start, end = index['indptr'][position], index['indptr'][position + 1]
+            docs, tf = index['docs'][start:end], index['tf'][start:end]
+            idf = np.log(1 + (doc_count - len(docs) + 0.5) / (len(docs) + 0.5))
+            length_norm = BM25_K1 * (1 - BM25_B + BM25_B * index['doc_lengths'][docs] / average_length)
+            scores[docs] += idf * tf * (BM25_K1 + 1) / (tf + length_norm)
+            hits[docs] += 1
+        # n-gram がすべて含まれるラリーのうち、語がそのまま含まれるものだけを数える
+        candidates = np.flatnonzero(hits == len(positions))
+        contains = np.fromiter((word in index['texts'][doc] for doc in candidates), dtype=bool, count=len(candidates))
+        matched_words[candidates[contains]] += 1
+
+    selected = np.flatnonzero(matched_words == len(words) if match_all else matched_words > 0)
+    if selected.size == 0:
+        return empty
+    if selected.size > limit:
+        selected = selected[np.argpartition(-scores[selected], limit - 1)[:limit]]
+    selected = selected[np.argsort(-scores[selected], kind='stable')]
+    return index['rallies'].iloc[selected].assign(スコア=scores[selected]).reset_index(drop=True)
+
+
+@st.cache_resource(ttl=STORE_REFRESH_SECONDS, show_spinner=False)
+def load_search_index():
+    """全試合のラリーから検索の索引を作る。索引は検索で書き換えないため、コピーせずに共有する。"""
+    # match_store は読み込みに時間がかかるため、検索を表示するときに読み込む
+    from match_store import load_stored_rallies
+
+    return build_search_index(load_stored_rallies())
+
+
+def display_rally_search():
+    """全試合のコメント・得点の内容・失点の内容を検索し、該当するラリーを動画へのリンク付きで表示する。"""
+    st.subheader("ラリーのコメント検索")
+    col1, col2, col3 = st.columns([3, 1, 1])
+    with col1:
+        query = st.text_input("検索語（空白で区切ると複数の語）", placeholder="例: バックハンド オーバー", key="rally_search_query")
+    with col2:
+        limit = st.number_input("表示件数", min_value=5, max_value=200, value=20, step=5, key="rally_search_limit")
+    with col3:
+        match_all = st.radio("条件", ['すべての語', 'どれかの語'], key="rally_search_mode") == 'すべての語'
+    if not query.strip():
+        st.caption(f"対象: 全試合の「{'」「'.join(TEXT_COLUMNS)}」")
+        return
+
+    index = load_search_index()
+    results = search_rallies(index, query, limit=limit, match_all=match_all)
+    if results.empty:
+        st.info("該当するラリーはありません。")
+        return
+
+    st.caption(f"{len(results)}件（関連度の高い順）")
+    display_linked_table(results.drop(columns=['スコア', 'YouTubeリンク'], errors='ignore'),
+                         results.get('YouTubeリンク', pd.Series('', index=results.index)))
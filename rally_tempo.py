@@ -0,0 +1,233 @@
+"""
+ラリーの長さ（開始時刻から終了時刻まで）と、ラリーの間の時間（前のラリーの終了から次のラリーの開始まで）を分析するモジュール。
+得点者・サーブ・ゲームの局面との関係、ゲームごとのペース、タイムアウトのような長い間を求める。
+
+add_tempo_columns は読み込み時（開始時刻_秒 と一緒に）1回だけ列を追加し、分析はその列を集計するだけにする。
+'試合ID' 列があれば試合とゲーム数の組でゲームを区別するため、全試合をまとめたデータでも同じ関数で集計できる。
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from game_rules import get_score_state
+from serve_turns import game_keys
+from utils import STORE_REFRESH_SECONDS, times_to_seconds
+
+TEMPO_COLUMNS = ['終了時刻_秒', 'ラリー時間_秒', 'ラリー間隔_秒', 'タイムアウト相当']
+# これより長いラリー時間は入力ミスとして扱わない（秒）
+MAX_RALLY_SECONDS = 60
+# ラリーの間がこれ以上あいた場合はタイムアウトのような間とする（秒）。通常のラリーの間は10〜25秒程度
+TIMEOUT_GAP_SECONDS = 45
+DURATION_BINS = [0, 3, 6, 10, np.inf]
+DURATION_LABELS = ['3秒以下', '3〜6秒', '6〜10秒', '10秒超']
+GAP_BINS = [0, 15, 25, TIMEOUT_GAP_SECONDS, np.inf]
+GAP_LABELS = ['15秒以下', '15〜25秒', f'25〜{TIMEOUT_GAP_SECONDS}秒', f'{TIMEOUT_GAP_SECONDS}秒以上']
+
+
+def add_tempo_columns(df):
+    """
+    ラリー時間・ラリーの間の時間の列（TEMPO_COLUMNS）を追加する。
+
+    ラリー時間_秒: 終了時刻 - 開始時刻（0秒以下や MAX_RALLY_SECONDS 秒を超える場合は NaN）
+    ラリー間隔_秒: 同じゲームの前のラリーの終了時刻から、このラリーの開始時刻まで（ゲームの最初のラリーは NaN）
+    タイムアウト相当: ラリー間隔が TIMEOUT_GAP_SECONDS 秒以上か
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（'開始時刻' の列がない場合はそのまま返す）
+
+    Returns:
+        pd.DataFrame: 列を追加した表
+    """
+    if '開始時刻' not in df.columns or df.empty:
+        return df
+    start = times_to_seconds(df['開始時刻']).to_numpy()
+    end = times_to_seconds(df['終了時刻']).to_numpy() if '終了時刻' in df.columns else np.full(len(df), np.nan)
+    duration = end - start
+    duration = np.where((duration > 0) & (duration <= MAX_RALLY_SECONDS), duration, np.nan)
+
+    games = game_keys(df) if 'ゲーム数' in df.columns else np.zeros(len(df), dtype=np.int64)
+    same_game = np.r_[False, games[1:] == games[:-1]]
+    gap = start - np.r_[np.nan, end[:-1]]
+    gap = np.where(same_game & (gap >= 0), gap, np.nan)
+    return df.assign(**{
+        '終了時刻_秒': end,
+        'ラリー時間_秒': duration,
+        'ラリー間隔_秒': gap,
+        'タイムアウト相当': gap >= TIMEOUT_GAP_SECONDS,
+    })
+
+
+def _with_tempo(df):
+    return df if 'ラリー間隔_秒' in df.columns else add_tempo_columns(df)
+
+
+def summarize_tempo(df, by):
+    """
+    グループごとのラリー数・ラリー時間・ラリーの間の時間・得点率を集計する。
+    合計と回数も返すため、試合ごとの結果を足し合わせて全体の平均を出すこともできる。
+
+    Args:
+        df (pd.DataFrame): add_tempo_columns の列を持つ表
+        by (str or list): グループの列（df の列、または df と同じインデックスの pd.Series）
+
+    Returns:
+        pd.DataFrame: 'ラリー数', '得点数', '得点率', '時間のあるラリー数', 'ラリー時間の合計', '平均ラリー時間',
+                      '間隔のあるラリー数', '間隔の合計', '平均間隔' の表（得点率は %、時間は秒）
+    """
+    data = pd.DataFrame({
+        'ラリー数': 1,
+        '得点数': (df['得点者'] == '自分').astype(int),
+        '時間のあるラリー数': df['ラリー時間_秒'].notna().astype(int),
+        'ラリー時間の合計': df['ラリー時間_秒'].fillna(0),
+        '間隔のあるラリー数': df['ラリー間隔_秒'].notna().astype(int),
+        '間隔の合計': df['ラリー間隔_秒'].fillna(0),
+    }, index=df.index)
+    keys = [df[key] if isinstance(key, str) else key for key in ([by] if not isinstance(by, list) else by)]
+    summary = data.groupby(keys, observed=True).sum()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        summary['得点率'] = summary['得点数'] / summary['ラリー数'] * 100
+        summary['平均ラリー時間'] = summary['ラリー時間の合計'] / summary['時間のあるラリー数'].replace(0, np.nan)
+        summary['平均間隔'] = summary['間隔の合計'] / summary['間隔のあるラリー数'].replace(0, np.nan)
+    return summary[['ラリー数', '得点数', '得点率', '時間のあるラリー数', 'ラリー時間の合計', '平均ラリー時間',
+                    '間隔のあるラリー数', '間隔の合計', '平均間隔']].reset_index()
+
+
+def compute_game_pace(df):
+    """
+    ゲームごとのペースを計算する。
+
+    Returns:
+        pd.DataFrame: ('試合ID',) 'ゲーム数', 'ラリー数', 'ゲーム時間（分）', '1ポイントの秒数', '平均ラリー時間', '平均間隔',
+                      'タイムアウト相当' の表（1ポイントの秒数 = 最初のラリーの開始から最後のラリーの終了まで / ラリー数）
+    """
+    df = _with_tempo(df)
+    start = times_to_seconds(df['開始時刻'])
+    # 終了時刻の入力ミスでゲーム時間がのびないよう、ラリー時間として使える終了時刻だけを使う
+    finish = start + df['ラリー時間_秒'].fillna(0)
+    keys = [col for col in ['試合ID', 'ゲーム数'] if col in df.columns]
+    grouped = pd.DataFrame({'開始': start, '終了': finish, 'ラリー時間': df['ラリー時間_秒'],
+                            '間隔': df['ラリー間隔_秒'], 'タイムアウト相当': df['タイムアウト相当']}).groupby(
+        [df[key] for key in keys], sort=False)
+    pace = grouped.agg(ラリー数=('開始', 'size'), 開始=('開始', 'min'), 終了=('終了', 'max'),
+                       平均ラリー時間=('ラリー時間', 'mean'), 平均間隔=('間隔', 'mean'),
+                       タイムアウト相当=('タイムアウト相当', 'sum'))
+    seconds = pace['終了'] - pace['開始']
+    pace['ゲーム時間（分）'] = seconds / 60
+    pace['1ポイントの秒数'] = seconds / pace['ラリー数']
+    return pace[['ラリー数', 'ゲーム時間（分）', '1ポイントの秒数', '平均ラリー時間', '平均間隔', 'タイムアウト相当']].reset_index()
+
+
+def compute_tempo_tables(df, score_state=None):
+    """
+    画面とAIプロンプトで使う集計表をまとめて計算する。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
+
+    Returns:
+        dict: {'overall', 'duration', 'gap', 'server', 'phase', 'pace', 'timeouts'} の表
+              （'gap' はラリーの前の間の長さごとの、そのラリーの得点率）
+    """
+    df = _with_tempo(df)
+    state = get_score_state(df, score_state)
+    duration_bin = pd.cut(df['ラリー時間_秒'], DURATION_BINS, labels=DURATION_LABELS, include_lowest=True)
+    gap_bin = pd.cut(df['ラリー間隔_秒'], GAP_BINS, labels=GAP_LABELS, right=False)
+    timeout_columns = [col for col in ['ファイル名', 'ゲーム数', '開始時刻', 'ラリー間隔_秒', '得点者', 'YouTubeリンク']
+                       if col in df.columns]
+    is_timeout = df['タイムアウト相当'].to_numpy(dtype=bool)
+    score = state['自分の得点_前'].astype(str) + '-' + state['相手の得点_前'].astype(str)
+    timeouts = df.loc[is_timeout, timeout_columns].assign(ラリー前のスコア=score[is_timeout].to_numpy())
+    return {
+        'overall': summarize_tempo(df, pd.Series('全体', index=df.index, name='対象')),
+        'duration': summarize_tempo(df, duration_bin.rename('ラリー時間')),
+        'gap': summarize_tempo(df, gap_bin.rename('ラリーの前の間')),
+        'server': summarize_tempo(df, state['サーブ'].rename('サーブ')),
+        'phase': summarize_tempo(df, state['ゲームフェーズ'].rename('ゲームフェーズ')),
+        'pace': compute_game_pace(df),
+        'timeouts': timeouts,
+    }
+
+
+def _format_seconds(value):
+    return f"{value:.1f}秒" if pd.notna(value) else '-'
+
+
+def _format_table(summary, label_columns):
+    table = summary[label_columns + ['ラリー数', '得点率', '平均ラリー時間', '平均間隔']].copy()
+    table['得点率'] = table['得点率'].map('{:.1f}%'.format)
+    for column in ['平均ラリー時間', '平均間隔']:
+        table[column] = table[column].map(_format_seconds)
+    return table
+
+
+@st.cache_data(ttl=STORE_REFRESH_SECONDS, show_spinner=False)
+def load_archive_tempo_tables():
+    """「全試合」を選んだときの集計表を、取り込んだ全試合のラリーから計算する。"""
+    # match_store は読み込み時にこのモジュールを使うため、ここで読み込む
+    from match_store import load_stored_rallies
+
+    return compute_tempo_tables(load_stored_rallies())
+
+
+def display_rally_tempo(df, score_state=None):
+    """
+    ラリー時間とラリーの間の時間の分析を表示する。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
+    """
+    st.subheader("ラリー時間とテンポの分析")
+    scope = st.radio("対象", ['この試合', '全試合'], horizontal=True, key="rally_tempo_scope")
+    tables = compute_tempo_tables(df, score_state) if scope == 'この試合' else load_archive_tempo_tables()
+    overall = tables['overall'].iloc[0]
+    if overall['時間のあるラリー数'] == 0:
+        st.info("終了時刻が入力されたラリーがないため、ラリー時間を計算できません。")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("平均ラリー時間", _format_seconds(overall['平均ラリー時間']), help=f"{overall['時間のあるラリー数']}ラリー")
+    col2.metric("平均のラリーの間", _format_seconds(overall['平均間隔']))
+    col3.metric("タイムアウト相当の間", f"{len(tables['timeouts'])}回", help=f"{TIMEOUT_GAP_SECONDS}秒以上あいたラリーの間")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        st.markdown("##### ラリー時間ごとの得点率")
+        st.dataframe(_format_table(tables['duration'], ['ラリー時間']), hide_index=True)
+        st.markdown("##### サーブ別")
+        st.dataframe(_format_table(tables['server'], ['サーブ']), hide_index=True)
+    with col2:
+        st.markdown("##### ラリーの前の間ごとの得点率")
+        st.dataframe(_format_table(tables['gap'], ['ラリーの前の間']), hide_index=True)
+        st.markdown("##### ゲームの局面別")
+        st.dataframe(_format_table(tables['phase'], ['ゲームフェーズ']), hide_index=True)
+
+    st.markdown("##### ゲームごとのペース")
+    st.dataframe(tables['pace'].round(1), hide_index=True)
+    if not tables['timeouts'].empty:
+        with st.expander(f"タイムアウト相当の間（{TIMEOUT_GAP_SECONDS}秒以上）のあとのラリー"):
+            st.dataframe(tables['timeouts'], hide_index=True,
+                         column_config={'YouTubeリンク': st.column_config.LinkColumn('YouTubeリンク')})
+
+
+def get_rally_tempo_for_ai(df, score_state=None):
+    """ラリー時間・ラリーの間の時間と得点率の関係を、AIに渡すためのMarkdown文字列にする。"""
+    if '開始時刻' not in df.columns or '得点者' not in df.columns:
+        return "ラリー時間の計算に必要なデータがありません。"
+    tables = compute_tempo_tables(df, score_state)
+    overall = tables['overall'].iloc[0]
+    if overall['時間のあるラリー数'] == 0:
+        return "ラリー時間の計算に必要なデータがありません。"
+
+    text = ("## ラリー時間とテンポ\n\n"
+            f"平均ラリー時間 {_format_seconds(overall['平均ラリー時間'])}、平均のラリーの間 {_format_seconds(overall['平均間隔'])}、"
+            f"タイムアウト相当（{TIMEOUT_GAP_SECONDS}秒以上）の間 {len(tables['timeouts'])}回\n\n"
+            "### ラリー時間ごとの得点率\n\n"
+            f"{_format_table(tables['duration'], ['ラリー時間']).to_markdown(index=False)}\n\n"
+            "### ラリーの前の間ごとの得点率\n\n"
+            f"{_format_table(tables['gap'], ['ラリーの前の間']).to_markdown(index=False)}\n\n"
+            "### サーブ別・ゲームの局面別\n\n"
+            f"{_format_table(tables['server'], ['サーブ']).to_markdown(index=False)}\n\n"
+            f"{_format_table(tables['phase'], ['ゲームフェーズ']).to_markdown(index=False)}")
+    return text
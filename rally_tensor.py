@@ -0,0 +1,174 @@
+"""
+ラリーの打球（1〜6球目の種類・コース・質）を小さな整数に置き換えた配列にするモジュール。
+「試合分析」シートの18列の文字列を (ラリー数, 6, 3) の uint8 の配列1つにまとめ、
+語彙（整数と文字列の対応表）で元に戻せるようにする。1試合でもシーズン全体でも同じ形で扱える。
+
+語彙はラリー入力ツールの選択肢を先頭に置き、データにしかない手入力の値は後ろに追加する。
+0 は空欄（入力なし）を表す。
+
+使い方:
+    python rally_tensor.py --db match_store.db --out season_rallies.npz
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from game_rules import SHOT_COLUMNS
+from rally_input_tab import (COMMON_TECH_TYPES, COURSE_TYPES, QUALITY_TYPES, SERVE_COURSE_TYPES,
+                             SERVE_QUALITY_TYPES, SERVICE_TYPES)
+
+# 配列の3つ目の軸の並び
+SHOT_ATTRIBUTES = ['種類', 'コース', '質']
+BALL_COUNT = len(SHOT_COLUMNS)
+# uint8 で表せる語彙の数
+MAX_VOCABULARY_SIZE = 256
+
+
+def _base_vocabulary(*choices):
+    values = [value for options in choices for value in options if value != '']
+    return [''] + list(dict.fromkeys(values))
+
+
+# ラリー入力ツールの選択肢から作る語彙（サーブとそれ以外の選択肢をまとめる）
+BASE_VOCABULARIES = {
+    '種類': _base_vocabulary(SERVICE_TYPES, COMMON_TECH_TYPES),
+    'コース': _base_vocabulary(SERVE_COURSE_TYPES, COURSE_TYPES),
+    '質': _base_vocabulary(SERVE_QUALITY_TYPES, QUALITY_TYPES),
+}
+
+
+def _factorize_column(df, column):
+    """列の値を (ラリーごとの番号, 前後の空白を除いた値の一覧) にする。空欄の番号は -1。"""
+    if column not in df.columns:
+        return np.full(len(df), -1, dtype=np.int64), []
+    codes, uniques = pd.factorize(df[column])
+    return codes, [str(value).strip() for value in uniques]
+
+
+def _encode(df, vocabularies):
+    vocabularies = {attribute: list(vocabularies[attribute]) for attribute in SHOT_ATTRIBUTES}
+    tensor = np.zeros((len(df), BALL_COUNT, len(SHOT_ATTRIBUTES)), dtype=np.uint8)
+    for attribute_index, attribute in enumerate(SHOT_ATTRIBUTES):
+        vocabulary = vocabularies[attribute]
+        positions = {value: code for code, value in enumerate(vocabulary)}
+        for ball, columns in enumerate(SHOT_COLUMNS):
+            codes, values = _factorize_column(df, columns[attribute_index + 1])
+            # 列の中の値の種類ごとに語彙の整数を決めてから、ラリー全体は添字で置き換える（空欄は最後の 0）
+            lookup = np.zeros(len(values) + 1, dtype=np.int64)
+            for i, value in enumerate(values):
+                if value not in positions:
+                    if len(vocabulary) == MAX_VOCABULARY_SIZE:
+                        raise ValueError(f"「{attribute}」の値が {MAX_VOCABULARY_SIZE} 種類を超え、uint8 で表せません")
+                    positions[value] = len(vocabulary)
+                    vocabulary.append(value)
+                lookup[i] = positions[value]
+            tensor[:, ball, attribute_index] = lookup[codes]
+    return tensor, vocabularies
+
+
+def build_vocabularies(df, vocabularies=None):
+    """
+    データに出てくる値をすべて含む語彙を作る。渡した語彙の整数はそのまま残し、新しい値だけを後ろに追加する。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+        vocabularies (dict): もとにする語彙（None の場合はラリー入力ツールの選択肢）
+
+    Returns:
+        dict: {'種類': [...], 'コース': [...], '質': [...]}（リストの位置が整数になる）
+
+    Raises:
+        ValueError: 1つの属性の値が uint8 で表せる数を超えた場合
+    """
+    return _encode(df, vocabularies or BASE_VOCABULARIES)[1]
+
+
+def encode_rallies(df, vocabularies=None):
+    """
+    ラリーの打球を (ラリー数, 6, 3) の uint8 の配列にする。
+    3つ目の軸は SHOT_ATTRIBUTES（種類・コース・質）の順、0 は空欄。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（1試合分でも、複数の試合をまとめたものでもよい）
+        vocabularies (dict): 使う語彙（データにない値は後ろに追加する）
+
+    Returns:
+        tuple: (配列, 語彙)
+
+    Raises:
+        ValueError: 1つの属性の値が uint8 で表せる数を超えた場合
+    """
+    return _encode(df, vocabularies or BASE_VOCABULARIES)
+
+
+def build_decoders(vocabularies):
+    """整数の配列をそのまま添字にして文字列に戻すための配列を作る（空欄は None）。"""
+    return {attribute: np.array([value if value != '' else None for value in vocabularies[attribute]], dtype=object)
+            for attribute in SHOT_ATTRIBUTES}
+
+
+def decode_rallies(tensor, vocabularies, index=None):
+    """
+    encode_rallies の配列を「試合分析」シートと同じ18列のDataFrameに戻す（空欄は None）。
+
+    Args:
+        tensor (np.ndarray): (ラリー数, 6, 3) の配列
+        vocabularies (dict): encode_rallies が返した語彙
+        index: 戻したDataFrameのインデックス
+
+    Returns:
+        pd.DataFrame: 1〜6球目の種類・コース・質の列を持つ表
+    """
+    decoders = build_decoders(vocabularies)
+    data = {}
+    for ball, columns in enumerate(SHOT_COLUMNS):
+        for attribute_index, attribute in enumerate(SHOT_ATTRIBUTES):
+            data[columns[attribute_index + 1]] = decoders[attribute][tensor[:, ball, attribute_index]]
+    return pd.DataFrame(data, index=index)
+
+
+def save_rally_tensor(path, tensor, vocabularies, **arrays):
+    """
+    配列と語彙を1つの .npz ファイルに保存する。試合IDなどラリーごとの配列も一緒に保存できる。
+    """
+    vocabulary_arrays = {f'vocabulary_{i}': np.array(vocabularies[attribute], dtype=str)
+                         for i, attribute in enumerate(SHOT_ATTRIBUTES)}
+    np.savez_compressed(path, shots=tensor, **vocabulary_arrays, **arrays)
+
+
+def load_rally_tensor(path):
+    """
+    save_rally_tensor で保存したファイルを読み込む。
+
+    Returns:
+        tuple: (配列, 語彙, 一緒に保存した配列の dict)
+    """
+    with np.load(path) as data:
+        vocabularies = {attribute: data[f'vocabulary_{i}'].tolist() for i, attribute in enumerate(SHOT_ATTRIBUTES)}
+        reserved = {'shots'} | {f'vocabulary_{i}' for i in range(len(SHOT_ATTRIBUTES))}
+        arrays = {name: data[name] for name in data.files if name not in reserved}
+        return data['shots'], vocabularies, arrays
+
+
+if __name__ == '__main__':
+    # match_store は読み込みに時間がかかるため、コマンドとして実行したときだけ読み込む
+    from match_store import MATCH_DB_PATH, connect, ingest_directory, query_rallies
+
+    parser = argparse.ArgumentParser(description='取り込んだ全試合の打球を整数の配列にして保存する')
+    parser.add_argument('--dir', default='.', help='Excelファイルのあるフォルダ')
+    parser.add_argument('--db', default=MATCH_DB_PATH, help='データベースのファイル')
+    parser.add_argument('--out', default='season_rallies.npz', help='保存するファイル')
+    args = parser.parse_args()
+
+    conn = connect(args.db)
+    ingest_directory(conn, args.dir)
+    df = query_rallies(conn)
+    tensor, vocabularies = encode_rallies(df)
+    save_rally_tensor(args.out, tensor, vocabularies, match_ids=df['試合ID'].to_numpy(dtype=np.int32))
+
+    shot_columns = [column for columns in SHOT_COLUMNS for column in columns[1:] if column in df.columns]
+    pandas_bytes = df[shot_columns].memory_usage(deep=True, index=False).sum()
+    print(f"ラリー数: {len(df)}、配列: {tensor.shape} {tensor.nbytes:,} バイト"
+          f"（DataFrame の18列: {pandas_bytes:,} バイト）")
+    print('語彙の数: ' + '、'.join(f"{attribute} {len(vocabularies[attribute])}" for attribute in SHOT_ATTRIBUTES))
@@ -0,0 +1,91 @@
+"""
+割合（得点率・ミス率など）の信頼区間を計算するモジュール。
+回数の少ない割合は大きくぶれるため、表やAIプロンプトに割合と一緒に区間を出して、差を読みすぎないようにする。
+
+1つの割合（成功数 / 回数）は Wilson の区間（式で計算できる）を使う。
+複数の試合をまとめた割合は、同じ試合のラリーが似るため、試合単位で選び直すブートストラップで区間を求める。
+選び直しは (回数, 試合数) の重みの行列で一度に計算する。
+1試合の表はゲームが3〜5しかなく、ゲーム単位で選び直しても区間が安定しないため Wilson の区間を使う。
+"""
+from statistics import NormalDist
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+CONFIDENCE = 0.95
+BOOTSTRAP_RESAMPLES = 2000
+INTERVAL_LABEL = f"{CONFIDENCE:.0%}信頼区間"
+
+
+def wilson_interval(successes, totals, confidence=CONFIDENCE):
+    """
+    Wilson の信頼区間を計算する（配列をまとめて計算できる）。
+
+    Args:
+        successes (array-like): 成功数（得点数など）
+        totals (array-like): 回数
+        confidence (float): 信頼度
+
+    Returns:
+        tuple: (下限, 上限) の配列（0〜1。回数が0の場合は NaN）
+    """
+    successes = np.asarray(successes, dtype=float)
+    totals = np.asarray(totals, dtype=float)
+    z = NormalDist().inv_cdf(0.5 + confidence / 2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = successes / totals
+        denominator = 1 + z ** 2 / totals
+        center = (rate + z ** 2 / (2 * totals)) / denominator
+        margin = z * np.sqrt(rate * (1 - rate) / totals + z ** 2 / (4 * totals ** 2)) / denominator
+    low = np.where(totals > 0, np.clip(center - margin, 0, 1), np.nan)
+    high = np.where(totals > 0, np.clip(center + margin, 0, 1), np.nan)
+    return low, high
+
+
+@st.cache_data(show_spinner=False)
+def cluster_bootstrap_interval(successes, totals, confidence=CONFIDENCE, resamples=BOOTSTRAP_RESAMPLES, seed=0):
+    """
+    試合（またはゲーム）単位で選び直すブートストラップで、まとめた割合の信頼区間を計算する。
+    同じ引数の計算は再表示のたびに繰り返さないようキャッシュする。
+
+    Args:
+        successes (np.ndarray): (試合数, 項目数) の成功数
+        totals (np.ndarray): (試合数, 項目数) の回数
+        confidence (float): 信頼度
+        resamples (int): 選び直す回数
+        seed (int): 乱数のシード（同じデータなら同じ区間になる）
+
+    Returns:
+        tuple: 項目ごとの (下限, 上限) の配列（0〜1。回数が0の項目は NaN）
+    """
+    successes = np.asarray(successes, dtype=float)
+    totals = np.asarray(totals, dtype=float)
+    clusters = successes.shape[0]
+    if clusters == 0:
+        return np.full(successes.shape[1], np.nan), np.full(successes.shape[1], np.nan)
+
+    # 選び直しごとに、各試合が何回選ばれたかを重みにする
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(clusters, np.full(clusters, 1 / clusters), size=resamples)
+    resampled_totals = weights @ totals
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rates = np.where(resampled_totals > 0, (weights @ successes) / resampled_totals, np.nan)
+    alpha = (1 - confidence) / 2
+    has_data = totals.sum(axis=0) > 0
+    rates[:, ~has_data] = 0
+    low, high = np.nanquantile(rates, [alpha, 1 - alpha], axis=0)
+    return np.where(has_data, low, np.nan), np.where(has_data, high, np.nan)
+
+
+def format_interval(low, high):
+    """区間を '42.1〜67.3%' の形の文字列にする（計算できない場合は '-'）。"""
+    if pd.isna(low) or pd.isna(high):
+        return '-'
+    return f"{low * 100:.1f}〜{high * 100:.1f}%"
+
+
+def format_wilson_intervals(successes, totals, confidence=CONFIDENCE):
+    """成功数と回数の列から、Wilson の区間の文字列のリストを作る（表に列として追加する用）。"""
+    low, high = wilson_interval(successes, totals, confidence)
+    return [format_interval(lo, hi) for lo, hi in zip(low, high)]
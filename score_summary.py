@@ -1,3 +1,6 @@
+import streamlit as st
+import pandas as pd
+
 def display_score_summary(df):
     """
     得失点合計と内訳のUIをモバイルフレンドリーな形式で表示する
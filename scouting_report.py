@@ -0,0 +1,234 @@
+"""
+同じ対戦相手との全試合をまとめた、相手の傾向（スカウティングレポート）。
+試合ごとの部分集計（サーブ種類・コース・サーブの1本目/2本目・ドライブのコースの本数）を
+match_store への取り込み時に計算しておき、表示するときは足し合わせるだけにする。
+"""
+import streamlit as st
+import pandas as pd
+
+from game_rules import build_score_state
+from drive_analysis_tab import draw_court_map, find_backhand_drives, find_forehand_drives
+from serve_court_map import draw_serve_court_map
+from serve_trend_analysis import split_opponent_serve_sequence
+from serve_shrinkage import SHRUNK_LABEL, add_shrunk_rates
+from serve_win_rate_analysis import categorize_serve
+from utils import group_detailed_serve_course, group_serve_type
+from lazy_import import lazy_module
+
+px = lazy_module('plotly.express')
+
+PARTIAL_COLUMNS = ['metric', 'phase', 'category', 'detail', 'total', 'won']
+
+DRIVE_KINDS = ['フォア側からのフォアドライブ', '回り込みフォアドライブ', 'バックドライブ']
+
+
+def _count(df, metric, phase, category, detail=None, won=None):
+    """category（と detail）ごとの本数を部分集計の行にする。won には本数と一緒に数える列（True/1 の数）を指定する。"""
+    keys = [category] + ([detail] if detail else [])
+    grouped = df.groupby(keys, dropna=False)
+    counts = grouped.size().rename('total').to_frame()
+    counts['won'] = grouped[won].sum() if won else 0
+    counts = counts.reset_index().rename(columns={category: 'category'})
+    counts['detail'] = counts[detail] if detail else ''
+    counts['metric'] = metric
+    counts['phase'] = phase
+    return counts[PARTIAL_COLUMNS]
+
+
+def compute_opponent_partials(df):
+    """
+    1試合分のデータから、相手の傾向の部分集計を作る。
+    複数の試合の部分集計は、metric・phase・category・detail ごとに total と won を足せば合計になる。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+
+    Returns:
+        pd.DataFrame: 'metric', 'phase', 'category', 'detail', 'total', 'won' の列を持つ部分集計
+    """
+    frames = []
+    serve_cols = ['ゲーム数', '誰のサーブか', 'サーブの種類', 'サーブのコース', '得点者', '自分の得点', '相手の得点']
+    if not df.empty and all(col in df.columns for col in serve_cols):
+        df_serve = df[df['誰のサーブか'] == '相手'].copy()
+        df_serve['ゲームフェーズ'] = build_score_state(df_serve)['ゲームフェーズ']
+        df_serve['サーブ種類（グループ化）'] = df_serve['サーブの種類'].apply(categorize_serve)
+        df_serve['詳細サーブコースグループ'] = df_serve['サーブのコース'].apply(group_detailed_serve_course)
+        df_serve['相手の得点か'] = df_serve['得点者'] == '相手'
+        for phase, df_phase in [('all', df_serve), ('game_ending', df_serve[df_serve['ゲームフェーズ'] == '終盤'])]:
+            if df_phase.empty:
+                continue
+            frames.append(_count(df_phase, 'serve_type', phase, 'サーブ種類（グループ化）', won='相手の得点か'))
+            frames.append(_count(df_phase.dropna(subset=['詳細サーブコースグループ']), 'serve_course', phase,
+                                 '詳細サーブコースグループ'))
+
+        df_sequence, df_pairs = split_opponent_serve_sequence(df)
+        if not df_sequence.empty:
+            df_sequence['コースグループ'] = df_sequence['サーブのコース'].apply(group_detailed_serve_course)
+            df_sequence['サーブグループ'] = df_sequence['サーブの種類'].apply(group_serve_type)
+            frames.append(_count(df_sequence.dropna(subset=['コースグループ']), 'sequence_course', 'all',
+                                 'サーブシーケンス', 'コースグループ'))
+            frames.append(_count(df_sequence, 'sequence_type', 'all', 'サーブシーケンス', 'サーブグループ'))
+        if not df_pairs.empty:
+            frames.append(pd.DataFrame([
+                ['sequence_change', 'all', 'コース', '', len(df_pairs), int((~df_pairs['same_course']).sum())],
+                ['sequence_change', 'all', '種類', '', len(df_pairs), int((~df_pairs['same_type']).sum())],
+            ], columns=PARTIAL_COLUMNS))
+
+    if not df.empty:
+        forehand_df, round_df = find_forehand_drives(df, '相手')
+        backhand_df = find_backhand_drives(df, '相手')
+        for kind, df_drive in zip(DRIVE_KINDS, [forehand_df, round_df, backhand_df]):
+            if not df_drive.empty:
+                df_drive['種類'] = kind
+                frames.append(_count(df_drive, 'drive', 'all', '種類', 'コース', won='ミス'))
+
+    if not frames:
+        return pd.DataFrame(columns=PARTIAL_COLUMNS)
+    partials = pd.concat(frames, ignore_index=True)
+    partials['detail'] = partials['detail'].fillna('').astype(str)
+    partials['category'] = partials['category'].astype(str)
+    partials[['total', 'won']] = partials[['total', 'won']].astype(int)
+    return partials
+
+
+def load_opponent_partials(conn, opponent_name, affiliation=''):
+    """
+    対戦相手との全試合の部分集計を足し合わせて返す。
+
+    Returns:
+        tuple: (合計した部分集計のDataFrame, 対象の試合一覧のDataFrame)
+    """
+    params = (opponent_name, affiliation or '')
+    matches = pd.read_sql_query(
+        'SELECT m.match_id, m.match_date, m.file_name FROM matches m JOIN players p ON p.player_id = m.opponent_id '
+        'WHERE p.name = ? AND p.affiliation = ? ORDER BY m.match_date, m.file_name', conn, params=params)
+    partials = pd.read_sql_query(
+        'SELECT o.metric, o.phase, o.category, o.detail, SUM(o.total) AS total, SUM(o.won) AS won '
+        'FROM opponent_partials o JOIN matches m ON m.match_id = o.match_id '
+        'JOIN players p ON p.player_id = m.opponent_id '
+        'WHERE p.name = ? AND p.affiliation = ? '
+        'GROUP BY o.metric, o.phase, o.category, o.detail', conn, params=params)
+    return partials, matches
+
+
+def _select(partials, metric, phase='all'):
+    return partials[(partials['metric'] == metric) & (partials['phase'] == phase)]
+
+
+def _display_serve_win_rate(partials):
+    st.markdown("##### 相手のサーブ種類別 得点率と構成比")
+    col1, col2 = st.columns(2)
+    for column, phase, title in [(col1, 'all', '全試合'), (col2, 'game_ending', '終盤 (8-8以降)')]:
+        with column:
+            st.markdown(f"###### {title}")
+            summary = _select(partials, 'serve_type', phase).rename(
+                columns={'category': 'サーブの種類', 'total': '総回数', 'won': '得点数'})
+            if summary.empty:
+                st.info("データがありません。")
+                continue
+            summary = summary[['サーブの種類', '総回数', '得点数']].sort_values('総回数', ascending=False)
+            summary['得点率'] = summary['得点数'] / summary['総回数'] * 100
+            if phase == 'all':
+                # 対戦の少ない相手の得点率は、全試合の相手のサーブの得点率に向けて縮めた値も並べる
+                summary = add_shrunk_rates(summary, '相手')
+            st.dataframe(summary.reset_index(drop=True).style.format({'得点率': "{:.1f}%", SHRUNK_LABEL: "{:.1f}%"},
+                                                                     na_rep='-'))
+            fig = px.pie(summary, values='総回数', names='サーブの種類', title=f'{title}のサーブ構成比',
+                         hover_data=['得点率'])
+            fig.update_traces(textinfo='percent+label')
+            st.plotly_chart(fig, use_container_width=True, key=f"scouting_serve_pie_{phase}")
+
+
+def _display_serve_court_maps(partials):
+    col1, col2 = st.columns(2)
+    for column, phase in [(col1, 'all'), (col2, 'game_ending')]:
+        with column:
+            counts = _select(partials, 'serve_course', phase).set_index('category')['total']
+            if counts.sum() == 0:
+                st.info("選択された期間のデータがありません。")
+                continue
+            draw_serve_court_map(counts, '相手', phase, key=f"scouting_serve_court_map_{phase}")
+
+
+def _display_serve_sequence(partials):
+    st.markdown("##### 相手のサーブ 1本目 vs 2本目 (10-10以前)")
+    course_order = ['フォア前', 'ミドル前', 'バック前', 'フォアサイド', 'バックサイド', 'フォアロング', 'ミドルロング', 'バックロング']
+    for metric, label in [('sequence_course', 'コース'), ('sequence_type', '種類')]:
+        counts = _select(partials, metric)
+        columns = st.columns(2)
+        for column, sequence in zip(columns, ['1本目', '2本目']):
+            with column:
+                df_counts = counts[counts['category'] == sequence].rename(columns={'detail': label, 'total': '本数'})
+                if df_counts.empty:
+                    continue
+                fig = px.pie(df_counts, values='本数', names=label, title=f'{sequence}のサーブ{label}',
+                             category_orders={'コース': course_order})
+                fig.update_traces(textinfo='percent+label')
+                st.plotly_chart(fig, use_container_width=True, key=f"scouting_{metric}_{sequence}")
+
+    changes = _select(partials, 'sequence_change').set_index('category')
+    if changes.empty or changes['total'].max() == 0:
+        st.info("1本目と2本目のサーブペアがありません。")
+        return
+    total_sequences = int(changes['total'].max())
+    st.write(f"**合計サーブペア数**: {total_sequences}本")
+    for label in ['コース', '種類']:
+        if label in changes.index:
+            rate = 100 * changes.loc[label, 'won'] / changes.loc[label, 'total']
+            st.markdown(f"**サーブの{label}を変える確率**: `{rate:.1f}%`")
+
+
+def _display_drive_maps(partials, df_opponents):
+    drives = _select(partials, 'drive')
+    columns = st.columns(len(DRIVE_KINDS))
+    for column, kind in zip(columns, DRIVE_KINDS):
+        with column:
+            st.markdown(f"###### {kind}")
+            counts = drives[drives['category'] == kind]
+            if counts.empty:
+                st.info("データがありません。")
+                continue
+            # コースごとの本数とミス数を1本ずつの行に戻して、1試合分と同じ描画関数で表示する
+            rows = counts.loc[counts.index.repeat(counts['total'])].copy()
+            rows['ミス'] = rows.groupby(level=0).cumcount() < rows['won']
+            draw_court_map(rows.rename(columns={'detail': 'コース'})[['コース', 'ミス']].astype({'ミス': int}),
+                           kind, '相手', df_opponents, key=f"scouting_drive_map_{kind}")
+
+
+def display_opponent_scouting_report(df_opponents):
+    """
+    表示中の試合の対戦相手について、保存されている全試合をまとめた傾向を表示する。
+
+    Args:
+        df_opponents (pd.DataFrame): 対戦相手の情報（「名前」「所属」で相手を特定する）
+    """
+    # match_store はこのモジュールの部分集計を使って取り込むため、ここで読み込む
+    from match_store import connect, refresh_store
+
+    if df_opponents.empty or '名前' not in df_opponents.columns or pd.isna(df_opponents['名前'].iloc[0]):
+        return
+    opponent_name = str(df_opponents['名前'].iloc[0]).strip()
+    affiliation = df_opponents['所属'].iloc[0] if '所属' in df_opponents.columns else ''
+    affiliation = '' if pd.isna(affiliation) else str(affiliation).strip()
+
+    refresh_store()
+    conn = connect()
+    try:
+        partials, matches = load_opponent_partials(conn, opponent_name, affiliation)
+    finally:
+        conn.close()
+
+    st.write("---")
+    st.subheader(f"{opponent_name}との全試合の傾向（{len(matches)}試合）")
+    if matches.empty:
+        st.info("この相手の試合はまだデータベースに取り込まれていません。")
+        return
+    with st.expander("対象の試合"):
+        st.dataframe(matches.rename(columns={'match_date': '日付', 'file_name': 'ファイル名'})[['日付', 'ファイル名']],
+                     hide_index=True)
+
+    _display_serve_win_rate(partials)
+    _display_serve_court_maps(partials)
+    _display_serve_sequence(partials)
+    st.markdown("##### 相手のドライブ分析")
+    _display_drive_maps(partials, df_opponents)
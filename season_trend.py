@@ -0,0 +1,197 @@
+"""
+シーズンを通した得点率・サーブ得点率・レシーブミス率・終盤の得点率の推移。
+試合ごとの集計（分子と分母）を match_store への取り込み時に保存しておき、
+推移の画面では試合数分の小さな行だけを読み込む。
+"""
+import streamlit as st
+import pandas as pd
+
+from game_rules import build_score_state
+from serve_win_rate_analysis import SERVE_KEYWORDS, categorize_serve
+from rate_intervals import INTERVAL_LABEL, cluster_bootstrap_interval, format_interval
+from lazy_import import lazy_module
+
+px = lazy_module('plotly.express')
+
+SUMMARY_COLUMNS = ['metric', 'numerator', 'denominator']
+
+SCORE_TYPES = ['自分のプレーで得点', '相手のミスで得点', '得点（判断迷う）']
+LOSS_TYPES = ['相手のプレーで失点', '自分のミスで失点', '失点（判断迷う）']
+
+# 最初に表示する指標
+DEFAULT_METRICS = ['得点率', 'サーブ時の得点率', 'レシーブ時の得点率', 'レシーブミス率', '終盤の得点率']
+
+
+def compute_match_summary(df):
+    """
+    1試合分のデータから、推移を見るための指標を分子と分母で計算する。
+    分子と分母を持つため、複数の試合をまとめた割合も正しく計算できる。
+
+    定義:
+        得点率 / 自分のプレーで得点率 / 自分のミスで失点率: 得失点の種類で数えた、全ラリーに対する割合（得失点合計と内訳と同じ）
+        サーブ時の得点率 / レシーブ時の得点率: 誰のサーブかで分けた得点率（サーブ・レシーブ別得失点分析と同じ）
+        サーブ得点率（種類）: 自分のサーブの種類別の得点率（サーブ種類別の得点率と同じ）
+        レシーブミス率: 相手のサーブのうち、レシーブの質が'ミス'だった割合
+        終盤の得点率: 両者8点以上の場面での得点率（ゲーム終盤の分析と同じ）
+
+    Returns:
+        pd.DataFrame: 'metric', 'numerator', 'denominator' の列を持つ表
+    """
+    rows = []
+
+    def add(metric, numerator, denominator):
+        if denominator > 0:
+            rows.append((metric, int(numerator), int(denominator)))
+
+    if '得失点の種類' in df.columns:
+        kind = df['得失点の種類']
+        is_score = kind.isin(SCORE_TYPES)
+        total = (is_score | kind.isin(LOSS_TYPES)).sum()
+        add('得点率', is_score.sum(), total)
+        add('自分のプレーで得点率', (kind == '自分のプレーで得点').sum(), total)
+        add('自分のミスで失点率', (kind == '自分のミスで失点').sum(), total)
+
+        if '誰のサーブか' in df.columns:
+            server = df['誰のサーブか'].astype(str).str.strip()
+            for server_type, label in [('自分', 'サーブ時の得点率'), ('相手', 'レシーブ時の得点率')]:
+                is_target = (server == server_type) & (is_score | kind.isin(LOSS_TYPES))
+                add(label, (is_target & is_score).sum(), is_target.sum())
+
+    if {'誰のサーブか', 'サーブの種類', '得点者'}.issubset(df.columns):
+        df_serve = df[df['誰のサーブか'] == '自分']
+        groups = df_serve['サーブの種類'].apply(categorize_serve)
+        for group in list(SERVE_KEYWORDS) + ['その他']:
+            is_group = groups == group
+            add(f'サーブ得点率（{group}）', (is_group & (df_serve['得点者'] == '自分')).sum(), is_group.sum())
+
+    if {'誰のサーブか', 'レシーブの質'}.issubset(df.columns):
+        df_receive = df[df['誰のサーブか'] == '相手']
+        add('レシーブミス率', (df_receive['レシーブの質'] == 'ミス').sum(), len(df_receive))
+
+    if {'ゲーム数', '自分の得点', '相手の得点', '得点者'}.issubset(df.columns):
+        state = build_score_state(df)
+        is_ending = state['ゲームフェーズ'] == '終盤'
+        add('終盤の得点率', (is_ending & (state['得点者'] == '自分')).sum(), is_ending.sum())
+
+    return pd.DataFrame(rows, columns=SUMMARY_COLUMNS)
+
+
+def load_match_summaries(conn):
+    """保存されている全試合の指標を、試合の情報と一緒に返す（日付の古い順、日付のない試合は最後）。"""
+    return pd.read_sql_query(
+        'SELECT m.match_id, m.match_date, m.file_name, p.name AS opponent_name, m.opponent_style, '
+        's.metric, s.numerator, s.denominator '
+        'FROM match_summaries s JOIN matches m ON m.match_id = s.match_id '
+        'LEFT JOIN players p ON p.player_id = m.opponent_id '
+        'ORDER BY m.match_date IS NULL, m.match_date, m.file_name', conn)
+
+
+def compute_rolling_rates(summaries, metrics, window):
+    """
+    直近 window 試合の分子・分母を合計した割合（%）を、試合ごとに計算する。
+
+    Returns:
+        pd.DataFrame: '試合', '指標', '割合', '試合の割合' の列を持つ表（'試合の割合' はその試合だけの割合）
+    """
+    summaries = summaries[summaries['metric'].isin(metrics)]
+    if summaries.empty:
+        return pd.DataFrame(columns=['試合', '指標', '割合', '試合の割合'])
+
+    order = summaries.drop_duplicates('match_id')[['match_id', 'match_date', 'opponent_name']].reset_index(drop=True)
+    order['試合'] = [f"{date if pd.notna(date) else '日付なし'} {name or ''}".strip() + f" #{match_id}"
+                   for match_id, date, name in order.itertuples(index=False, name=None)]
+    results = []
+    for metric in metrics:
+        values = summaries[summaries['metric'] == metric].set_index('match_id')[['numerator', 'denominator']]
+        values = values.reindex(order['match_id'])
+        # その指標のデータがない試合は、直近の試合数に数えない
+        values = values.dropna()
+        if values.empty:
+            continue
+        rolling = values.rolling(window, min_periods=1).sum()
+        results.append(pd.DataFrame({
+            '試合': order.set_index('match_id').loc[values.index, '試合'].values,
+            '指標': metric,
+            '割合': (rolling['numerator'] / rolling['denominator'] * 100).values,
+            '試合の割合': (values['numerator'] / values['denominator'] * 100).values,
+        }))
+    if not results:
+        return pd.DataFrame(columns=['試合', '指標', '割合', '試合の割合'])
+    return pd.concat(results, ignore_index=True)
+
+
+def compute_pooled_rates(summaries, metrics):
+    """
+    対象の全試合をまとめた割合と、試合単位で選び直すブートストラップの信頼区間を計算する。
+
+    Returns:
+        pd.DataFrame: '指標', '試合数', '割合', INTERVAL_LABEL の列を持つ表
+    """
+    summaries = summaries[summaries['metric'].isin(metrics)]
+    if summaries.empty:
+        return pd.DataFrame(columns=['指標', '試合数', '割合', INTERVAL_LABEL])
+    counts = summaries.pivot_table(index='match_id', columns='metric', values=['numerator', 'denominator'],
+                                   aggfunc='sum', fill_value=0)
+    metrics = [m for m in metrics if m in counts['numerator'].columns]
+    numerators = counts['numerator'][metrics].to_numpy()
+    denominators = counts['denominator'][metrics].to_numpy()
+    low, high = cluster_bootstrap_interval(numerators, denominators)
+    return pd.DataFrame({
+        '指標': metrics,
+        '試合数': (denominators > 0).sum(axis=0),
+        '割合': numerators.sum(axis=0) / denominators.sum(axis=0) * 100,
+        INTERVAL_LABEL: [format_interval(lo, hi) for lo, hi in zip(low, high)],
+    })
+
+
+def display_season_trend():
+    """保存されている全試合の指標の推移を表示する。"""
+    # match_store はこのモジュールの集計を使って取り込むため、ここで読み込む
+    from match_store import connect, refresh_store
+
+    st.subheader("シーズンの推移")
+    refresh_store()
+    conn = connect()
+    try:
+        summaries = load_match_summaries(conn)
+    finally:
+        conn.close()
+
+    if summaries.empty:
+        st.info("データベースに取り込まれた試合がありません。")
+        return
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        styles = sorted(summaries['opponent_style'].dropna().unique())
+        selected_styles = st.multiselect("相手の戦型", styles, key="season_styles")
+    with col2:
+        all_metrics = list(dict.fromkeys(DEFAULT_METRICS + sorted(summaries['metric'].unique())))
+        metrics = st.multiselect("指標", all_metrics,
+                                 default=[m for m in DEFAULT_METRICS if m in all_metrics], key="season_metrics")
+    with col3:
+        window = st.slider("移動平均の試合数", min_value=1, max_value=10, value=3, key="season_window")
+
+    if selected_styles:
+        summaries = summaries[summaries['opponent_style'].isin(selected_styles)]
+    match_count = summaries['match_id'].nunique()
+    st.caption(f"対象: {match_count}試合（直近{window}試合の合計で割合を計算）")
+
+    trend = compute_rolling_rates(summaries, metrics, window)
+    if trend.empty:
+        st.info("選択した条件のデータがありません。")
+        return
+
+    fig = px.line(trend, x='試合', y='割合', color='指標', markers=True,
+                  hover_data={'試合の割合': ':.1f', '割合': ':.1f'}, labels={'割合': '割合 (%)'})
+    fig.update_layout(yaxis_range=[0, 100], xaxis_title=None)
+    st.plotly_chart(fig, use_container_width=True, key="season_trend_chart")
+
+    with st.expander("試合ごとの数値"):
+        table = trend.pivot_table(index='試合', columns='指標', values='試合の割合', sort=False)
+        st.dataframe(table.style.format("{:.1f}%", na_rep='-'))
+
+    st.markdown("###### 対象の全試合をまとめた割合")
+    st.caption(f"{INTERVAL_LABEL}は試合単位で選び直すブートストラップで計算（試合ごとの調子の違いも含む）")
+    pooled = compute_pooled_rates(summaries, metrics)
+    st.dataframe(pooled.style.format({'割合': "{:.1f}%"}), hide_index=True)
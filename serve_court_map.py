@@ -1,10 +1,13 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+from game_rules import get_score_state
 from utils import group_detailed_serve_course, group_serve_type
+from lazy_import import lazy_module
 
-def display_serve_court_map(df, df_opponents, current_server_type, phase):
+px = lazy_module('plotly.express')
+go = lazy_module('plotly.graph_objects')
+
+def display_serve_court_map(df, df_opponents, current_server_type, phase, score_state=None):
     """
     卓球台に見立てた長方形の背景上に、サーブコースの割合を円の大きさで視覚的に表示する。
     Args:
@@ -12,6 +15,7 @@ def display_serve_court_map(df, df_opponents, current_server_type, phase):
         df_opponents (pd.DataFrame): 相手選手情報 (AI分析用)。
         current_server_type (str): '自分'または'相手'。
         phase (str): 分析対象のゲームフェーズ ('all', 'early_middle', 'game_ending')
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
     """
     # 必要な列の存在を確認
     required_cols = ['サーブのコース', 'サーブの種類', '誰のサーブか', '自分の得点', '相手の得点', '得点者']
@@ -22,26 +26,8 @@ def display_serve_court_map(df, df_opponents, current_server_type, phase):
 
     df = df.copy()
     
-    # ゲームのフェーズを判定する関数
-    def get_game_phase(row):
-        my_score = row['自分の得点']
-        opponent_score = row['相手の得点']
-        
-        # ラリー開始時点のスコアで終盤を判定
-        rally_start_my_score = my_score - 1 if row['得点者'] == '自分' else my_score
-        rally_start_opponent_score = opponent_score - 1 if row['得点者'] == '相手' else opponent_score
-        
-        # スコアが0未満になることはないため補正
-        rally_start_my_score = max(0, rally_start_my_score)
-        rally_start_opponent_score = max(0, rally_start_opponent_score)
-
-        if rally_start_my_score >= 8 and rally_start_opponent_score >= 8:
-            return '終盤'
-        else:
-            return '序盤・中盤'
-
     # データフレームにゲームフェーズ列を追加
-    df['ゲームフェーズ'] = df.apply(get_game_phase, axis=1)
+    df['ゲームフェーズ'] = get_score_state(df, score_state)['ゲームフェーズ']
 
     # フェーズに基づいてデータフレームをフィルタリング
     if phase == 'early_middle':
@@ -70,6 +56,22 @@ def display_serve_court_map(df, df_opponents, current_server_type, phase):
         st.info("選択された期間のデータがありません。")
         return
 
+    # ここに一意のキーを追加
+    key = f"serve_court_map_{current_server_type}_{phase}"
+    draw_serve_court_map(serve_counts, current_server_type, phase, opponent_handedness, key)
+
+
+def draw_serve_court_map(serve_counts, current_server_type, phase, opponent_handedness=None, key=None):
+    """
+    コースごとのサーブ本数を、卓球台の上に円の大きさで描画する。
+    Args:
+        serve_counts (pd.Series): 詳細サーブコースグループごとの本数。
+        current_server_type (str): '自分'または'相手'。
+        phase (str): グラフのタイトルに使うゲームフェーズ ('all', 'early_middle', 'game_ending')
+        opponent_handedness (str): 相手の利き腕（'右'の場合、自分のサーブの左右を反転する）。
+        key (str): st.plotly_chart に渡すキー。
+    """
+    total_serves = serve_counts.sum()
     serve_percentages = (serve_counts / total_serves * 100).round(1)
     
     # 卓球台の描画とデータのプロット
@@ -155,6 +157,4 @@ def display_serve_court_map(df, df_opponents, current_server_type, phase):
 
     config = {'staticPlot': True}
     
-    # ここに一意のキーを追加
-    key = f"serve_court_map_{current_server_type}_{phase}"
     st.plotly_chart(fig, use_container_width=False, config=config, key=key)
\ No newline at end of file
@@ -0,0 +1,246 @@
+"""
+相手の次のサーブ（種類とコース）を、保存されている試合から予測するモジュール。
+条件は「同じサーブの番の1本目」「局面（序盤・中盤 / 終盤 / デュースと、サーブする相手から見たリード）」
+「前のラリーの得点者」「ゲーム数」で、条件を細かくしたときの回数が少ない場合は、粗い条件の割合と混ぜる（バックオフ）。
+
+学習時に条件の段階ごとの割合の表をすべて計算しておき、予測は辞書を引くだけにするため、
+ラリー入力の画面で1ラリーごとに予測を出しても待ち時間はほとんどない。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from game_rules import DEUCE_SCORE, GAME_ENDING_SCORE, build_score_state, serve_turn
+from serve_turns import build_serve_pairs, compute_serve_turns, game_keys
+from utils import STORE_REFRESH_SECONDS, group_detailed_serve_course, group_serve_type
+
+CONTEXT_FEATURES = ['1本目', '局面', '前のラリー', 'ゲーム数']
+# 細かい条件から順に、後ろの条件を外していく
+BACKOFF_LEVELS = [tuple(CONTEXT_FEATURES[:n]) for n in range(len(CONTEXT_FEATURES), -1, -1)]
+TARGETS = ['種類', 'コース']
+# 対戦相手の試合のサーブがこの本数より少ない場合は、同じ戦型の相手の試合から学習する
+MIN_TRAINING_SERVES = 30
+
+_NO_FIRST_SERVE = 'なし'
+_UNKNOWN = '不明'
+
+
+def _serve_label(serve_type, course):
+    """サーブの種類とコースを、条件に使う1つの文字列にする。"""
+    return f"{group_serve_type(serve_type)}・{group_detailed_serve_course(course) or _UNKNOWN}"
+
+
+def _game_label(game):
+    """ゲーム数を '1' のような文字列にする（Excelやデータベースから 1.0 のように読み込まれても同じ値にする）。"""
+    number = pd.to_numeric(game, errors='coerce')
+    return str(int(number)) if pd.notna(number) else str(game)
+
+
+def _situation(server_score, receiver_score, is_deuce):
+    """局面を 'フェーズ（サーブする人から見たリード）' の文字列にする。"""
+    if is_deuce:
+        phase = 'デュース'
+    elif server_score >= GAME_ENDING_SCORE and receiver_score >= GAME_ENDING_SCORE:
+        phase = '終盤'
+    else:
+        phase = '序盤・中盤'
+    lead = 'リード' if server_score > receiver_score else '同点' if server_score == receiver_score else 'ビハインド'
+    return f"{phase}（{lead}）"
+
+
+def build_serve_contexts(df, server='相手'):
+    """
+    サーブした人のサーブについて、予測の条件と答え（グループ化した種類・コース）の表を作る。
+    スコアから求めたサーブの順番が記録と合わないラリーは使わない。
+
+    Returns:
+        pd.DataFrame: CONTEXT_FEATURES と TARGETS の列を持つ表（1行1サーブ）
+    """
+    required = ['ゲーム数', '自分の得点', '相手の得点', '得点者', '誰のサーブか', 'サーブの種類', 'サーブのコース']
+    if df.empty or not all(col in df.columns for col in required):
+        return pd.DataFrame(columns=CONTEXT_FEATURES + TARGETS)
+    df = df.reset_index(drop=True)
+    turns = compute_serve_turns(df)
+    state = build_score_state(df)
+
+    # 同じゲームの前のラリーの得点者（ゲームの最初は 'なし'）
+    games = game_keys(df)
+    is_first_rally = np.r_[True, games[1:] != games[:-1]]
+    previous = np.where(is_first_rally, _NO_FIRST_SERVE, np.r_[[''], df['得点者'].astype(str).to_numpy()[:-1]])
+
+    # 2本目のサーブには同じ番の1本目のサーブ、1本目とデュースのサーブは 'なし'
+    pairs = build_serve_pairs(df, server, turns)
+    first_serve = pd.Series(_NO_FIRST_SERVE, index=df.index, dtype=object)
+    first_serve[turns['ターン内の順番'] == 2] = _UNKNOWN
+    first_serve[pairs.index] = [_serve_label(t, c) for t, c in
+                                zip(pairs['1本目のサーブの種類'], pairs['1本目のサーブのコース'])]
+
+    my_before = state['自分の得点_前'].to_numpy()
+    opponent_before = state['相手の得点_前'].to_numpy()
+    server_score, receiver_score = (opponent_before, my_before) if server == '相手' else (my_before, opponent_before)
+    is_target = (turns['サーブ順の一致'].astype(bool) & (turns['想定のサーブ'] == server)).to_numpy()
+    contexts = pd.DataFrame({
+        '1本目': first_serve.to_numpy(),
+        '局面': [_situation(s, r, d) for s, r, d in zip(server_score, receiver_score, turns['デュース'])],
+        '前のラリー': previous,
+        'ゲーム数': df['ゲーム数'].map(_game_label).to_numpy(),
+        '種類': df['サーブの種類'].apply(group_serve_type).to_numpy(),
+        'コース': df['サーブのコース'].apply(group_detailed_serve_course).fillna(_UNKNOWN).to_numpy(),
+    })
+    return contexts[is_target].reset_index(drop=True)
+
+
+def train_serve_model(contexts):
+    """
+    build_serve_contexts の表から、条件の段階ごとに次のサーブの割合の表を作る。
+    細かい条件の割合は、回数 n と出てきた答えの種類数 t から n / (n + t) の重みで、1段粗い条件の割合と混ぜる。
+
+    Returns:
+        dict: {'labels': {答え: 答えの一覧}, 'levels': [(条件の列, {条件の値: 行}, {答え: 割合の行列}), ...],
+               'serve_count': 学習に使ったサーブの本数}（levels は BACKOFF_LEVELS の粗い条件から順）
+    """
+    model = {'labels': {}, 'levels': [], 'serve_count': len(contexts)}
+    if contexts.empty:
+        return model
+    target_codes = {}
+    for target in TARGETS:
+        codes, labels = pd.factorize(contexts[target])
+        target_codes[target] = codes
+        model['labels'][target] = np.asarray(labels, dtype=object)
+
+    parent_codes = np.zeros(len(contexts), dtype=np.int64)
+    parent_probabilities = None
+    for features in reversed(BACKOFF_LEVELS):
+        if features:
+            context_codes, context_values = pd.MultiIndex.from_frame(contexts[list(features)]).factorize()
+            context_values = list(context_values)
+        else:
+            context_codes, context_values = np.zeros(len(contexts), dtype=np.int64), [()]
+        context_count = len(context_values)
+        # 条件ごとの親（1段粗い条件）の行
+        parents = np.zeros(context_count, dtype=np.int64)
+        parents[context_codes] = parent_codes
+
+        probabilities = {}
+        for target in TARGETS:
+            label_count = len(model['labels'][target])
+            counts = np.bincount(context_codes * label_count + target_codes[target],
+                                 minlength=context_count * label_count).reshape(context_count, label_count)
+            totals = counts.sum(axis=1, keepdims=True)
+            kinds = (counts > 0).sum(axis=1, keepdims=True)
+            observed = counts / totals
+            if parent_probabilities is None:
+                probabilities[target] = observed
+            else:
+                weight = totals / (totals + kinds)
+                probabilities[target] = weight * observed + (1 - weight) * parent_probabilities[target][parents]
+        model['levels'].append((features, {value: row for row, value in enumerate(context_values)}, probabilities))
+        parent_codes, parent_probabilities = context_codes, probabilities
+    return model
+
+
+def build_next_context(game, my_score, opponent_score, previous_rally=None, server='相手'):
+    """
+    入力中の試合の次のラリーについて、予測の条件を作る。
+
+    Args:
+        game (int): 次のラリーのゲーム数
+        my_score (int): 次のラリーの前の自分の得点
+        opponent_score (int): 次のラリーの前の相手の得点
+        previous_rally (dict): 直前に入力したラリー（'ゲーム数', '得点者', '誰のサーブか', 'サーブの種類', 'サーブのコース'）
+        server (str): 次にサーブする人
+
+    Returns:
+        dict: CONTEXT_FEATURES の値
+    """
+    is_deuce = my_score >= DEUCE_SCORE and opponent_score >= DEUCE_SCORE
+    same_game = previous_rally is not None and _game_label(previous_rally.get('ゲーム数')) == _game_label(game)
+    first_serve = _NO_FIRST_SERVE
+    _, position = serve_turn(my_score + opponent_score)
+    if position == 2:
+        first_serve = _UNKNOWN
+        if same_game and previous_rally.get('誰のサーブか') == server:
+            first_serve = _serve_label(previous_rally.get('サーブの種類'), previous_rally.get('サーブのコース'))
+    server_score, receiver_score = (opponent_score, my_score) if server == '相手' else (my_score, opponent_score)
+    return {
+        '1本目': first_serve,
+        '局面': _situation(server_score, receiver_score, is_deuce),
+        '前のラリー': str(previous_rally.get('得点者')) if same_game else _NO_FIRST_SERVE,
+        'ゲーム数': _game_label(game),
+    }
+
+
+def predict_next_serve(model, context, top=3):
+    """
+    条件に合う最も細かい段階の割合から、次のサーブの種類とコースの上位を返す。
+
+    Returns:
+        dict: {'種類': [(値, 確率), ...], 'コース': [(値, 確率), ...], '条件': 使った条件の列}
+              学習データがない場合は None
+    """
+    if not model['levels']:
+        return None
+    for features, index, probabilities in reversed(model['levels']):
+        row = index.get(tuple(context[feature] for feature in features))
+        if row is not None:
+            break
+    result = {'条件': features}
+    for target in TARGETS:
+        values = probabilities[target][row]
+        order = np.argsort(values)[::-1][:top]
+        result[target] = [(model['labels'][target][i], float(values[i])) for i in order if values[i] > 0]
+    return result
+
+
+@st.cache_data(ttl=STORE_REFRESH_SECONDS, show_spinner=False)
+def load_serve_model(opponent=None, opponent_style=None):
+    """
+    保存されている対戦相手の試合から予測モデルを作る。
+    相手の試合のサーブが MIN_TRAINING_SERVES 本より少ない場合は、同じ戦型の相手の試合を使う。
+    ラリーの入力中に呼ばれるため、フォルダの取り込みはせず、取り込み済みの試合だけを使う。
+
+    Returns:
+        tuple: (train_serve_model の結果, 学習に使った試合の説明)。データベースがない場合は (None, None)
+    """
+    # match_store は取り込みのためにサーブの集計を使うモジュールを読み込むため、ここで読み込む
+    from match_store import MATCH_DB_PATH, connect, query_rallies
+
+    if not os.path.exists(MATCH_DB_PATH):
+        return None, None
+    conn = connect()
+    try:
+        if opponent:
+            contexts = build_serve_contexts(query_rallies(conn, opponent=opponent))
+            if len(contexts) >= MIN_TRAINING_SERVES:
+                return train_serve_model(contexts), f"{opponent}との試合"
+        if opponent_style:
+            contexts = build_serve_contexts(query_rallies(conn, opponent_style=opponent_style))
+            if not contexts.empty:
+                return train_serve_model(contexts), f"{opponent_style}の相手との試合"
+        return train_serve_model(build_serve_contexts(query_rallies(conn))), "全試合"
+    finally:
+        conn.close()
+
+
+def display_next_serve_prediction():
+    """ラリー入力中の試合で、次が相手のサーブの場合に、相手が出しそうなサーブを表示する。"""
+    if st.session_state.get('serve_player_input') != '相手':
+        return
+    model, source = load_serve_model(st.session_state.get('opponent_name_input', '').strip() or None,
+                                     st.session_state.get('opponent_style_select'))
+    if model is None:
+        return
+    rallies = st.session_state.get('all_rallies', [])
+    context = build_next_context(st.session_state.game_number_input, st.session_state.my_score_input,
+                                 st.session_state.opponent_score_input, rallies[-1] if rallies else None)
+    prediction = predict_next_serve(model, context)
+    if prediction is None:
+        return
+    with st.expander("🔮 相手の次のサーブの予測", expanded=True):
+        used = '、'.join(f"{feature}: {context[feature]}" for feature in prediction['条件']) or '条件なし'
+        st.caption(f"{source}のサーブ{model['serve_count']}本から予測（使った条件 {used}）")
+        for column, target in zip(st.columns(len(TARGETS)), TARGETS):
+            with column:
+                st.markdown(f"**{target}**: " + ' / '.join(f"{label} {p * 100:.0f}%" for label, p in prediction[target]))
@@ -1,6 +1,11 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+from lazy_import import lazy_module
+from rate_intervals import INTERVAL_LABEL, format_wilson_intervals
+from serve_shrinkage import SHRUNK_LABEL, add_shrunk_rates
+from serve_win_rate_analysis import categorize_serve
+
+px = lazy_module('plotly.express')
 
 def display_serve_rate_transition(df, current_player):
     """
@@ -19,23 +24,6 @@ def display_serve_rate_transition(df, current_player):
         
         df_serve['サーブの種類'] = df_serve['サーブの種類'].astype(str).str.strip()
 
-        serve_keywords = {
-            '順横': '順横',
-            'YGサーブ': 'YG',
-            '巻込み': '巻込み',
-            'バックサーブ': 'バック',
-            'キックサーブ': 'キック'
-        }
-
-        def categorize_serve(serve_type):
-            if pd.isna(serve_type) or serve_type == '':
-                return 'その他'
-            
-            for group, keyword in serve_keywords.items():
-                if keyword in serve_type:
-                    return group
-            return 'その他'
-
         df_serve['サーブ種類（グループ化）'] = df_serve['サーブの種類'].apply(categorize_serve)
         
         total_serves_by_game = df_serve.groupby(['ゲーム数', 'サーブ種類（グループ化）']).size().reset_index(name='総回数')
@@ -45,14 +33,19 @@ def display_serve_rate_transition(df, current_player):
                                       on=['ゲーム数', 'サーブ種類（グループ化）'], how='left').fillna(0)
         
         game_serve_summary['得点率'] = (game_serve_summary['得点数'] / game_serve_summary['総回数']) * 100
+        game_serve_summary[INTERVAL_LABEL] = format_wilson_intervals(game_serve_summary['得点数'], game_serve_summary['総回数'])
+        game_serve_summary = add_shrunk_rates(game_serve_summary, current_player, group_column='サーブ種類（グループ化）')
 
         if not game_serve_summary.empty:
-            fig = px.line(game_serve_summary, x='ゲーム数', y='得点率', color='サーブ種類（グループ化）',
+            # 1ゲームのサーブは数本なので、全試合の得点率に向けて縮めた値でも推移を見られるようにする
+            rate_column = st.radio("表示する得点率", ['得点率', SHRUNK_LABEL], horizontal=True,
+                                   key=f"serve_rate_transition_rate_{current_player}")
+            fig = px.line(game_serve_summary, x='ゲーム数', y=rate_column, color='サーブ種類（グループ化）',
                           title=f'{current_player}のゲームごとのサーブ種類別得点率の推移',
                           markers=True, 
                           text='総回数',
-                          labels={'ゲーム数':'ゲーム数', '得点率':'得点率 (%)', 'サーブ種類（グループ化）':'サーブの種類'},
-                          hover_data=['総回数', '得点数'])
+                          labels={'ゲーム数':'ゲーム数', rate_column:'得点率 (%)', 'サーブ種類（グループ化）':'サーブの種類'},
+                          hover_data=['総回数', '得点数', '得点率', INTERVAL_LABEL, SHRUNK_LABEL])
             
             fig.update_layout(xaxis_title="ゲーム数", yaxis_title="得点率 (%)")
             fig.update_xaxes(dtick=1)
@@ -86,23 +79,6 @@ def get_serve_rate_transition_for_ai(df, current_player):
 
     df_serve['サーブの種類'] = df_serve['サーブの種類'].astype(str).str.strip()
     
-    serve_keywords = {
-        '順横': '順横',
-        'YGサーブ': 'YG',
-        '巻込み': '巻込み',
-        'バックサーブ': 'バック',
-        'キックサーブ': 'キック'
-    }
-
-    def categorize_serve(serve_type):
-        if pd.isna(serve_type) or serve_type == '':
-            return 'その他'
-        
-        for group, keyword in serve_keywords.items():
-            if keyword in serve_type:
-                return group
-        return 'その他'
-
     df_serve['サーブ種類（グループ化）'] = df_serve['サーブの種類'].apply(categorize_serve)
     
     total_serves_by_game = df_serve.groupby(['ゲーム数', 'サーブ種類（グループ化）']).size().reset_index(name='総回数')
@@ -112,13 +88,18 @@ def get_serve_rate_transition_for_ai(df, current_player):
                                   on=['ゲーム数', 'サーブ種類（グループ化）'], how='left').fillna(0)
     
     game_serve_summary['得点率'] = (game_serve_summary['得点数'] / game_serve_summary['総回数']) * 100
+    game_serve_summary[INTERVAL_LABEL] = format_wilson_intervals(game_serve_summary['得点数'], game_serve_summary['総回数'])
+    game_serve_summary = add_shrunk_rates(game_serve_summary, current_player, group_column='サーブ種類（グループ化）')
     
     game_serve_summary['得点率'] = game_serve_summary['得点率'].round(1).astype(str) + '%'
-    game_serve_summary = game_serve_summary[['ゲーム数', 'サーブ種類（グループ化）', '総回数', '得点数', '得点率']]
+    game_serve_summary[SHRUNK_LABEL] = game_serve_summary[SHRUNK_LABEL].map(
+        lambda rate: f"{rate:.1f}%" if pd.notna(rate) else '-')
+    game_serve_summary = game_serve_summary[['ゲーム数', 'サーブ種類（グループ化）', '総回数', '得点数', '得点率', INTERVAL_LABEL, SHRUNK_LABEL]]
     
     analysis_text = f"## {current_player}のゲーム別 サーブ種類別得点率の推移\n\n"
     if not game_serve_summary.empty:
         analysis_text += "### 集計データ\n"
+        analysis_text += f"※{SHRUNK_LABEL}: 1ゲームの数本から計算した得点率を、全試合でのそのサーブの得点率に近づけた値。ゲームごとの変化はこちらで判断する。\n"
         analysis_text += game_serve_summary.to_markdown(index=False)
     else:
         analysis_text += "サーブ種類ごとのゲーム別データが不足しているため、分析できませんでした。\n"
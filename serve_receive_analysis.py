@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 
+from rate_intervals import INTERVAL_LABEL, format_wilson_intervals
+
 def display_serve_receive_analysis(df):
     """
     サーブ・レシーブ別得失点分析をStreamlitのUIに表示する関数
@@ -102,6 +104,8 @@ def display_serve_receive_analysis(df):
             }
             
             final_summary_df['ゲーム数'] = final_summary_df['ゲーム数'].astype(str)
+            final_summary_df[INTERVAL_LABEL] = format_wilson_intervals(
+                final_summary_df['得点数'], final_summary_df['得点数'] + final_summary_df['失点数'])
 
             st.subheader("試合全体のサーブ/レシーブ別得失点サマリー")
             total_df = final_summary_df[final_summary_df['ゲーム数'] == 'Total'].set_index('サーブ/レシーブ')
@@ -109,10 +113,10 @@ def display_serve_receive_analysis(df):
             col_serve_total, col_receive_total = st.columns(2)
             with col_serve_total:
                 st.markdown("##### サーブ")
-                st.table(total_df[['得点数', '失点数', '得点率 (%)', '失点率 (%)']].loc[['サーブ']])
+                st.table(total_df[['得点数', '失点数', '得点率 (%)', INTERVAL_LABEL, '失点率 (%)']].loc[['サーブ']])
             with col_receive_total:
                 st.markdown("##### レシーブ")
-                st.table(total_df[['得点数', '失点数', '得点率 (%)', '失点率 (%)']].loc[['レシーブ']])
+                st.table(total_df[['得点数', '失点数', '得点率 (%)', INTERVAL_LABEL, '失点率 (%)']].loc[['レシーブ']])
 
             st.markdown("---")
 
@@ -124,10 +128,10 @@ def display_serve_receive_analysis(df):
                     col_game_serve, col_game_receive = st.columns(2)
                     with col_game_serve:
                         st.markdown("##### サーブ")
-                        st.table(game_df[['得点数', '失点数', '得点率 (%)', '失点率 (%)']].loc[['サーブ']])
+                        st.table(game_df[['得点数', '失点数', '得点率 (%)', INTERVAL_LABEL, '失点率 (%)']].loc[['サーブ']])
                     with col_game_receive:
                         st.markdown("##### レシーブ")
-                        st.table(game_df[['得点数', '失点数', '得点率 (%)', '失点率 (%)']].loc[['レシーブ']])
+                        st.table(game_df[['得点数', '失点数', '得点率 (%)', INTERVAL_LABEL, '失点率 (%)']].loc[['レシーブ']])
     else:
         st.warning('スプレッドシートの読み込みに失敗したか、必要な列（「得失点の種類」、「ゲーム数」、「誰のサーブか」）が見つかりませんでした。')
 
@@ -226,10 +230,13 @@ def get_serve_receive_analysis_for_ai(df):
         '失点率 (%)': f"{total_receive_loss_rate}%"
     }
     
+    final_summary_df.insert(final_summary_df.columns.get_loc('得点率 (%)') + 1, INTERVAL_LABEL, format_wilson_intervals(
+        final_summary_df['得点数'], final_summary_df['得点数'] + final_summary_df['失点数']))
+
     # AI向けにMarkdownを整形
     analysis_text = "## サーブ・レシーブ別 得失点分析\n\n"
     analysis_text += "### 試合全体のサマリー\n"
-    analysis_text += "サーブとレシーブそれぞれの得失点数、得点率、失点率の合計です。\n"
+    analysis_text += f"サーブとレシーブそれぞれの得失点数、得点率（{INTERVAL_LABEL}）、失点率の合計です。\n"
     total_df_markdown = final_summary_df[final_summary_df['ゲーム数'] == 'Total'].to_markdown(index=False)
     analysis_text += total_df_markdown + "\n\n"
     
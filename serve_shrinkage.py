@@ -0,0 +1,162 @@
+"""
+サーブ種類別の得点率を、取り込んだ全試合から求めたシーズンの事前分布に向けて縮める（経験ベイズ・ベータ二項モデル）。
+1試合・1ゲーム・1人の相手のサーブ種類別の得点率は数本から計算するため大きくぶれる。
+シーズン全体の得点率と試合ごとのばらつきからベータ分布（alpha, beta）を求め、
+縮小推定の得点率 = (得点数 + alpha) / (総回数 + alpha + beta) とする。本数が少ないほどシーズンの得点率に近づく。
+
+事前分布は試合ごとの集計（自分のサーブ: match_summaries、相手のサーブ: opponent_partials）から、
+(試合数, サーブの種類) の配列で全種類まとめてモーメント法で計算する。
+1試合の表を表示するだけでフォルダの取り込みが走らないよう、事前分布はすでにあるデータベースからだけ読み込む
+（シーズンの推移などの全試合の分析を開くと取り込まれる）。データベースがない場合は縮めない。
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils import STORE_REFRESH_SECONDS
+
+SHRUNK_LABEL = '縮小推定の得点率'
+PRIOR_COLUMNS = ['誰のサーブか', 'サーブの種類', '試合数', '総回数', '得点数', 'シーズン得点率', '事前の強さ', 'alpha', 'beta']
+# 事前分布の強さ（何本分のサーブとして扱うか）の範囲。試合ごとの差が見えないときは最大まで縮める
+# （ただし、全試合のそのサーブの本数より強くはしない）
+MIN_PRIOR_STRENGTH = 2
+MAX_PRIOR_STRENGTH = 200
+# 試合の集計の項目名から、サーブの種類を取り出す
+_SERVE_METRIC_PREFIX = 'サーブ得点率（'
+
+
+def fit_beta_prior(successes, totals):
+    """
+    試合ごとの成功数と回数から、項目ごとのベータ分布の事前分布をモーメント法で求める（項目をまとめて計算する）。
+
+    Args:
+        successes (array-like): (試合数, 項目数) の成功数
+        totals (array-like): (試合数, 項目数) の回数（その試合にない項目は 0）
+
+    Returns:
+        tuple: 項目ごとの (alpha, beta) の配列（回数が0の項目は NaN）
+    """
+    successes = np.asarray(successes, dtype=float)
+    totals = np.asarray(totals, dtype=float)
+    has_data = totals > 0
+    clusters = has_data.sum(axis=0)
+    pooled_totals = totals.sum(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pooled = successes.sum(axis=0) / pooled_totals
+        rates = np.where(has_data, successes / totals, 0)
+        # 試合ごとの得点率の散らばりから、本数の少なさによる散らばりを引いた分が試合ごとの本当の差
+        spread = (totals * (rates - pooled) ** 2).sum(axis=0)
+        effective_totals = pooled_totals - (totals ** 2).sum(axis=0) / pooled_totals
+        between = (spread - pooled * (1 - pooled) * (clusters - 1)) / effective_totals
+        strength = pooled * (1 - pooled) / between - 1
+    strength = np.where(between > 0, strength, MAX_PRIOR_STRENGTH)
+    # 2試合未満では試合ごとの差が分からないため、弱い事前分布にする
+    strength = np.where(clusters >= 2, np.clip(strength, MIN_PRIOR_STRENGTH, MAX_PRIOR_STRENGTH), MIN_PRIOR_STRENGTH)
+    # 珍しいサーブは試合ごとの差が見えにくいため、全試合の本数より強い事前分布で1試合の得点率を消さない
+    strength = np.minimum(strength, pooled_totals)
+    alpha = np.where(pooled_totals > 0, pooled * strength, np.nan)
+    beta = np.where(pooled_totals > 0, (1 - pooled) * strength, np.nan)
+    return alpha, beta
+
+
+def shrink_rates(successes, totals, alpha, beta):
+    """事前分布に向けて縮めた割合（事後平均、0〜1）を返す。事前分布がない項目は NaN。"""
+    successes = np.asarray(successes, dtype=float)
+    totals = np.asarray(totals, dtype=float)
+    return (successes + alpha) / (totals + alpha + beta)
+
+
+def load_archive_serve_counts(conn):
+    """
+    保存されている全試合の、試合ごと・サーブした人ごと・サーブの種類ごとの本数と得点数を返す。
+    得点数はサーブした人の得点（自分のサーブなら自分の得点、相手のサーブなら相手の得点）。
+
+    Returns:
+        pd.DataFrame: 'match_id', '誰のサーブか', 'サーブの種類', '総回数', '得点数' の表
+    """
+    mine = pd.read_sql_query(
+        'SELECT match_id, metric, numerator, denominator FROM match_summaries WHERE metric LIKE ?',
+        conn, params=(_SERVE_METRIC_PREFIX + '%',))
+    mine = pd.DataFrame({
+        'match_id': mine['match_id'],
+        '誰のサーブか': '自分',
+        'サーブの種類': mine['metric'].str[len(_SERVE_METRIC_PREFIX):-1],
+        '総回数': mine['denominator'],
+        '得点数': mine['numerator'],
+    })
+    opponent = pd.read_sql_query(
+        "SELECT match_id, category AS \"サーブの種類\", total AS \"総回数\", won AS \"得点数\" "
+        "FROM opponent_partials WHERE metric = 'serve_type' AND phase = 'all'", conn)
+    opponent.insert(1, '誰のサーブか', '相手')
+    return pd.concat([mine, opponent[mine.columns]], ignore_index=True)
+
+
+def fit_serve_priors(counts):
+    """
+    load_archive_serve_counts の表から、サーブした人・サーブの種類ごとの事前分布を求める。
+
+    Returns:
+        pd.DataFrame: PRIOR_COLUMNS の列を持つ表（'シーズン得点率' は %、'事前の強さ' は alpha + beta）
+    """
+    if counts.empty:
+        return pd.DataFrame(columns=PRIOR_COLUMNS)
+    table = counts.pivot_table(index='match_id', columns=['誰のサーブか', 'サーブの種類'],
+                               values=['得点数', '総回数'], aggfunc='sum', fill_value=0)
+    successes = table['得点数'].to_numpy()
+    totals = table['総回数'][table['得点数'].columns].to_numpy()
+    alpha, beta = fit_beta_prior(successes, totals)
+    priors = table['得点数'].columns.to_frame(index=False)
+    priors['試合数'] = (totals > 0).sum(axis=0)
+    priors['総回数'] = totals.sum(axis=0).astype(int)
+    priors['得点数'] = successes.sum(axis=0).astype(int)
+    priors['シーズン得点率'] = alpha / (alpha + beta) * 100
+    priors['事前の強さ'] = alpha + beta
+    priors['alpha'] = alpha
+    priors['beta'] = beta
+    return priors[PRIOR_COLUMNS]
+
+
+@st.cache_data(ttl=STORE_REFRESH_SECONDS, show_spinner=False)
+def load_serve_priors():
+    """
+    取り込み済みの全試合から事前分布を求める。フォルダの取り込みはせず、データベースがない場合は空の表を返す。
+    """
+    # match_store は取り込みのためにサーブの集計を使うモジュールを読み込むため、ここで読み込む
+    from match_store import MATCH_DB_PATH, connect
+
+    if not os.path.exists(MATCH_DB_PATH):
+        return pd.DataFrame(columns=PRIOR_COLUMNS)
+    conn = connect()
+    try:
+        return fit_serve_priors(load_archive_serve_counts(conn))
+    finally:
+        conn.close()
+
+
+def add_shrunk_rates(summary, current_player, priors=None, group_column='サーブの種類'):
+    """
+    サーブ種類別の集計表に、シーズンの事前分布に向けて縮めた得点率（%）の列 SHRUNK_LABEL を追加する。
+    1試合・1ゲーム・1人の相手など、どの単位の集計にも使える。事前分布がないサーブの種類は縮めない（得点率のまま）。
+
+    Args:
+        summary (pd.DataFrame): group_column, '総回数', '得点数' の列を持つ表
+        current_player (str): サーブした人 ('自分'または'相手')
+        priors (pd.DataFrame): fit_serve_priors の結果（None の場合は全試合から求める）
+        group_column (str): サーブの種類（グループ化したもの）の列名
+
+    Returns:
+        pd.DataFrame: 列を追加した表
+    """
+    if priors is None:
+        priors = load_serve_priors()
+    priors = priors[priors['誰のサーブか'] == current_player].set_index('サーブの種類')
+    summary = summary.copy()
+    alpha = summary[group_column].map(priors['alpha']).to_numpy(dtype=float)
+    beta = summary[group_column].map(priors['beta']).to_numpy(dtype=float)
+    shrunk = shrink_rates(summary['得点数'], summary['総回数'], alpha, beta)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        raw = summary['得点数'].to_numpy(dtype=float) / summary['総回数'].to_numpy(dtype=float)
+    summary[SHRUNK_LABEL] = np.where(np.isnan(alpha), raw, shrunk) * 100
+    return summary
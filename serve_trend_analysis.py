@@ -1,7 +1,36 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 from utils import group_serve_type, group_detailed_serve_course
+from serve_turns import (SEQUENCE_LABELS, build_serve_pairs, compute_serve_turns, find_serve_order_mismatches,
+                         second_serve_distribution, summarize_serve_changes)
+from lazy_import import lazy_module
+
+px = lazy_module('plotly.express')
+
+def split_opponent_serve_sequence(df, turns=None):
+    """
+    10-10未満の相手のサーブを1本目と2本目に分け、2本目で種類・コースを変えたかを判定する。
+    1本目・2本目はスコアから求めたサーブの順番で決める（serve_turns）。複数の試合をまとめたデータにも使える。
+
+    Returns:
+        tuple: ('サーブシーケンス' 列を追加した相手のサーブ, 1本目との比較ができる2本目のサーブ)
+               2本目のサーブには、1本目と同じか（'same_course', 'same_type'）の列が付く
+    """
+    if turns is None:
+        turns = compute_serve_turns(df)
+    if turns.empty:
+        return df.iloc[:0], df.iloc[:0]
+
+    # 10-10未満で、スコアから求めた順番と記録がどちらも相手のサーブになっているラリーに限定
+    is_target = (~turns['デュース'].astype(bool)) & turns['サーブ順の一致'].astype(bool) & (turns['想定のサーブ'] == '相手')
+    df_serve = df[is_target].copy()
+    df_serve['サーブシーケンス'] = turns.loc[is_target, 'ターン内の順番'].map(SEQUENCE_LABELS)
+
+    # 同じサーブの番の1本目と2本目を組にする
+    df_sequence_analysis = build_serve_pairs(df, '相手', turns)
+    df_sequence_analysis['same_course'] = df_sequence_analysis['サーブのコース'] == df_sequence_analysis['1本目のサーブのコース']
+    df_sequence_analysis['same_type'] = df_sequence_analysis['サーブの種類'] == df_sequence_analysis['1本目のサーブの種類']
+    return df_serve, df_sequence_analysis
 
 def display_opponent_serve_sequence_analysis(df, df_opponents):
     """
@@ -11,22 +40,24 @@ def display_opponent_serve_sequence_analysis(df, df_opponents):
     st.subheader("相手のサーブシーケンス分析 (10-10以前)")
     
     # 必要な列の存在を確認
-    required_cols = ['ゲーム数', '誰のサーブか', '自分の得点', '相手の得点', 'サーブの種類', 'サーブのコース']
+    required_cols = ['ゲーム数', '誰のサーブか', '自分の得点', '相手の得点', '得点者', 'サーブの種類', 'サーブのコース']
     if not all(col in df.columns for col in required_cols):
         st.warning(f"分析に必要なデータ列が見つかりません: {', '.join(required_cols)}。データを確認してください。")
         return
     
-    # 10-10未満の相手のサーブに限定
-    df_serve = df[(df['誰のサーブか'] == '相手') & (df['自分の得点'] < 10) & (df['相手の得点'] < 10)].copy()
+    turns = compute_serve_turns(df)
+    df_serve, df_sequence_analysis = split_opponent_serve_sequence(df, turns)
+
+    mismatches = find_serve_order_mismatches(df, turns)
+    if not mismatches.empty:
+        st.caption(f"スコアから求めたサーブの順番と「誰のサーブか」が合わないラリーが{len(mismatches)}本あり、集計から除いています。")
+        with st.expander("サーブの順番が合わないラリー"):
+            st.dataframe(mismatches, hide_index=True)
 
     if df_serve.empty:
         st.info("分析対象となるデータがありません（10-10未満の相手のサーブ）。")
         return
 
-    # 1本目と2本目のサーブを判定
-    df_serve['サーブシーケンス'] = df_serve.groupby(['ゲーム数', '得点者']).cumcount() % 2
-    df_serve['サーブシーケンス'] = df_serve['サーブシーケンス'].replace({0: '1本目', 1: '2本目'})
-
     # --- 1. サーブのコースと種類ごとの構成比を円グラフで表示 ---
     st.markdown("##### 1本目 vs 2本目 サーブ構成比")
     col1, col2 = st.columns(2)
@@ -81,34 +112,21 @@ def display_opponent_serve_sequence_analysis(df, df_opponents):
     # --- 2. 変化の割合を計算 ---
     st.markdown("##### 1本目から2本目への変化率")
     if not df_serve.empty:
-        # 連続するサーブのペアを作成
-        # df_serve = df_serve.sort_values(['ゲーム数', '開始時刻']).reset_index(drop=True) # `開始時刻`列がないためコメントアウト
-        df_serve['rally_id'] = df_serve.groupby('ゲーム数').cumcount()
-        df_serve = df_serve.sort_values(['ゲーム数', 'rally_id']).reset_index(drop=True)
-        
-        # 1本目と2本目でコースが同じか判定
-        df_serve['same_course'] = df_serve['サーブのコース'] == df_serve['サーブのコース'].shift(1)
-        # 1本目と2本目で種類が同じか判定
-        df_serve['same_type'] = df_serve['サーブの種類'] == df_serve['サーブの種類'].shift(1)
-
-        # 2本目のサーブデータのみを抽出し、有効なペアに限定
-        df_sequence_analysis = df_serve[
-            (df_serve['サーブシーケンス'] == '2本目') &
-            (df_serve['ゲーム数'] == df_serve['ゲーム数'].shift(1)) &
-            (df_serve['誰のサーブか'] == df_serve['誰のサーブか'].shift(1))
-        ]
-
         if not df_sequence_analysis.empty:
-            total_sequences = len(df_sequence_analysis)
-            same_course_count = df_sequence_analysis['same_course'].sum()
-            same_type_count = df_sequence_analysis['same_type'].sum()
-            
             # 変化の確率を計算
-            course_change_rate = 100 * (total_sequences - same_course_count) / total_sequences if total_sequences > 0 else 0
-            type_change_rate = 100 * (total_sequences - same_type_count) / total_sequences if total_sequences > 0 else 0
+            changes = summarize_serve_changes(df_sequence_analysis).set_index('項目')
+
+            st.write(f"**合計サーブペア数**: {len(df_sequence_analysis)}本")
+            st.markdown(f"**サーブのコースを変える確率**: `{changes.loc['サーブのコース', '変えた割合']:.1f}%`")
+            st.markdown(f"**サーブの種類を変える確率**: `{changes.loc['サーブの種類', '変えた割合']:.1f}%`")
 
-            st.write(f"**合計サーブペア数**: {total_sequences}本")
-            st.markdown(f"**サーブのコースを変える確率**: `{course_change_rate:.1f}%`")
-            st.markdown(f"**サーブの種類を変える確率**: `{type_change_rate:.1f}%`")
+            # 1本目に出したサーブごとに、2本目に何を出したか
+            df_pairs = df_sequence_analysis.assign(
+                サーブグループ=df_sequence_analysis['サーブの種類'].apply(group_serve_type),
+                **{'1本目のサーブグループ': df_sequence_analysis['1本目のサーブの種類'].apply(group_serve_type)})
+            distribution = second_serve_distribution(df_pairs, 'サーブグループ')
+            if not distribution.empty:
+                st.markdown("###### 1本目の種類ごとの2本目の種類")
+                st.dataframe(distribution.style.format("{:.1f}%"))
         else:
             st.info("1本目と2本目のサーブペアがありません。")
\ No newline at end of file
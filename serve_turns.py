@@ -0,0 +1,158 @@
+"""
+各ラリーが、ゲームの何回目のサーブの番（ターン）の何本目のサーブかをスコアから求める。
+サーブは2本ずつ交代し、10-10からは1本ずつ交代するため、ゲームの最初にサーブした人が分かれば
+ラリー前の両者の得点の合計だけで決まる。ゲームの最初にサーブした人は、記録された「誰のサーブか」の多数決で決め、
+スコアから求めたサーブと記録が合わないラリーを見つけられるようにする。
+
+複数の試合をまとめたデータでも、'試合ID' 列があれば試合とゲーム数の組でゲームを区別して一度に計算する。
+"""
+import numpy as np
+import pandas as pd
+
+from game_rules import DEUCE_SCORE, build_score_state, serve_turn
+
+TURN_COLUMNS = ['ゲームキー', 'ターン', 'ターン内の順番', 'デュース', '想定のサーブ', 'サーブ順の一致']
+SEQUENCE_LABELS = {1: '1本目', 2: '2本目'}
+_SERVERS = np.array(['自分', '相手'], dtype=object)
+
+
+def game_keys(df):
+    """試合（'試合ID' 列があれば）とゲーム数の組ごとに、出てきた順の番号（0から）を返す。"""
+    keys = pd.factorize(df['ゲーム数'], use_na_sentinel=False)[0].astype(np.int64)
+    if '試合ID' in df.columns:
+        match_codes = pd.factorize(df['試合ID'], use_na_sentinel=False)[0].astype(np.int64)
+        keys = pd.factorize(match_codes * (keys.max() + 2) + keys)[0]
+    return keys
+
+
+def compute_serve_turns(df):
+    """
+    各ラリーのサーブの番と、その番の何本目かを計算する。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（'ゲーム数', '自分の得点', '相手の得点', '得点者', '誰のサーブか' の列）
+
+    Returns:
+        pd.DataFrame: df と同じインデックスで TURN_COLUMNS の列を持つ表
+            ゲームキー: ゲームごとの番号, ターン: ゲームの何回目のサーブの番か（0から）,
+            ターン内の順番: 1 または 2（10-10からは常に 1）, デュース: 10-10以降のラリーか,
+            想定のサーブ: スコアから求めたサーブした人, サーブ順の一致: 想定のサーブが「誰のサーブか」と同じか
+    """
+    if df.empty:
+        return pd.DataFrame(columns=TURN_COLUMNS, index=df.index)
+    state = build_score_state(df)
+    total = (state['自分の得点_前'] + state['相手の得点_前']).to_numpy()
+    turn, position = serve_turn(total)
+    is_deuce = total >= 2 * DEUCE_SCORE
+
+    games = game_keys(df)
+    game_count = games.max() + 1
+
+    # 記録されたサーブから、そのラリーが正しければゲームの最初にサーブしたのは誰かを求め、ゲームごとに多数決する
+    recorded = df['誰のサーブか'].astype(str).str.strip()
+    has_server = recorded.isin(_SERVERS).to_numpy()
+    implied_first = (recorded == '相手').to_numpy(dtype=np.int64) ^ (turn % 2)
+    votes_for_opponent = np.bincount(games[has_server], weights=implied_first[has_server], minlength=game_count)
+    votes = np.bincount(games[has_server], minlength=game_count)
+    first_server = (votes_for_opponent * 2 > votes).astype(np.int64)
+    # 同数の場合は、そのゲームで最初に記録されたサーブに合わせる
+    tied = votes_for_opponent * 2 == votes
+    if tied.any():
+        first_rows = pd.Series(implied_first[has_server]).groupby(games[has_server]).first()
+        tied_games = np.flatnonzero(tied & (votes > 0))
+        first_server[tied_games] = first_rows.reindex(tied_games).to_numpy()
+
+    expected = _SERVERS[first_server[games] ^ (turn % 2)]
+    return pd.DataFrame({
+        'ゲームキー': games,
+        'ターン': turn,
+        'ターン内の順番': position,
+        'デュース': is_deuce,
+        '想定のサーブ': expected,
+        'サーブ順の一致': expected == recorded.to_numpy(),
+    }, index=df.index)
+
+
+def find_serve_order_mismatches(df, turns=None):
+    """
+    スコアから求めたサーブと「誰のサーブか」が合わないラリーを返す（入力ミスや、ラリーの抜けの確認用）。
+
+    Returns:
+        pd.DataFrame: 合わないラリーの 'ゲーム数', '自分の得点', '相手の得点', '誰のサーブか', '想定のサーブ' の表
+    """
+    if turns is None:
+        turns = compute_serve_turns(df)
+    if turns.empty:
+        return pd.DataFrame(columns=['ゲーム数', '自分の得点', '相手の得点', '誰のサーブか', '想定のサーブ'])
+    mismatched = ~turns['サーブ順の一致'].astype(bool)
+    columns = [col for col in ['試合ID', 'ゲーム数', '自分の得点', '相手の得点', '誰のサーブか'] if col in df.columns]
+    return df.loc[mismatched, columns].assign(想定のサーブ=turns.loc[mismatched, '想定のサーブ'])
+
+
+def build_serve_pairs(df, server, turns=None, columns=('サーブの種類', 'サーブのコース')):
+    """
+    同じサーブの番の1本目と2本目を組にする（10-10以前、スコアから求めたサーブが記録と合うラリーだけ）。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（複数の試合をまとめたものでもよい）
+        server (str): サーブした人 ('自分'または'相手')
+        turns (pd.DataFrame): compute_serve_turns の結果（None の場合は計算する）
+        columns (tuple): 1本目と2本目で比べる列
+
+    Returns:
+        pd.DataFrame: 2本目のラリーの行に、'1本目の<列名>' の列を追加した表（インデックスは2本目のラリー）
+    """
+    if turns is None:
+        turns = compute_serve_turns(df)
+    if turns.empty:
+        return df.iloc[:0]
+    usable = (~turns['デュース'].astype(bool)) & turns['サーブ順の一致'].astype(bool) & (turns['想定のサーブ'] == server)
+    turn_keys = turns['ゲームキー'].astype(np.int64) * (DEUCE_SCORE + 1) + turns['ターン'].astype(np.int64)
+    first = usable & (turns['ターン内の順番'] == 1)
+    second = usable & (turns['ターン内の順番'] == 2)
+    # 同じ番の1本目が重複して記録されている場合は最初の行を使う
+    first_rows = pd.Series(df.index[first.to_numpy()], index=turn_keys[first].to_numpy())
+    first_rows = first_rows[~first_rows.index.duplicated()]
+    matched = turn_keys[second].map(first_rows).dropna()
+
+    pairs = df.loc[matched.index].copy()
+    for column in columns:
+        if column in df.columns:
+            pairs[f'1本目の{column}'] = df.loc[matched.to_numpy(), column].to_numpy()
+    return pairs
+
+
+def summarize_serve_changes(pairs, columns=('サーブの種類', 'サーブのコース')):
+    """
+    1本目から2本目で列の値を変えた割合を計算する。
+
+    Returns:
+        pd.DataFrame: '項目', 'ペア数', '変えた数', '変えた割合' の表（割合は %）
+    """
+    rows = []
+    for column in columns:
+        if column not in pairs.columns or f'1本目の{column}' not in pairs.columns:
+            continue
+        changed = int((pairs[column] != pairs[f'1本目の{column}']).sum())
+        rows.append((column, len(pairs), changed, changed / len(pairs) * 100 if len(pairs) else np.nan))
+    return pd.DataFrame(rows, columns=['項目', 'ペア数', '変えた数', '変えた割合'])
+
+
+def second_serve_distribution(pairs, column, normalize=True):
+    """
+    1本目の値ごとの、2本目の値の分布（1本目が X のとき2本目は何を出したか）を返す。
+
+    Args:
+        pairs (pd.DataFrame): build_serve_pairs の結果
+        column (str): 比べる列（グループ化した列を追加してから渡してもよい）
+        normalize (bool): True の場合は1本目の値ごとの割合（%）、False の場合は本数
+
+    Returns:
+        pd.DataFrame: 行が1本目の値、列が2本目の値の表
+    """
+    if pairs.empty or f'1本目の{column}' not in pairs.columns:
+        return pd.DataFrame()
+    table = pd.crosstab(pairs[f'1本目の{column}'].rename(f'1本目の{column}'), pairs[column].rename(f'2本目の{column}'))
+    if normalize:
+        table = table.div(table.sum(axis=1), axis=0) * 100
+    return table
@@ -1,14 +1,39 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+from game_rules import GAME_ENDING_SCORE, get_score_state
+from lazy_import import lazy_module
+from rate_intervals import INTERVAL_LABEL, format_wilson_intervals
+from serve_shrinkage import SHRUNK_LABEL, add_shrunk_rates
+
+px = lazy_module('plotly.express')
+
+# サーブ種類のグループ名と、サーブの種類に含まれるキーワード
+SERVE_KEYWORDS = {
+    '順横': '順横',
+    'YGサーブ': 'YG',
+    '巻込みサーブ': '巻込み',
+    'バックサーブ': 'バック',
+    'キックサーブ': 'キック'
+}
+
+def categorize_serve(serve_type):
+    """サーブの種類を SERVE_KEYWORDS のグループにまとめる（どれにも当てはまらない場合は'その他'）"""
+    serve_type = str(serve_type).strip()
+    if serve_type == '':
+        return 'その他'
+    for group, keyword in SERVE_KEYWORDS.items():
+        if keyword in serve_type:
+            return group
+    return 'その他'
 
-def display_serve_win_rate_analysis(df, current_player):
+def display_serve_win_rate_analysis(df, current_player, score_state=None):
     """
     サーブ種類別の得点率と構成比をStreamlitのUIに表示する関数
     
     Args:
         df (pd.DataFrame): 試合の得失点データ
         current_player (str): 分析対象のプレイヤー ('自分'または'相手')
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
     """
     st.write("---")
     st.subheader(f"{current_player}のサーブ種類別 得点率と構成比")
@@ -19,24 +44,6 @@ def display_serve_win_rate_analysis(df, current_player):
         st.warning(f"サーブ分析に必要なデータ列が見つかりません: {', '.join(required_cols)}。データを確認してください。")
         return
 
-    # ゲームのフェーズを判定する関数
-    def get_game_phase(row):
-        my_score = row['自分の得点']
-        opponent_score = row['相手の得点']
-        
-        # ラリー開始時点のスコアで終盤を判定
-        rally_start_my_score = my_score - 1 if row['得点者'] == '自分' else my_score
-        rally_start_opponent_score = opponent_score - 1 if row['得点者'] == '相手' else opponent_score
-        
-        # ただし、スコアが0未満になることはないため補正
-        rally_start_my_score = max(0, rally_start_my_score)
-        rally_start_opponent_score = max(0, rally_start_opponent_score)
-
-        if rally_start_my_score >= 8 and rally_start_opponent_score >= 8:
-            return '終盤'
-        else:
-            return '序盤・中盤'
-
     # データをコピーし、サーブデータを抽出
     df_serve = df[df['誰のサーブか'] == current_player].copy()
 
@@ -45,25 +52,9 @@ def display_serve_win_rate_analysis(df, current_player):
         return
 
     # ゲームフェーズ列を追加
-    df_serve['ゲームフェーズ'] = df_serve.apply(get_game_phase, axis=1)
+    df_serve['ゲームフェーズ'] = get_score_state(df_serve, score_state)['ゲームフェーズ']
     
-    # サーブ種類をグループ化する関数
-    serve_keywords = {
-        '順横': '順横',
-        'YGサーブ': 'YG',
-        '巻込みサーブ': '巻込み',
-        'バックサーブ': 'バック',
-        'キックサーブ': 'キック'
-    }
-    def categorize_serve(serve_type):
-        serve_type = str(serve_type).strip()
-        if serve_type == '':
-            return 'その他'
-        for group, keyword in serve_keywords.items():
-            if keyword in serve_type:
-                return group
-        return 'その他'
-
+    # サーブ種類をグループ化
     df_serve['サーブ種類（グループ化）'] = df_serve['サーブの種類'].apply(categorize_serve)
 
     # データを集計
@@ -73,6 +64,7 @@ def display_serve_win_rate_analysis(df, current_player):
         
         summary = pd.merge(total_serves, points_won, on='サーブ種類（グループ化）', how='left').fillna(0)
         summary['得点率'] = (summary['得点数'] / summary['総本数']) * 100
+        summary[INTERVAL_LABEL] = format_wilson_intervals(summary['得点数'], summary['総本数'])
         
         summary = summary.rename(columns={
             'サーブ種類（グループ化）': 'サーブの種類',
@@ -83,6 +75,8 @@ def display_serve_win_rate_analysis(df, current_player):
     # 全体と終盤のサマリーを作成
     serve_summary_all = get_serve_summary(df_serve, current_player)
     serve_summary_ending = get_serve_summary(df_serve[df_serve['ゲームフェーズ'] == '終盤'], current_player)
+    # 試合全体の得点率は、全試合から求めたシーズンの得点率に向けて縮めた値も並べる
+    serve_summary_all = add_shrunk_rates(serve_summary_all, current_player)
 
     # データフレームと円グラフを並べて表示
     st.markdown("##### 得点率・構成比")
@@ -93,8 +87,10 @@ def display_serve_win_rate_analysis(df, current_player):
         st.dataframe(serve_summary_all.style.format({
             '得点数': "{:.0f}",
             '総回数': "{:.0f}",
-            '得点率': "{:.1f}%"
-        }))
+            '得点率': "{:.1f}%",
+            SHRUNK_LABEL: "{:.1f}%"
+        }, na_rep='-'))
+        st.caption(f"{SHRUNK_LABEL}: 本数が少ないサーブほど、取り込んだ全試合のそのサーブの得点率に近づけた値")
         
     with col2:
         st.markdown("###### 終盤 (8-8以降)")
@@ -127,13 +123,14 @@ def display_serve_win_rate_analysis(df, current_player):
             fig_ending.update_traces(textinfo='percent+label')
             st.plotly_chart(fig_ending, use_container_width=True)
 
-def get_serve_win_rate_analysis_for_ai(df, current_player):
+def get_serve_win_rate_analysis_for_ai(df, current_player, score_state=None):
     """
-    サーブ種類別の得点率分析結果をAIに渡すためのMarkdown文字列を生成する
+    サーブ種類別の得点率分析結果（試合全体と終盤）をAIに渡すためのMarkdown文字列を生成する
     
     Args:
         df (pd.DataFrame): 試合の得失点データ
         current_player (str): 分析対象のプレイヤー ('自分'または'相手')
+        score_state (pd.DataFrame): build_score_state の結果（None の場合はここで計算する）
         
     Returns:
         str: 分析結果のMarkdown文字列
@@ -171,20 +168,38 @@ def get_serve_win_rate_analysis_for_ai(df, current_player):
     serve_summary = pd.merge(total_serves, points_won, on='サーブ種類（グループ化）', how='left').fillna(0)
     
     serve_summary['得点率'] = (serve_summary['得点数'] / serve_summary['総本数']) * 100
+    serve_summary[INTERVAL_LABEL] = format_wilson_intervals(serve_summary['得点数'], serve_summary['総本数'])
     
     serve_summary = serve_summary.rename(columns={
         'サーブ種類（グループ化）': 'サーブの種類',
         '総本数': '総回数'
     })
+    serve_summary = add_shrunk_rates(serve_summary, current_player)
 
     serve_summary['得点率'] = serve_summary['得点率'].round(1).astype(str) + '%'
+    serve_summary[SHRUNK_LABEL] = serve_summary[SHRUNK_LABEL].map(lambda rate: f"{rate:.1f}%" if pd.notna(rate) else '-')
     serve_summary['得点数'] = serve_summary['得点数'].astype(int)
     serve_summary['総回数'] = serve_summary['総回数'].astype(int)
 
     analysis_text = f"## {current_player}のサーブ種類別の得点率分析\n\n"
     if not serve_summary.empty:
         analysis_text += f"### {current_player}のサーブ種類ごとの得点率\n"
+        analysis_text += f"※{INTERVAL_LABEL}: 回数が少ないほど広くなる。区間が重なる得点率の差は偶然の可能性が高い。\n"
+        analysis_text += f"※{SHRUNK_LABEL}: 回数が少ないほど全試合でのそのサーブの得点率に近づけた値。サーブの良し悪しはこちらで判断する。\n"
         analysis_text += serve_summary.to_markdown(index=False)
+
+        # 画面の「終盤 (8-8以降)」の表と同じ集計
+        ending = df_serve[get_score_state(df_serve, score_state)['ゲームフェーズ'] == '終盤']
+        if not ending.empty:
+            groups = ending['サーブ種類（グループ化）']
+            ending_summary = pd.DataFrame({
+                '総回数': groups.value_counts(),
+                '得点数': (ending['得点者'] == current_player).groupby(groups).sum(),
+            }).rename_axis('サーブの種類').reset_index()
+            ending_summary['得点率'] = (ending_summary['得点数'] / ending_summary['総回数'] * 100).round(1).astype(str) + '%'
+            ending_summary[INTERVAL_LABEL] = format_wilson_intervals(ending_summary['得点数'], ending_summary['総回数'])
+            analysis_text += f"\n\n### 終盤（{GAME_ENDING_SCORE}-{GAME_ENDING_SCORE}以降）の{current_player}のサーブ種類ごとの得点率\n"
+            analysis_text += ending_summary.to_markdown(index=False)
     else:
         analysis_text += f"{current_player}のサーブ種類別のデータが不足しているため、分析できませんでした。\n"
         
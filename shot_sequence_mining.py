@@ -0,0 +1,164 @@
+"""
+よく出てくる打球の並び（2〜4球の連続したパターン）と、その得点率を見つける。
+例: 自分のサーブ 順横(バック前) → バックチキータ(フォア) → フォアドライブ
+
+ラリーを rally_tensor の整数の配列にしてから、連続した n 球の並びを1つの整数（キー）にまとめて数える。
+キーは1球伸ばすたびに、それまでの並びの番号（np.unique の順位）に置き換えるため、
+種類やコースの値が多くても（球数が増えても）int64 からあふれない。
+n 球のパターンは、最初の n-1 球が最低出現回数に届いたラリーだけから数える（届かない並びは伸ばさない）。
+"""
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from rally_tensor import BALL_COUNT, SHOT_ATTRIBUTES, build_decoders, encode_rallies
+
+PATTERN_COLUMNS = ['サーブ', '開始球目', '球数', 'パターン', '回数', '試合数', '得点', '失点', '得点率']
+
+_TYPE = SHOT_ATTRIBUTES.index('種類')
+_COURSE = SHOT_ATTRIBUTES.index('コース')
+_SERVERS = ['自分', '相手']
+
+
+def _shot_tokens(tensor, vocabularies):
+    """1球を「種類とコース」の1つの整数にする。種類が空欄の球は 0。"""
+    course_count = len(vocabularies['コース'])
+    types = tensor[:, :, _TYPE].astype(np.int64)
+    tokens = types * course_count + tensor[:, :, _COURSE]
+    return np.where(types > 0, tokens, 0), len(vocabularies['種類']) * course_count
+
+
+def _format_shot(type_value, course_value):
+    return f"{type_value}({course_value})" if course_value else type_value
+
+
+def mine_shot_patterns(df, min_support=3, min_length=2, max_length=4, anchored=True, shots=None):
+    """
+    連続した打球の並びのうち、min_support 回以上出てきたものと得失点を数える。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ（複数の試合をまとめたものでもよい。'試合ID' 列があれば試合数も数える）
+        min_support (int): パターンとして残す最低の回数
+        min_length (int): パターンの最小の球数
+        max_length (int): パターンの最大の球数（6球目まで）
+        anchored (bool): True の場合はサーブから始まる並びだけ、False の場合は途中から始まる並びも数える
+        shots (tuple): df の encode_rallies の結果（None の場合はここで計算する）
+
+    Returns:
+        pd.DataFrame: 'サーブ', '開始球目', '球数', 'パターン', '回数', '試合数', '得点', '失点', '得点率' の表
+                      （回数の多い順。得点・失点・得点率は自分から見た値）
+    """
+    required = ['誰のサーブか', '得点者', 'サーブの種類']
+    if df.empty or not all(col in df.columns for col in required):
+        return pd.DataFrame(columns=PATTERN_COLUMNS)
+
+    server = df['誰のサーブか'].astype(str).str.strip()
+    rows = server.isin(_SERVERS).to_numpy()
+    df = df[rows]
+    tensor, vocabularies = (shots[0][rows], shots[1]) if shots is not None else encode_rallies(df)
+    tokens, base = _shot_tokens(tensor, vocabularies)
+    server_codes = (server[rows] == '相手').to_numpy(dtype=np.int64)
+    won = (df['得点者'] == '自分').to_numpy()
+    lost = (df['得点者'] == '相手').to_numpy()
+    match_codes = pd.factorize(df['試合ID'])[0] if '試合ID' in df.columns else np.zeros(len(df), dtype=np.int64)
+
+    decoders = build_decoders(vocabularies)
+    max_length = min(max_length, BALL_COUNT)
+    results = []
+    for start in ([0] if anchored else range(BALL_COUNT - 1)):
+        # 最初のキーはサーブした人と開始球、そのあとは「それまでの並びの番号 * base + 次の球」にしていく
+        keys = server_codes * base + tokens[:, start]
+        alive = tokens[:, start] > 0
+        for length in range(2, max_length - start + 1):
+            end = start + length - 1
+            keys = keys * base + tokens[:, end]
+            alive &= tokens[:, end] > 0
+            candidates = np.flatnonzero(alive)
+            if candidates.size == 0:
+                break
+            _, first, inverse, counts = np.unique(
+                keys[candidates], return_index=True, return_inverse=True, return_counts=True)
+            frequent = counts >= min_support
+            keys[candidates] = inverse
+            # 最低回数に届かなかった並びは、伸ばしても届かないので次の球数では数えない
+            alive[candidates[~frequent[inverse]]] = False
+            if length < min_length or not frequent.any():
+                continue
+
+            wins = np.bincount(inverse, weights=won[candidates], minlength=len(counts))
+            losses = np.bincount(inverse, weights=lost[candidates], minlength=len(counts))
+            pairs = np.unique(np.stack([inverse, match_codes[candidates]]), axis=1)
+            matches = np.bincount(pairs[0], minlength=len(counts))
+            for pattern in np.flatnonzero(frequent):
+                rally = candidates[first[pattern]]
+                shots = tensor[rally, start:end + 1]
+                label = ' → '.join(_format_shot(decoders['種類'][shot[_TYPE]], decoders['コース'][shot[_COURSE]])
+                                   for shot in shots)
+                decided = wins[pattern] + losses[pattern]
+                results.append((_SERVERS[server_codes[rally]], start + 1, length, label, int(counts[pattern]),
+                                int(matches[pattern]), int(wins[pattern]), int(losses[pattern]),
+                                wins[pattern] / decided * 100 if decided else np.nan))
+
+    patterns = pd.DataFrame(results, columns=PATTERN_COLUMNS)
+    return patterns.sort_values(['回数', '得点率'], ascending=False, kind='stable').reset_index(drop=True)
+
+
+def display_shot_sequence_patterns(df, shots=None):
+    """
+    よく出てくる打球パターンと得点率を表示する。表示中の試合と、データベースに取り込んだ全試合を切り替えられる。
+
+    Args:
+        df (pd.DataFrame): 表示中の試合の得失点データ
+        shots (tuple): df の encode_rallies の結果（None の場合はここで計算する）
+    """
+    st.subheader("よく出てくる打球パターン")
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        scope = st.radio("対象", ['この試合', '全試合'], horizontal=True, key="sequence_scope")
+    with col2:
+        server = st.selectbox("サーブ", ['すべて', '自分', '相手'], key="sequence_server")
+    with col3:
+        min_support = st.number_input("最低の回数", min_value=2, value=3 if scope == '全試合' else 2,
+                                      key=f"sequence_min_support_{scope}")
+    with col4:
+        max_length = st.slider("最大の球数", min_value=2, max_value=4, value=4, key="sequence_max_length")
+    anchored = not st.checkbox("途中の球から始まる並びも含める", key="sequence_include_middle")
+
+    if scope == '全試合':
+        # match_store は読み込みに時間がかかるため、全試合を選んだときに読み込む
+        from match_store import load_stored_rallies
+
+        df, shots = load_stored_rallies(), None
+
+    patterns = mine_shot_patterns(df, min_support=min_support, max_length=max_length, anchored=anchored, shots=shots)
+    if server != 'すべて':
+        patterns = patterns[patterns['サーブ'] == server]
+    if patterns.empty:
+        st.info(f"{min_support}回以上出てきたパターンはありません。最低の回数を下げてみてください。")
+        return
+
+    st.caption(f"{min_support}回以上出てきた{len(patterns)}パターン（得点・失点・得点率は自分から見た値）")
+    columns = [col for col in PATTERN_COLUMNS if scope == '全試合' or col != '試合数']
+    st.dataframe(patterns[columns].style.format({'得点率': "{:.1f}%"}, na_rep='-'), hide_index=True)
+
+
+def get_shot_sequence_patterns_for_ai(df, shots=None, server=None, limit=15):
+    """
+    この試合でよく出てきたサーブからの打球パターンと得点率を、AIに渡すためのMarkdown文字列にする。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+        shots (tuple): df の encode_rallies の結果（None の場合はここで計算する）
+        server (str): '自分' または '相手' を指定した場合は、そのサーブのラリーだけにする
+        limit (int): 表示するパターンの数
+    """
+    patterns = mine_shot_patterns(df, min_support=2, shots=shots)
+    serve_label = 'サーブ'
+    if server is not None:
+        patterns = patterns[patterns['サーブ'] == server]
+        serve_label = f"{server}のサーブ"
+    if patterns.empty:
+        return "2回以上出てきた打球パターンはありませんでした。"
+    patterns = patterns.head(limit).drop(columns=['開始球目', '試合数'])
+    patterns['得点率'] = patterns['得点率'].map(lambda rate: f"{rate:.1f}%" if pd.notna(rate) else '-')
+    return f"## よく出てくる打球パターン（{serve_label}から、2回以上）\n\n{patterns.to_markdown(index=False)}"
@@ -0,0 +1,206 @@
+"""
+動画で見直すために、選んだラリーと似たラリーを取り込んだ全試合から探すモジュール。
+ラリーを「サーブした人」「サーブの種類・コース」「レシーブ」「3球目・4球目の種類とコース」「局面」「得点者」の
+値の番号と、ラリー前の点差に置き換えた配列にし、違う項目の重みの合計（と点差の違い）を距離にする。
+
+距離は全ラリーとの比較を配列の計算1回で求め、argpartition で近い順の上位だけを並べ替えるため、
+数万ラリーでも画面の操作に合わせてすぐに結果を出せる。
+"""
+import html
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from game_rules import build_score_state
+from utils import STORE_REFRESH_SECONDS, display_linked_table, group_detailed_serve_course, group_serve_type
+
+# 比べる項目と、値が違うときに足す距離
+FEATURE_WEIGHTS = {
+    '誰のサーブか': 2.0,
+    'サーブの種類': 1.5,
+    'サーブのコース': 1.0,
+    'レシーブの種類': 1.0,
+    'レシーブのコース': 0.5,
+    '３球目の種類': 1.0,
+    '３球目のコース': 0.5,
+    '４球目の種類': 1.0,
+    '４球目のコース': 0.5,
+    'ゲームフェーズ': 1.0,
+    '得点者': 2.0,
+}
+# 点差の違いの距離（SCORE_GAP_SCALE 点違うと SCORE_WEIGHT、それ以上は同じ）
+SCORE_WEIGHT = 1.0
+SCORE_GAP_SCALE = 4
+RESULT_COLUMNS = ['ファイル名', 'ゲーム数', '自分の得点', '相手の得点', '得点者', '開始時刻', '得失点の種類',
+                  '得点の内容', '失点の内容', 'YouTubeリンク']
+# 同じラリーかどうかを見分ける列（表示中の試合が取り込み済みの場合に、そのラリー自身を除く）
+IDENTITY_COLUMNS = ['ゲーム数', '自分の得点', '相手の得点', '開始時刻']
+# どの値とも一致しない番号（索引にない値）
+_UNSEEN = -2
+
+
+def _grouped_values(df, column):
+    """比べる項目の値を文字列にする（サーブの種類とコースはグループ化し、空欄は ''）。"""
+    if column not in df.columns:
+        return pd.Series('', index=df.index)
+    values = df[column]
+    # グループ化は値の種類ごとに1回だけ行う
+    codes, uniques = pd.factorize(values)
+    if column == 'サーブの種類':
+        uniques = [group_serve_type(value) for value in uniques]
+    elif column == 'サーブのコース':
+        uniques = [group_detailed_serve_course(value) or '' for value in uniques]
+    else:
+        uniques = [str(value).strip() for value in uniques]
+    lookup = np.array(list(uniques) + [''], dtype=object)
+    return pd.Series(lookup[codes], index=df.index)
+
+
+def _identity_keys(df):
+    """IDENTITY_COLUMNS の値をつなげた文字列（Excel とデータベースで 1 と 1.0 のように型が違っても同じにする）。"""
+    keys = pd.Series('', index=df.index)
+    for column in IDENTITY_COLUMNS:
+        if column not in df.columns:
+            values = pd.Series('', index=df.index)
+        elif column == '開始時刻':
+            values = df[column].astype(str).str.strip()
+        else:
+            values = pd.to_numeric(df[column], errors='coerce').astype('Int64').astype(str)
+        keys = keys + '|' + values
+    return keys.to_numpy(dtype=object)
+
+
+def encode_rally_features(df):
+    """
+    ラリーを比べる項目の値（文字列）の表と、ラリー前の点差（自分 - 相手）の配列にする。
+
+    Returns:
+        tuple: (FEATURE_WEIGHTS の列を持つ pd.DataFrame, 点差の np.ndarray)
+    """
+    state = build_score_state(df)
+    data = df.assign(ゲームフェーズ=state['ゲームフェーズ'])
+    features = pd.DataFrame({column: _grouped_values(data, column) for column in FEATURE_WEIGHTS}, index=df.index)
+    score_gap = (state['自分の得点_前'] - state['相手の得点_前']).to_numpy(dtype=np.int64)
+    return features, score_gap
+
+
+def build_similarity_index(df):
+    """
+    全ラリーの特徴を番号の配列にした索引を作る。
+
+    Args:
+        df (pd.DataFrame): ラリーのデータ（複数の試合をまとめたもの）
+
+    Returns:
+        dict: {'codes': (ラリー数, 項目数) の番号, 'values': 項目ごとの {値: 番号},
+               'score_gap': ラリー前の点差, 'weights': 項目の重み, 'identity': 同じラリーを見分ける文字列,
+               'rallies': 結果に表示する列}
+    """
+    features, score_gap = encode_rally_features(df)
+    codes = np.empty((len(df), len(FEATURE_WEIGHTS)), dtype=np.int32)
+    values = {}
+    for i, column in enumerate(FEATURE_WEIGHTS):
+        codes[:, i], uniques = pd.factorize(features[column])
+        values[column] = {value: code for code, value in enumerate(uniques)}
+    rallies = df[[col for col in RESULT_COLUMNS if col in df.columns]]
+    return {
+        'codes': codes,
+        'values': values,
+        'score_gap': score_gap,
+        'weights': np.array(list(FEATURE_WEIGHTS.values())),
+        'identity': _identity_keys(df),
+        'rallies': rallies.reset_index(drop=True),
+    }
+
+
+def rally_distances(index, rally):
+    """
+    索引の全ラリーと、1つのラリー（df の1行）との距離を返す。
+
+    Args:
+        index (dict): build_similarity_index の結果
+        rally (pd.DataFrame): 比べるラリー（1行の表）
+
+    Returns:
+        np.ndarray: ラリーごとの距離（0 は全項目と点差が同じ）
+    """
+    features, score_gap = encode_rally_features(rally)
+    query = np.array([index['values'][column].get(features[column].iloc[0], _UNSEEN)
+                      for column in FEATURE_WEIGHTS], dtype=np.int32)
+    distances = (index['codes'] != query) @ index['weights']
+    gap = np.abs(index['score_gap'] - score_gap[0])
+    return distances + SCORE_WEIGHT * np.minimum(gap / SCORE_GAP_SCALE, 1)
+
+
+def find_similar_rallies(index, rally, k=10, exclude_same_rally=True):
+    """
+    距離の近い順に k 件のラリーを返す。
+
+    Args:
+        index (dict): build_similarity_index の結果
+        rally (pd.DataFrame): 比べるラリー（1行の表）
+        k (int): 返す件数
+        exclude_same_rally (bool): IDENTITY_COLUMNS がすべて同じラリー（比べるラリー自身）を除くか
+
+    Returns:
+        pd.DataFrame: index['rallies'] の列に '距離' を加えた表（近い順）。YouTubeリンクは取り込み時に create_youtube_link で作ったもの
+    """
+    distances = rally_distances(index, rally)
+    if exclude_same_rally:
+        distances = np.where(index['identity'] == _identity_keys(rally)[0], np.inf, distances)
+    candidates = np.flatnonzero(np.isfinite(distances))
+    if candidates.size > k:
+        candidates = candidates[np.argpartition(distances[candidates], k - 1)[:k]]
+    candidates = candidates[np.argsort(distances[candidates], kind='stable')]
+    return index['rallies'].iloc[candidates].assign(距離=distances[candidates]).reset_index(drop=True)
+
+
+@st.cache_resource(ttl=STORE_REFRESH_SECONDS, show_spinner=False)
+def load_similarity_index():
+    """全試合のラリーの特徴を番号にした索引を作る（rally_distances で全ラリーと比べる）。"""
+    # match_store は読み込みに時間がかかるため、表示するときに読み込む
+    from match_store import load_stored_rallies
+
+    return build_similarity_index(load_stored_rallies())
+
+
+def _rally_label(row):
+    content = row.get('失点の内容') if row.get('得点者') == '相手' else row.get('得点の内容')
+    content = '' if pd.isna(content) else f" {content}"
+    return f"ゲーム{row['ゲーム数']} {row['自分の得点']}-{row['相手の得点']}（{row['得点者']}の得点）{content}"
+
+
+def display_similar_rallies(df):
+    """
+    試合のラリーを1つ選び、全試合から似たラリーを動画へのリンク付きで表示する。
+
+    Args:
+        df (pd.DataFrame): 試合の得失点データ
+    """
+    st.subheader("似たラリーの検索（動画の見直し用）")
+    col1, col2, col3 = st.columns([4, 1, 1])
+    with col2:
+        lost_only = st.checkbox("失点のみ", value=True, key="similar_rallies_lost_only")
+    with col3:
+        k = st.number_input("表示件数", min_value=5, max_value=100, value=10, step=5, key="similar_rallies_k")
+    rallies = df[df['得点者'] == '相手'] if lost_only else df
+    if rallies.empty:
+        st.info("選べるラリーがありません。")
+        return
+    with col1:
+        selected = st.selectbox("ラリー", rallies.index, format_func=lambda i: _rally_label(df.loc[i]),
+                                key="similar_rallies_rally")
+
+    rally = df.loc[[selected]]
+    if {'YouTubeリンク', '開始時刻'} <= set(rally.columns) and rally['YouTubeリンク'].iloc[0] != '#':
+        st.markdown(f"選んだラリーの動画: <a href='{html.escape(str(rally['YouTubeリンク'].iloc[0]), quote=True)}' target='_blank'>"
+                    f"{html.escape(str(rally['開始時刻'].iloc[0]))}</a>", unsafe_allow_html=True)
+
+    results = find_similar_rallies(load_similarity_index(), rally, k=k)
+    if results.empty:
+        st.info("取り込んだ試合にラリーがありません。")
+        return
+    st.caption(f"比べた項目: {'、'.join(FEATURE_WEIGHTS)}、点差（距離が小さいほど似ている）")
+    table = results.drop(columns=['YouTubeリンク'], errors='ignore').assign(距離=results['距離'].map('{:.2f}'.format))
+    display_linked_table(table, results.get('YouTubeリンク', pd.Series('', index=results.index)))
@@ -1,6 +1,14 @@
 import datetime
+import html
+import re
+import streamlit as st
 import pandas as pd
 
+# 'HH:MM:SS' または 'MM:SS' 形式の時刻
+TIME_PATTERN = re.compile(r'^\d{1,2}(:\d{1,2}){1,2}$')
+# フォルダの試合を取り込み直す間隔（秒）。全試合から作るキャッシュ（索引・集計・モデル）も同じ間隔で作り直す
+STORE_REFRESH_SECONDS = 60
+
 def time_to_seconds(time_str):
     """'HH:MM:SS' または 'MM:SS' 形式の時間を秒に変換する"""
     # 文字列でない場合は文字列に変換し、'nan'文字列を0として扱う
@@ -26,6 +34,33 @@ def time_to_seconds(time_str):
         st.warning(f"時刻形式が不正です: {time_str}。数値で構成されているか確認してください。")
         return 0
 
+def find_invalid_times(times):
+    """
+    'HH:MM:SS' または 'MM:SS' 形式になっていない時刻を探す（空欄は不正としない）。
+
+    Args:
+        times (pd.Series): 時刻の列
+
+    Returns:
+        pd.Series: 不正な時刻だけを残した列（インデックスは元の行）
+    """
+    text = times.dropna().astype(str).str.strip()
+    text = text[(text != '') & (text.str.lower() != 'nan')]
+    return text[~text.str.match(TIME_PATTERN)]
+
+def times_to_seconds(times):
+    """
+    時刻の列をまとめて秒にする（time_to_seconds と違い、空欄や不正な時刻は 0 ではなく NaN にする）。
+
+    Args:
+        times (pd.Series): 'HH:MM:SS' または 'MM:SS' 形式の時刻の列
+
+    Returns:
+        pd.Series: 秒（float）。インデックスは元の行
+    """
+    parts = times.astype(str).str.strip().str.extract(r'^(?:(\d{1,2}):)?(\d{1,2}):(\d{1,2})$').astype(float)
+    return parts[0].fillna(0) * 3600 + parts[1] * 60 + parts[2]
+
 def create_youtube_link(video_id, timestamp_seconds):
     """YouTubeのタイムスタンプ付きURLを生成する"""
     if video_id and timestamp_seconds is not None:
@@ -34,6 +69,22 @@ def create_youtube_link(video_id, timestamp_seconds):
     return "#" # video_idがない場合はリンクなし
 
 
+def display_linked_table(table, links, link_column='開始時刻'):
+    """
+    表をHTMLで表示し、link_column の値を動画へのリンクにする（値はエスケープする）。
+
+    Args:
+        table (pd.DataFrame): 表示する表
+        links (iterable): 行ごとのURL（空欄または '#' の行はリンクにしない）
+        link_column (str): リンクにする列
+    """
+    table = table.fillna('').astype(str).map(html.escape)
+    if link_column in table.columns:
+        table[link_column] = [f"<a href='{html.escape(link)}' target='_blank'>{text}</a>" if link and link != '#' else text
+                              for link, text in zip(links, table[link_column])]
+    st.markdown(table.to_html(escape=False, index=False, classes='dataframe table-striped'), unsafe_allow_html=True)
+
+
 # --- サーブの種類をグルーピングする関数 ---
 def group_serve_type(serve_type):
     """サーブの種類を、指定された文字列が含まれるカテゴリにグルーピングする。"""
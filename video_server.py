@@ -0,0 +1,156 @@
+"""
+ローカルの試合動画を、HTTP の Range リクエストに対応したサーバーで配信するモジュール。
+st.video にファイルのパスを渡すと、再実行のたびにファイル全体をアプリに読み込むため、数GBの動画では遅くメモリも使う。
+このサーバーのURLを渡すと、ブラウザが再生・シーク位置に必要な範囲だけを取りに来て、
+サーバーはファイルをメモリマップして要求された範囲だけを読み出して送る。
+
+使い方:
+    python video_server.py C:/Users/YourName/Videos/match.mp4 --port 8766
+"""
+import argparse
+import hashlib
+import mimetypes
+import mmap
+import os
+import re
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import quote
+
+import streamlit as st
+
+VIDEO_SERVER_HOST = '127.0.0.1'
+# 1回に送る大きさ（バイト）
+CHUNK_SIZE = 1024 * 1024
+_RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Range ヘッダー（'bytes=開始-終了' の1つの範囲）を、送る範囲 (開始, 終了) にする（終了を含む）。
+
+    Args:
+        header (str): Range ヘッダーの値（None の場合はファイル全体）
+        size (int): ファイルの大きさ（バイト）
+
+    Returns:
+        tuple: (開始, 終了)。満たせない範囲の場合は None
+    """
+    if not header:
+        return 0, size - 1
+    match = _RANGE_PATTERN.match(header.strip())
+    if not match or match.group(1) == match.group(2) == '':
+        return None
+    if match.group(1) == '':
+        # 'bytes=-500' は最後の500バイト
+        start, end = max(size - int(match.group(2)), 0), size - 1
+    else:
+        start = int(match.group(1))
+        end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+    if start >= size or start > end:
+        return None
+    return start, end
+
+
+def make_handler(files):
+    class VideoHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def _send_video(self, send_body):
+            path = files.get(self.path.split('?', 1)[0].rsplit('/', 1)[-1])
+            if path is None or not os.path.isfile(path):
+                self.send_error(404)
+                return
+            size = os.path.getsize(path)
+            requested = parse_range(self.headers.get('Range'), size)
+            if requested is None and size > 0:
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            start, end = requested or (0, -1)
+            self.send_response(206 if self.headers.get('Range') and size > 0 else 200)
+            self.send_header('Content-Type', mimetypes.guess_type(path)[0] or 'application/octet-stream')
+            self.send_header('Accept-Ranges', 'bytes')
+            self.send_header('Content-Length', str(end - start + 1))
+            if self.headers.get('Range') and size > 0:
+                self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+            self.end_headers()
+            if not send_body or size == 0:
+                return
+
+            with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                view = memoryview(mapped)
+                try:
+                    for offset in range(start, end + 1, CHUNK_SIZE):
+                        self.wfile.write(view[offset:min(offset + CHUNK_SIZE, end + 1)])
+                except (BrokenPipeError, ConnectionResetError):
+                    # シークするとブラウザは読み込み中のリクエストを切るため、エラーにしない
+                    pass
+                finally:
+                    view.release()
+
+        def do_GET(self):
+            self._send_video(send_body=True)
+
+        def do_HEAD(self):
+            self._send_video(send_body=False)
+
+        def log_message(self, format, *args):
+            pass
+
+    return VideoHandler
+
+
+class VideoServer:
+    """
+    動画ファイルを登録してURLを返す、別スレッドで動くサーバー。
+    URLはファイルのパスから決まるため、同じファイルには同じURLを返す（ブラウザのキャッシュも使える）。
+    """
+
+    def __init__(self, host=VIDEO_SERVER_HOST, port=0):
+        self._files = {}
+        self._server = ThreadingHTTPServer((host, port), make_handler(self._files))
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self._server.server_address[1]
+
+    def url_for(self, path):
+        """動画ファイルを登録して、配信するURLを返す。"""
+        path = os.path.abspath(path)
+        extension = os.path.splitext(path)[1]
+        token = hashlib.sha1(path.encode('utf-8')).hexdigest()[:16] + extension
+        self._files[token] = path
+        host = self._server.server_address[0]
+        return f"http://{host}:{self.port}/video/{quote(token)}"
+
+    def shutdown(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def start_video_server(host=VIDEO_SERVER_HOST, port=0):
+    """動画サーバーを別スレッドで起動する（port=0 の場合は空いているポートを使う）。"""
+    return VideoServer(host, port)
+
+
+@st.cache_resource(show_spinner=False)
+def get_video_server():
+    """画面表示用に、アプリのプロセスで1つの動画サーバーを起動する（再実行では起動し直さない）。"""
+    return start_video_server()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='ローカルの動画ファイルを Range リクエスト対応で配信する')
+    parser.add_argument('path', help='動画ファイルのパス')
+    parser.add_argument('--host', default=VIDEO_SERVER_HOST)
+    parser.add_argument('--port', type=int, default=8766)
+    args = parser.parse_args()
+
+    server = start_video_server(args.host, args.port)
+    print(f"動画を配信しています: {server.url_for(args.path)}")
+    threading.Event().wait()